@@ -1,22 +1,111 @@
 import asyncio
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
+import importlib.util
 import logging
-from typing import List, Set, Dict
+import os
+import sys
+from collections import defaultdict, deque
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Iterable, List, Set, Dict, Optional
 from urllib.parse import urljoin, urlparse
 import concurrent.futures
+import httpx
+from ..services.http_clients import get_http_clients
+from .ledger import LedgerSession
+
+# Playwright and bs4 are imported on first use (or by the startup warm-up), not at app import
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# "hybrid" fetches over plain HTTP and only uses Chromium for JS-rendered pages.
+# The async Playwright API needs a Proactor loop on Windows, so default to the sync crawl there
+DEFAULT_MODE = os.getenv("CRAWLER_MODE", "sync" if sys.platform == "win32" else "hybrid")
+# lxml is several times faster than the stdlib parser when it's installed
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+# Mount points of client-rendered apps (React, Vue, Next, Nuxt, Svelte)
+HEADING_TAGS = ["h1", "h2", "h3", "h4", "h5", "h6"]
+JS_ROOT_IDS = ("root", "app", "__next", "__nuxt", "svelte")
+USER_AGENT = "AutoDocAI-Crawler/1.0"
+# Pages that are really gone; other HTTP failures (403 to bots, 429, 5xx, timeouts) get a browser retry
+GONE_STATUSES = (404, 410)
+
+
+def _http_status(error: Exception) -> Optional[int]:
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+class BrowserPagePool:
+    """Pool of reusable Playwright pages; Chromium is only launched on first use"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._playwright = None
+        self._browser = None
+        self._pages: Optional[asyncio.Queue] = None
+        self._lock = asyncio.Lock()
+
+    async def _start(self):
+        from playwright.async_api import async_playwright
+
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=True)
+        context = await self._browser.new_context()
+        pages: asyncio.Queue = asyncio.Queue()
+        for _ in range(self.size):
+            pages.put_nowait(await context.new_page())
+        self._pages = pages
+
+    async def fetch(self, url: str, links: bool = True):
+        """Render a URL, returning (html, title, hrefs)"""
+        async with self._lock:
+            if self._pages is None:
+                await self._start()
+        page = await self._pages.get()
+        try:
+            await page.goto(url, wait_until="domcontentloaded", timeout=10000)
+            hrefs = []
+            if links:
+                hrefs = await page.eval_on_selector_all(
+                    "a[href]", "els => els.map(e => e.getAttribute('href'))"
+                )
+            return await page.content(), await page.title(), hrefs
+        finally:
+            self._pages.put_nowait(page)
+
+    async def close(self):
+        if self._browser is not None:
+            await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+        self._browser = self._playwright = self._pages = None
+
+
 class Crawler:
-    def __init__(self, start_url: str, max_depth: int = 2, max_pages: int = 10):
+    def __init__(self, start_url: str, max_depth: int = 2, max_pages: int = 10,
+                 mode: str = DEFAULT_MODE,
+                 concurrency: int = int(os.getenv("CRAWLER_CONCURRENCY", "4")),
+                 per_domain_limit: int = int(os.getenv("CRAWLER_PER_DOMAIN_LIMIT", "4")),
+                 ledger: Optional[LedgerSession] = None):
         self.start_url = start_url
         self.max_depth = max_depth
         self.max_pages = max_pages
+        self.mode = mode
+        self.concurrency = concurrency
+        self.per_domain_limit = per_domain_limit
+        self.ledger = ledger  # Previous fingerprints; unchanged pages are skipped
+        self.min_static_text = 200  # Less visible text than this may be a JS shell
         self.visited: Set[str] = set()
         self.results: List[Dict] = []
+        self.stats = {"http": 0, "browser": 0, "unchanged": 0}
+        self._stopped = False  # Set when a streaming consumer goes away; ends a sync crawl
+        # What a re-crawl needs to tell which previously crawled pages are gone
+        self.gone: Set[str] = set()  # Answered 404/410
+        self.failed: Set[str] = set()  # Other errors; their links are unknown
+        self.complete = False  # The crawl ran to the end rather than failing or being stopped
+        self.truncated = False  # max_pages left reachable pages unvisited
         self.base_domain = urlparse(start_url).netloc
 
     def is_valid_url(self, url: str) -> bool:
@@ -33,78 +122,315 @@ class Crawler:
         # Accept everything else
         return True
 
-    def _crawl_sync(self):
+    @staticmethod
+    def _extract_text(soup: "BeautifulSoup") -> str:
+        # Remove script and style elements
+        for script in soup(["script", "style"]):
+            script.decompose()
+        # Keep headings as Markdown so the chunker can split pages into sections
+        for heading in soup.find_all(HEADING_TAGS):
+            heading.string = "#" * int(heading.name[1]) + " " + heading.get_text(" ", strip=True)
+        return soup.get_text(separator='\n', strip=True)
+
+    def _page_result(self, url: str, html: str, title: str) -> Dict:
+        from bs4 import BeautifulSoup
+        # Extract text
+        text = self._extract_text(BeautifulSoup(html, HTML_PARSER))
+        return {
+            "url": url,
+            "content": text,
+            "title": title,
+            "source": "website"
+        }
+
+    def _new_links(self, url: str, hrefs: Iterable[str]) -> List[str]:
+        links = []
+        for href in hrefs:
+            if href:
+                absolute_url = urljoin(url, href)
+                # Remove fragment
+                absolute_url = absolute_url.split('#')[0]
+
+                if (self.is_valid_url(absolute_url) and
+                    absolute_url not in self.visited and
+                    self.is_doc_url(absolute_url)):
+                    links.append(absolute_url)
+        return links
+
+    def _crawl_sync(self, on_page: Optional[Callable[[Dict], None]] = None):
         """Synchronous crawl method to work around Windows asyncio issues"""
         logger.info(f"Starting sync crawl of {self.start_url}")
+        from playwright.sync_api import sync_playwright
         try:
             with sync_playwright() as p:
                 browser = p.chromium.launch(headless=True)
                 context = browser.new_context()
-                
+
                 # Queue: (url, depth)
-                queue = [(self.start_url, 0)]
-                
-                while queue and len(self.visited) < self.max_pages:
-                    url, depth = queue.pop(0)
-                    
+                queue = deque([(self.start_url, 0)])
+
+                while queue and len(self.visited) < self.max_pages and not self._stopped:
+                    url, depth = queue.popleft()
+
                     if url in self.visited or depth > self.max_depth:
                         continue
-                    
+
                     self.visited.add(url)
                     logger.info(f"Crawling: {url} (Depth: {depth})")
-                    
+
+                    page = None
                     try:
                         page = context.new_page()
-                        page.goto(url, wait_until="domcontentloaded", timeout=10000)
-                        content = page.content()
-                        
-                        # Extract text
-                        soup = BeautifulSoup(content, 'html.parser')
-                        # Remove script and style elements
-                        for script in soup(["script", "style"]):
-                            script.decompose()
-                        text = soup.get_text(separator='\n', strip=True)
-                        
-                        self.results.append({
-                            "url": url,
-                            "content": text,
-                            "title": page.title()
-                        })
-                        
+                        response = page.goto(url, wait_until="domcontentloaded", timeout=10000)
+                        if response is not None and response.status in GONE_STATUSES:
+                            self.gone.add(url)
+                            logger.error(f"Failed to crawl {url}: HTTP {response.status}")
+                            continue
+
+                        result = self._page_result(url, page.content(), page.title())
+                        hrefs = []
+                        if depth < self.max_depth:
+                            hrefs = [link.get_attribute("href") for link in page.query_selector_all("a")]
+
+                        if self._changed(url, result, hrefs):
+                            self.results.append(result)
+                            if on_page:
+                                on_page(result)
+                        else:
+                            self.stats["unchanged"] += 1
+
                         # Find links
                         if depth < self.max_depth:
-                            links = page.query_selector_all("a")
-                            for link in links:
-                                href = link.get_attribute("href")
-                                if href:
-                                    absolute_url = urljoin(url, href)
-                                    # Remove fragment
-                                    absolute_url = absolute_url.split('#')[0]
-                                    
-                                    if (self.is_valid_url(absolute_url) and 
-                                        absolute_url not in self.visited and
-                                        self.is_doc_url(absolute_url)):
-                                        queue.append((absolute_url, depth + 1))
-                        
-                        page.close()
-                        
+                            queue.extend((link, depth + 1) for link in self._new_links(url, hrefs))
+
                     except Exception as e:
+                        self.failed.add(url)
                         logger.error(f"Failed to crawl {url}: {e}")
-                
+                    finally:
+                        if page is not None:
+                            page.close()
+
                 browser.close()
+                self.truncated = any(url not in self.visited for url, _ in queue)
+                self.complete = not self._stopped
                 logger.info(f"Crawl complete. Fetched {len(self.results)} pages.")
                 return self.results
         except Exception as e:
             logger.error(f"Playwright failed: {e}", exc_info=True)
             raise
 
+    def stale_urls(self) -> Set[str]:
+        """
+        Previously crawled pages this crawl shows are gone: those answering
+        404/410, plus, when every reachable page was visited, those no
+        longer linked from the site. A failed page may hide links, so then
+        only the former count.
+        """
+        stale = set(self.gone)
+        if self.ledger is not None and self.complete and not self.truncated and not self.failed:
+            stale |= set(self.ledger.previous) - self.visited
+        return stale
+
+    def _changed(self, url: str, result: Dict, hrefs: List[str],
+                 etag: Optional[str] = None, last_modified: Optional[str] = None) -> bool:
+        """False when the ledger already holds this page's text"""
+        if self.ledger is None:
+            return True
+        return self.ledger.observe(url, result["content"], hrefs, etag, last_modified)
+
+    def _parse_html(self, url: str, html: str):
+        """One parse for text, title and links of a plain-HTTP page"""
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, HTML_PARSER)
+        hrefs = [a.get("href") for a in soup.find_all("a", href=True)]
+        title = soup.title.get_text(strip=True) if soup.title else url
+        text = self._extract_text(soup)
+        result = {"url": url, "content": text, "title": title, "source": "website"}
+        return soup, result, hrefs
+
+    def looks_js_rendered(self, soup: "BeautifulSoup", text: str) -> bool:
+        """Heuristic: little visible text plus an empty app mount point or a noscript hint"""
+        if len(text) >= self.min_static_text:
+            return False
+        body = soup.body
+        if body is None or not text:
+            return True
+        if body.find(id=lambda value: value in JS_ROOT_IDS):
+            return True
+        return body.find("noscript") is not None
+
+    async def _fetch_http(self, url: str):
+        """
+        Fetch a page with the pooled HTTP client.
+
+        Returns (result, hrefs), with result None for unchanged pages, or
+        None when the page is a JS shell that needs a browser.
+        """
+        headers = {"User-Agent": USER_AGENT}
+        if self.ledger is not None:
+            headers.update(self.ledger.conditional_headers(url))
+        response = await get_http_clients().get(url).get(
+            url, follow_redirects=True, timeout=15.0, headers=headers
+        )
+        if response.status_code == 304 and self.ledger is not None:
+            return None, self.ledger.not_modified(url)
+        response.raise_for_status()
+        if "html" not in response.headers.get("content-type", "html"):
+            raise ValueError(f"Not an HTML page ({response.headers.get('content-type')})")
+        soup, result, hrefs = self._parse_html(url, response.text)
+        if self.looks_js_rendered(soup, result["content"]):
+            return None
+        changed = self._changed(url, result, hrefs, response.headers.get("etag"),
+                                response.headers.get("last-modified"))
+        return (result if changed else None), hrefs
+
+    async def _crawl_concurrent(self, fetch, on_page: Optional[Callable[[Dict], None]] = None):
+        """
+        Breadth-first crawl with a pool of workers.
+
+        `fetch(url, depth)` returns (result, hrefs); a None result marks an
+        unchanged page whose links are still followed.
+        """
+        # asyncio.Queue is deque-backed, so taking the next URL is O(1)
+        frontier: asyncio.Queue = asyncio.Queue()
+        frontier.put_nowait((self.start_url, 0))
+        queued: Set[str] = {self.start_url}
+        domain_slots = defaultdict(lambda: asyncio.Semaphore(self.per_domain_limit))
+
+        async def worker():
+            while True:
+                url, depth = await frontier.get()
+                try:
+                    if url in self.visited or depth > self.max_depth:
+                        continue
+                    if len(self.visited) >= self.max_pages:
+                        self.truncated = True
+                        continue
+                    self.visited.add(url)
+                    logger.info(f"Crawling: {url} (Depth: {depth})")
+                    async with domain_slots[urlparse(url).netloc]:
+                        result, hrefs = await fetch(url, depth)
+
+                    if result is None:
+                        self.stats["unchanged"] += 1
+                    else:
+                        self.results.append(result)
+                        if on_page:
+                            on_page(result)
+                    if depth < self.max_depth:
+                        for link in self._new_links(url, hrefs):
+                            if link not in queued:
+                                queued.add(link)
+                                frontier.put_nowait((link, depth + 1))
+                except Exception as e:
+                    if _http_status(e) in GONE_STATUSES:
+                        self.gone.add(url)
+                    else:
+                        self.failed.add(url)
+                    logger.error(f"Failed to crawl {url}: {e}")
+                finally:
+                    frontier.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            await frontier.join()
+            self.complete = True
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _crawl_async(self, on_page: Optional[Callable[[Dict], None]] = None):
+        """Concurrent crawl over a pool of reusable Playwright pages"""
+        logger.info(f"Starting async crawl of {self.start_url} with {self.concurrency} pages")
+        browser = BrowserPagePool(self.concurrency)
+
+        async def fetch(url: str, depth: int):
+            self.stats["browser"] += 1
+            html, title, hrefs = await browser.fetch(url, links=depth < self.max_depth)
+            result = self._page_result(url, html, title)
+            return (result if self._changed(url, result, hrefs) else None), hrefs
+
+        try:
+            await self._crawl_concurrent(fetch, on_page)
+        finally:
+            await browser.close()
+        logger.info(f"Crawl complete. Fetched {len(self.results)} pages.")
+        return self.results
+
+    async def _crawl_hybrid(self, on_page: Optional[Callable[[Dict], None]] = None):
+        """HTTP-first crawl that only launches Chromium for JS-rendered pages"""
+        logger.info(f"Starting hybrid crawl of {self.start_url}")
+        browser = BrowserPagePool(self.concurrency)
+
+        async def fetch(url: str, depth: int):
+            try:
+                fetched = await self._fetch_http(url)
+                reason = "JS-rendered shell"
+            except httpx.HTTPError as e:
+                if _http_status(e) in GONE_STATUSES:
+                    raise
+                fetched, reason = None, f"HTTP fetch failed: {e}"
+            if fetched is not None:
+                self.stats["http"] += 1
+                return fetched
+            logger.info(f"Escalating {url} to the browser ({reason})")
+            self.stats["browser"] += 1
+            html, title, hrefs = await browser.fetch(url, links=depth < self.max_depth)
+            result = self._page_result(url, html, title)
+            return (result if self._changed(url, result, hrefs) else None), hrefs
+
+        try:
+            await self._crawl_concurrent(fetch, on_page)
+        finally:
+            await browser.close()
+        logger.info(
+            f"Crawl complete. Fetched {len(self.results)} pages "
+            f"({self.stats['http']} via HTTP, {self.stats['browser']} via browser, "
+            f"{self.stats['unchanged']} unchanged)."
+        )
+        return self.results
+
     async def crawl(self):
-        """Async wrapper around sync crawl"""
+        """Crawl the site; same result shape in every mode"""
+        if self.mode == "hybrid":
+            return await self._crawl_hybrid()
+        if self.mode == "async":
+            return await self._crawl_async()
+        # Async wrapper around sync crawl
         loop = asyncio.get_event_loop()
         with concurrent.futures.ThreadPoolExecutor() as executor:
             results = await loop.run_in_executor(executor, self._crawl_sync)
         return results
 
+    async def iter_pages(self) -> AsyncIterator[Dict]:
+        """Yield pages as soon as they are crawled, for streaming ingestion"""
+        loop = asyncio.get_running_loop()
+        pages: asyncio.Queue = asyncio.Queue()
+
+        if self.mode in ("async", "hybrid"):
+            run = self._crawl_hybrid if self.mode == "hybrid" else self._crawl_async
+            crawl = asyncio.ensure_future(run(pages.put_nowait))
+        else:
+            def on_page(page: Dict):
+                loop.call_soon_threadsafe(pages.put_nowait, page)
+
+            crawl = loop.run_in_executor(None, self._crawl_sync, on_page)
+        crawl.add_done_callback(lambda _: pages.put_nowait(None))
+        try:
+            while True:
+                page = await pages.get()
+                if page is None:
+                    break
+                yield page
+            await crawl  # Surface crawl errors to the caller
+        finally:
+            if not crawl.done():
+                # The consumer stopped early or failed: stop crawling and close the browser
+                self._stopped = True
+                crawl.cancel()
+                await asyncio.gather(crawl, return_exceptions=True)
+
 if __name__ == "__main__":
     # Test run
     import sys
@@ -0,0 +1,160 @@
+"""
+Per-URL crawl ledger for incremental re-crawls.
+
+For every (scope, url) the ledger keeps the ETag, Last-Modified, a sha256
+of the extracted text and the page's outgoing links. A re-crawl of the
+same job sends conditional requests (If-None-Match / If-Modified-Since)
+and skips pages whose server answers 304 or whose text hash is unchanged;
+stored links keep the crawl walking through skipped pages. Pages the
+crawl finds gone are dropped from the ledger along with their chunks.
+
+Fingerprints are staged in a `LedgerSession` and only committed once the
+job's chunks are stored, so a failed ingestion never marks pages as done.
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CrawlLedger:
+    """SQLite-backed fingerprints of crawled URLs, scoped by job id"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS crawl_ledger ("
+            "scope TEXT NOT NULL, url TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+            "content_hash TEXT NOT NULL, links TEXT NOT NULL, fetched_at TEXT NOT NULL, "
+            "PRIMARY KEY (scope, url))"
+        )
+        self._db.commit()
+
+    @classmethod
+    def from_env(cls) -> "CrawlLedger":
+        return cls(path=os.getenv("CRAWL_LEDGER_PATH") or None)
+
+    def entries(self, scope: str) -> Dict[str, Dict]:
+        """Every fingerprint recorded for a scope, keyed by URL"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT url, etag, last_modified, content_hash, links FROM crawl_ledger WHERE scope = ?",
+                (scope,)
+            ).fetchall()
+        return {
+            url: {"etag": etag, "last_modified": modified, "content_hash": digest, "links": json.loads(links)}
+            for url, etag, modified, digest, links in rows
+        }
+
+    def record_many(self, scope: str, entries: Dict[str, Dict]):
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO crawl_ledger "
+                "(scope, url, etag, last_modified, content_hash, links, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(scope, url, e.get("etag"), e.get("last_modified"), e["content_hash"],
+                  json.dumps(e.get("links", [])), now) for url, e in entries.items()]
+            )
+            self._db.commit()
+
+    def delete_urls(self, scope: str, urls: Iterable[str]) -> int:
+        with self._lock:
+            removed = self._db.executemany(
+                "DELETE FROM crawl_ledger WHERE scope = ? AND url = ?", [(scope, url) for url in urls]
+            ).rowcount
+            self._db.commit()
+        return removed
+
+    def forget(self, scope: str) -> int:
+        """Drop a scope's fingerprints so its next crawl fetches everything"""
+        with self._lock:
+            removed = self._db.execute("DELETE FROM crawl_ledger WHERE scope = ?", (scope,)).rowcount
+            self._db.commit()
+        return removed
+
+    def session(self, scope: str) -> "LedgerSession":
+        return LedgerSession(self, scope)
+
+
+class LedgerSession:
+    """One crawl's view of the ledger: reads the previous fingerprints, stages new ones"""
+
+    def __init__(self, ledger: CrawlLedger, scope: str):
+        self.ledger = ledger
+        self.scope = scope
+        self.previous = ledger.entries(scope)
+        self.pending: Dict[str, Dict] = {}
+        self.removed: Set[str] = set()
+        self.unchanged = 0
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        entry = self.previous.get(url)
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def not_modified(self, url: str) -> List[str]:
+        """Handle a 304: keep the old fingerprint and return the page's stored links"""
+        entry = self.previous[url]
+        self.pending[url] = entry
+        self.unchanged += 1
+        return entry["links"]
+
+    def observe(self, url: str, content: str, links: Iterable[str] = (),
+                etag: Optional[str] = None, last_modified: Optional[str] = None) -> bool:
+        """Stage a fetched page's fingerprint; returns False when its text is unchanged"""
+        digest = content_hash(content)
+        self.pending[url] = {"etag": etag, "last_modified": last_modified,
+                             "content_hash": digest, "links": [link for link in links if link]}
+        previous = self.previous.get(url)
+        if previous and previous["content_hash"] == digest:
+            self.unchanged += 1
+            return False
+        return True
+
+    def drop(self, urls: Iterable[str]):
+        """Stage the removal of pages that are gone from the site"""
+        for url in urls:
+            self.pending.pop(url, None)
+            self.removed.add(url)
+
+    def commit(self) -> int:
+        """Persist staged fingerprints; call after the changed pages are stored"""
+        if self.removed:
+            self.ledger.delete_urls(self.scope, self.removed)
+            self.removed = set()
+        if self.pending:
+            self.ledger.record_many(self.scope, self.pending)
+        committed = len(self.pending)
+        self.pending = {}
+        logger.info(f"📒 Recorded {committed} crawl fingerprints for {self.scope} ({self.unchanged} unchanged)")
+        return committed
+
+
+_default_ledger: Optional[CrawlLedger] = None
+
+
+def get_crawl_ledger() -> CrawlLedger:
+    """Process-wide ledger configured from CRAWL_LEDGER_PATH"""
+    global _default_ledger
+    if _default_ledger is None:
+        _default_ledger = CrawlLedger.from_env()
+    return _default_ledger
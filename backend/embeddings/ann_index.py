@@ -0,0 +1,177 @@
+"""
+Search indexes over a partition's normalized embedding matrix.
+
+`FlatIndex` scores every row exactly. `IVFIndex` is an IVF-flat index
+(the same scheme as pgvector's ivfflat): rows are bucketed under
+spherical k-means centroids and a query only scans the `nprobe`
+closest buckets, trading recall for latency.
+"""
+
+from typing import List, Optional, Tuple
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row, leaving all-zero rows untouched"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_indices(scores: np.ndarray, limit: int) -> np.ndarray:
+    """Indices of the `limit` highest scores, sorted descending"""
+    if limit <= 0:
+        return np.empty(0, dtype=np.int64)
+    if limit < len(scores):
+        idx = np.argpartition(-scores, limit - 1)[:limit]
+    else:
+        idx = np.arange(len(scores))
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def top_k_per_row(scores: np.ndarray, limit: int) -> np.ndarray:
+    """Column indices of the `limit` highest scores in each row, sorted descending"""
+    n = scores.shape[1]
+    k = min(limit, n)
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < n:
+        idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        idx = np.broadcast_to(np.arange(n), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, idx, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(idx, order, axis=1)
+
+
+class FlatIndex:
+    """Exact brute-force search over every row"""
+
+    kind = "flat"
+
+    def add(self, vectors: np.ndarray):
+        pass
+
+    def keep(self, mask: np.ndarray):
+        pass
+
+    def search(self, vectors: np.ndarray, query: np.ndarray, limit: int,
+               nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        scores = vectors @ query
+        top = top_k_indices(scores, limit)
+        return top, scores[top]
+
+    def search_many(self, vectors: np.ndarray, queries: np.ndarray, limit: int,
+                    nprobe: Optional[int] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Score every query with one matrix-matrix product"""
+        scores = queries @ vectors.T
+        top = top_k_per_row(scores, limit)
+        return list(zip(top, np.take_along_axis(scores, top, axis=1)))
+
+
+class IVFIndex:
+    """Inverted-file index with spherical k-means centroids"""
+
+    kind = "ivf"
+    ASSIGN_BLOCK = 8192
+
+    def __init__(self, n_lists: int = 0, nprobe: int = 8, max_iter: int = 20,
+                 sample_per_list: int = 64, seed: int = 0):
+        self.n_lists = n_lists  # 0 = sqrt(rows) at training time
+        self.nprobe = nprobe
+        self.max_iter = max_iter
+        self.sample_per_list = sample_per_list
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._lists = None  # (rows covered, row order, list offsets)
+
+    @classmethod
+    def from_state(cls, state: dict) -> "IVFIndex":
+        """Restore a trained index from saved centroids and list assignments"""
+        index = cls(nprobe=int(state["nprobe"]))
+        index.centroids = np.asarray(state["centroids"], dtype=np.float32)
+        index.trained_size = int(state["trained_size"])
+        index._assignments = np.asarray(state["assignments"], dtype=np.int32)
+        return index
+
+    def state(self) -> dict:
+        """Arrays needed to restore this index without retraining"""
+        return {"centroids": self.centroids, "assignments": self._assignments,
+                "trained_size": self.trained_size, "nprobe": self.nprobe}
+
+    def train(self, vectors: np.ndarray) -> "IVFIndex":
+        """Fit centroids on (a sample of) the rows and bucket every row"""
+        n = len(vectors)
+        k = min(self.n_lists or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(self.seed)
+
+        sample_size = min(n, k * self.sample_per_list)
+        sample = vectors[np.sort(rng.choice(n, size=sample_size, replace=False))]
+        centroids = sample[rng.choice(sample_size, size=k, replace=False)].copy()
+
+        for _ in range(self.max_iter):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=k) == 0
+            if empty.any():
+                # Re-seed empty buckets from random sample rows
+                sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()))]
+            updated = normalize_rows(sums)
+            converged = np.allclose(updated, centroids, atol=1e-4)
+            centroids = updated
+            if converged:
+                break
+
+        self.centroids = centroids
+        self.trained_size = n
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._lists = None
+        self.add(vectors)
+        logger.info(f"🧭 Trained IVF index with {k} lists over {n} vectors")
+        return self
+
+    def add(self, vectors: np.ndarray):
+        """Bucket newly appended rows under their nearest centroid"""
+        if self.centroids is None or len(vectors) == 0:
+            return
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), self.ASSIGN_BLOCK):
+            block = vectors[start:start + self.ASSIGN_BLOCK]
+            labels[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        self._assignments = np.concatenate([self._assignments, labels])
+
+    def keep(self, mask: np.ndarray):
+        """Drop the rows where `mask` is False, keeping the trained centroids"""
+        self._assignments = self._assignments[mask]
+        self._lists = None
+
+    def _inverted_lists(self):
+        assignments = self._assignments
+        lists = self._lists
+        if lists is None or lists[0] != len(assignments):
+            order = np.argsort(assignments, kind="stable")
+            offsets = np.searchsorted(assignments[order], np.arange(len(self.centroids) + 1))
+            lists = (len(assignments), order, offsets)
+            self._lists = lists
+        return lists[1], lists[2]
+
+    def search(self, vectors: np.ndarray, query: np.ndarray, limit: int,
+               nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        order, offsets = self._inverted_lists()
+        probe = top_k_indices(self.centroids @ query, min(nprobe or self.nprobe, len(self.centroids)))
+        rows = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probe])
+        rows = rows[rows < len(vectors)]
+        scores = vectors[rows] @ query
+        top = top_k_indices(scores, limit)
+        return rows[top], scores[top]
+
+    def search_many(self, vectors: np.ndarray, queries: np.ndarray, limit: int,
+                    nprobe: Optional[int] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        # Each query probes different lists, so there is no shared product to batch
+        return [self.search(vectors, query, limit, nprobe=nprobe) for query in queries]
@@ -0,0 +1,105 @@
+"""
+Shared chunk contents for the vector store, with per-job reference counts.
+
+Chunks that went through the dedup stage carry a `content_key`. The pool
+keeps one entry per key (text, vector and MinHash signature) and counts,
+per job, the URLs referencing it. A job gets one row per key however many
+of its pages repeat the chunk; the row goes away when the job's last URL
+referencing it is deleted, and the entry when no job references it.
+A job's references are saved with its segment and restored on load.
+
+Callers hold `VectorStore._lock`; the pool does no locking of its own.
+"""
+
+from collections import Counter
+from typing import Dict, Iterable, Optional, Set
+import logging
+import numpy as np
+
+from ..processors.dedup import LSHIndex, get_min_hasher
+
+logger = logging.getLogger(__name__)
+
+
+class ContentPool:
+    """Deduplicated chunk contents referenced by (job, URL)"""
+
+    def __init__(self):
+        self._entries: Dict[str, Dict] = {}
+        self._refs: Dict[str, Dict[str, Counter]] = {}  # job -> key -> URL counts
+        self._lsh = LSHIndex(get_min_hasher())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def references(self, job_id: str, key: str) -> int:
+        return sum(self._refs.get(job_id, {}).get(key, Counter()).values())
+
+    def job_references(self, job_id: str) -> Dict[str, Dict[str, int]]:
+        """Every reference of a job, key -> {url: count}, for persisting with its segment"""
+        return {key: dict(urls) for key, urls in self._refs.get(job_id, {}).items()}
+
+    def restore(self, job_id: str, key: str, urls: Dict[str, int]):
+        """Re-create a job's saved references to a key, e.g. after a restart"""
+        if key not in self._entries:
+            self._entries[key] = {"key": key, "content": None, "vector": None}
+        self._refs.setdefault(job_id, {})[key] = Counter(urls)
+
+    def jobs(self, key: str) -> Set[str]:
+        return {job_id for job_id, keys in self._refs.items() if key in keys}
+
+    def match(self, key: str, signature: Optional[np.ndarray], threshold: float) -> Optional[Dict]:
+        """An entry with a vector equal to, or near-duplicate of, the given chunk"""
+        entry = self._entries.get(key)
+        if entry is None:
+            near = self._lsh.query(signature, threshold)
+            entry = self._entries.get(near) if near else None
+        return entry if entry is not None and entry.get("vector") is not None else None
+
+    def acquire(self, job_id: str, key: str, url: str, content: Optional[str] = None,
+                vector=None, signature: Optional[np.ndarray] = None) -> Dict:
+        """Count a reference from (job, url); returns the entry, with `new_row` set if the job lacked it"""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = {"key": key, "content": content, "vector": None}
+            self._lsh.add(key, signature)
+        if entry["content"] is None and content is not None:
+            entry["content"] = content
+        if entry["vector"] is None and vector is not None:
+            entry["vector"] = np.asarray(vector, dtype=np.float32)
+        urls = self._refs.setdefault(job_id, {}).setdefault(key, Counter())
+        new_row = not urls
+        urls[url] += 1
+        return {**entry, "new_row": new_row}
+
+    def _drop_unreferenced(self, keys: Iterable[str]):
+        for key in keys:
+            if not any(key in job_keys for job_keys in self._refs.values()):
+                self._entries.pop(key, None)
+                self._lsh.remove(key)
+
+    def release_urls(self, job_id: str, urls: Set[str]) -> Set[str]:
+        """Drop a job's references from these URLs; returns the keys the job no longer uses"""
+        job_keys = self._refs.get(job_id, {})
+        released = set()
+        for key, counts in list(job_keys.items()):
+            for url in urls & counts.keys():
+                del counts[url]
+            if not counts:
+                del job_keys[key]
+                released.add(key)
+        if not job_keys:
+            self._refs.pop(job_id, None)
+        self._drop_unreferenced(released)
+        return released
+
+    def release_job(self, job_id: str) -> int:
+        """Drop every reference of a job, returning how many keys it held"""
+        keys = self._refs.pop(job_id, {})
+        self._drop_unreferenced(keys)
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+        self._refs.clear()
+        self._lsh = LSHIndex(get_min_hasher())
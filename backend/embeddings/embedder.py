@@ -1,29 +1,34 @@
 import os
-from typing import List
+from typing import List, Optional
 import logging
+from .embedding_server import EmbeddingServer, embedding_model_id, get_embedding_server
 
 logger = logging.getLogger(__name__)
 
+class FallbackVectors(list):
+    """Mock vectors returned in place of a failed model's output; caches must not keep them"""
+    fallback = True
+
 class Embedder:
-    def __init__(self):
-        self.model = None
-        self.local = False
+    def __init__(self, model_name: Optional[str] = None, backend: Optional[str] = None,
+                 server: Optional[EmbeddingServer] = None):
+        # EMBED_MODEL names a local model served by the shared micro-batching worker pool
+        model_name = server.model_name if server else model_name or os.getenv("EMBED_MODEL", "")
+        self.local = bool(model_name)
+        self.server: Optional[EmbeddingServer] = None
+        # Identifies the vector space for caches; mock vectors get their own id
+        self.model_id = "mock"
+        # The model itself, for tokenizers and token budgets
+        self.model_name = model_name or "mock"
+        if model_name:
+            self.server = server or get_embedding_server(model_name, backend)
+            self.model_id = embedding_model_id(model_name, self.server.backend)
+            logger.info(f"🧠 Embedding with {model_name} ({self.server.backend})")
+            return
         # FORCING MOCK EMBEDDINGS TO UNBLOCK PIPELINE
         # The SentenceTransformer model is hanging on load on this machine.
         logger.warning("⚠️ FORCING MOCK EMBEDDINGS to avoid hang on model load.")
         logger.warning("⚠️ Quality will be low, but pipeline will work.")
-        
-        # try:
-        #     logger.info("Loading embedding model...")
-        #     from sentence_transformers import SentenceTransformer
-        #     # Use a smaller/faster model or ensure CPU optimization
-        #     self.model = SentenceTransformer('all-MiniLM-L6-v2', device='cpu')
-        #     self.local = True
-        #     logger.info("✅ Using local sentence-transformers for embeddings")
-        # except Exception as e:
-        #     logger.warning(f"⚠️ Failed to load sentence-transformers: {e}")
-        #     logger.warning("⚠️ Using MOCK embeddings instead.")
-        #     self.model = None
 
     async def embed_texts(self, texts: List[str]) -> List[List[float]]:
         if not texts:
@@ -32,24 +37,18 @@ class Embedder:
         
         logger.info(f"🧠 Generating embeddings for {len(texts)} texts...")
             
-        if not self.model:
+        if self.server is None:
             # Return mock embeddings (384 dimensions for all-MiniLM-L6-v2 compatibility)
             logger.warning("Using mock embeddings (model not loaded)")
             return [[0.1] * 384 for _ in texts]
             
         try:
-            # Run blocking operation in threadpool to avoid hanging the async loop
-            import asyncio
-            loop = asyncio.get_running_loop()
-            
-            def _encode():
-                return self.model.encode(texts, convert_to_numpy=True).tolist()
-                
-            embeddings = await loop.run_in_executor(None, _encode)
+            # Micro-batched with concurrent callers on the server's worker processes
+            embeddings = await self.server.embed(texts)
             
             logger.info(f"✅ Generated {len(embeddings)} embeddings")
             return embeddings
         except Exception as e:
             logger.error(f"❌ Embedding generation failed: {e}", exc_info=True)
-            # Fallback to mock
-            return [[0.1] * 384 for _ in texts]
+            # Fallback to mock, flagged so it isn't cached under the real model id
+            return FallbackVectors([0.1] * 384 for _ in texts)
@@ -0,0 +1,200 @@
+"""
+Embedding cache keyed by (model id, sha256 of text).
+
+A bounded in-memory LRU sits in front of an optional SQLite tier on disk,
+so re-ingesting identical chunks or repeating a query never re-embeds it.
+`CachedEmbedder` wraps any embedder (`embed_texts` or `embed` style) and
+only sends cache misses to the backend. SQLite lookups and commits run in
+a worker thread, off the event loop; vectors a backend flags as `fallback`
+(mock output after a model failure) are returned but never stored.
+"""
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, str]
+
+
+def text_key(model_id: str, text: str) -> Key:
+    return model_id, hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier (memory LRU + SQLite) embedding cache"""
+
+    SQLITE_BATCH = 500
+
+    def __init__(self, max_entries: int = 10000, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.path = path
+        self._memory: "OrderedDict[Key, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, hash))"
+            )
+            self._db.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingCache":
+        return cls(
+            max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000")),
+            path=os.getenv("EMBEDDING_CACHE_PATH") or None
+        )
+
+    def _remember(self, key: Key, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[Key]) -> List[Optional[np.ndarray]]:
+        """Look up keys in memory, then on disk; misses come back as None"""
+        found: List[Optional[np.ndarray]] = [None] * len(keys)
+        on_disk: Dict[Key, List[int]] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[i] = vector
+                    self.memory_hits += 1
+                else:
+                    on_disk.setdefault(key, []).append(i)
+
+            if self._db is not None and on_disk:
+                pending = list(on_disk)
+                for start in range(0, len(pending), self.SQLITE_BATCH):
+                    batch = pending[start:start + self.SQLITE_BATCH]
+                    for model_id in {m for m, _ in batch}:
+                        hashes = [h for m, h in batch if m == model_id]
+                        rows = self._db.execute(
+                            f"SELECT hash, vector FROM embeddings WHERE model = ? "
+                            f"AND hash IN ({','.join('?' * len(hashes))})",
+                            [model_id, *hashes]
+                        ).fetchall()
+                        for digest, blob in rows:
+                            key = (model_id, digest)
+                            vector = np.frombuffer(blob, dtype=np.float32)
+                            self._remember(key, vector)
+                            for i in on_disk.pop(key):
+                                found[i] = vector
+                                self.disk_hits += 1
+
+            self.misses += sum(len(positions) for positions in on_disk.values())
+        return found
+
+    def put_many(self, keys: List[Key], vectors: List[List[float]]):
+        """Store freshly computed vectors in both tiers"""
+        arrays = [np.asarray(v, dtype=np.float32) for v in vectors]
+        with self._lock:
+            for key, vector in zip(keys, arrays):
+                self._remember(key, vector)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)",
+                    [(m, h, v.tobytes()) for (m, h), v in zip(keys, arrays)]
+                )
+                self._db.commit()
+
+    def stats(self) -> Dict:
+        """Hit ratios per tier for monitoring"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "entries_in_memory": len(self._memory),
+            "max_entries": self.max_entries,
+            "disk_tier": bool(self._db),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+        }
+
+
+_default_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide cache configured from EMBEDDING_CACHE_SIZE / EMBEDDING_CACHE_PATH"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = EmbeddingCache.from_env()
+    return _default_cache
+
+
+class CachedEmbedder:
+    """Caching wrapper exposing both `embed_texts` and `embed` for any embedder"""
+
+    def __init__(self, embedder, model_id: Optional[str] = None, cache: Optional[EmbeddingCache] = None):
+        self.embedder = embedder
+        self.model_id = model_id or self._model_id(embedder)
+        # The model behind the vector space, for tokenizers and token budgets
+        self.model_name = getattr(embedder, "model_name", self.model_id)
+        self.cache = cache or get_embedding_cache()
+
+    @staticmethod
+    def _model_id(embedder) -> str:
+        for attr in ("model_id", "MODEL_NAME", "MODEL_ID", "MODEL"):
+            value = getattr(embedder, attr, None)
+            if isinstance(value, str):
+                return value
+        return type(embedder).__name__
+
+    async def _run(self, method, *args):
+        # SQLite reads and commits block, so they run off the event loop
+        if self.cache.path:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def _embed_backend(self, texts: List[str]) -> List[List[float]]:
+        if hasattr(self.embedder, "embed_texts"):
+            return await self.embedder.embed_texts(texts)
+        return await self.embedder.embed(texts)
+
+    async def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        keys = [text_key(self.model_id, t) for t in texts]
+        cached = await self._run(self.cache.get_many, keys)
+
+        # Send each distinct missing text to the backend once
+        missing: Dict[Key, int] = {}
+        for i, vector in enumerate(cached):
+            if vector is None and keys[i] not in missing:
+                missing[keys[i]] = i
+        if missing:
+            logger.info(f"🗃️ Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
+            fresh = await self._embed_backend([texts[i] for i in missing.values()])
+            if getattr(fresh, "fallback", False):
+                logger.warning("⚠️ Not caching fallback embeddings")
+            else:
+                await self._run(self.cache.put_many, list(missing), fresh)
+            by_key = dict(zip(missing, fresh))
+            return [by_key[k] if v is None else v.tolist() for k, v in zip(keys, cached)]
+        return [v.tolist() for v in cached]
+
+    async def embed(self, texts: Union[str, List[str]], batch_size: int = 32) -> List[List[float]]:
+        if isinstance(texts, str):
+            texts = [texts]
+        return await self.embed_texts(texts)
+
+    def __getattr__(self, name):
+        # get_dimensions() etc. fall through to the wrapped embedder
+        return getattr(self.embedder, name)
@@ -0,0 +1,236 @@
+"""
+Local embedding server: dynamic micro-batching on a dedicated process pool.
+
+Concurrent callers (query embeddings from /generate, chunk batches from
+ingestion) put their texts on one queue. A batcher coalesces whatever
+arrives within `max_wait_ms` into a micro-batch of up to `max_batch` texts
+and runs it on a worker process that holds the model, then resolves each
+caller's future with its own slice of the result.
+
+Each worker pins its torch/BLAS thread count (EMBED_TORCH_THREADS, default
+cores / workers), so workers don't oversubscribe the CPU and the GIL of the
+API process is never held by inference. If a worker dies, the pool is
+replaced and the batch retried once.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_model = None  # The model loaded in each worker process
+
+
+class MockModel:
+    """Stand-in model for the worker, matching Embedder's mock vectors"""
+
+    def encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        return np.full((len(texts), 384), 0.1, dtype=np.float32)
+
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def load_model(model_name: str, backend: str = "torch"):
+    """The model for a backend: sentence-transformers on torch, or an ONNX Runtime export (fp32/int8)"""
+    if model_name == "mock":
+        return MockModel()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {BACKENDS}")
+    if backend.startswith("onnx"):
+        from .onnx_backend import OnnxEmbeddingModel
+        return OnnxEmbeddingModel(model_name, quantized=backend == "onnx-int8")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, device="cpu")
+
+
+def _init_worker(model_name: str, backend: str, threads: int):
+    """Process initializer: pin thread counts before torch is imported, then load the model"""
+    global _model
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    if backend == "torch" and model_name != "mock":
+        import torch
+        torch.set_num_threads(threads)
+    _model = load_model(model_name, backend)
+
+
+def _encode(texts: List[str]) -> Tuple[np.ndarray, int]:
+    vectors = _model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+    return np.asarray(vectors, dtype=np.float32), os.getpid()
+
+
+class EmbeddingServer:
+    """Coalesces concurrent embed requests into micro-batches run on worker processes"""
+
+    def __init__(self, model_name: str,
+                 backend: str = os.getenv("EMBED_BACKEND", "torch"),
+                 workers: int = int(os.getenv("EMBED_WORKERS", "1")),
+                 threads: Optional[int] = None,
+                 max_batch: int = int(os.getenv("EMBED_MAX_BATCH", "64")),
+                 max_wait_ms: float = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))):
+        self.model_name = model_name
+        self.backend = backend
+        self.workers = workers
+        self.threads = threads or int(os.getenv("EMBED_TORCH_THREADS", "0")) or max(1, (os.cpu_count() or 1) // workers)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._running: set = set()
+        self._carry: Optional[Tuple[List[str], asyncio.Future]] = None  # Didn't fit the last batch
+        self.stats = {"requests": 0, "texts": 0, "batches": 0, "largest_batch": 0, "restarts": 0, "pids": set()}
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # Spawned (not forked) workers, since torch's thread pools don't survive fork
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(self.model_name, self.backend, self.threads)
+        )
+
+    def start(self):
+        """Spawn the worker processes and the batcher; called lazily by `embed`"""
+        if self._batcher is not None and not self._batcher.done():
+            return
+        if self._pool is None:
+            self._pool = self._new_pool()
+            logger.info(f"🧵 Embedding server for {self.model_name} ({self.backend}): {self.workers} workers x {self.threads} threads")
+        self._queue = asyncio.Queue()
+        self._carry = None
+        self._slots = asyncio.Semaphore(self.workers)
+        self._batcher = asyncio.create_task(self._batch_loop())
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Queue texts for the next micro-batches and wait for their vectors"""
+        if not texts:
+            return []
+        self.start()
+        self.stats["requests"] += 1
+        # Requests larger than a batch are queued in max_batch pieces
+        futures = []
+        for start in range(0, len(texts), self.max_batch):
+            future = asyncio.get_running_loop().create_future()
+            await self._queue.put((texts[start:start + self.max_batch], future))
+            futures.append(future)
+        return [vector for part in await asyncio.gather(*futures) for vector in part]
+
+    async def _next(self) -> Tuple[List[str], asyncio.Future]:
+        if self._carry is not None:
+            request, self._carry = self._carry, None
+            return request
+        return await self._queue.get()
+
+    async def _collect(self) -> List[Tuple[List[str], asyncio.Future]]:
+        """First waiting request, plus whatever else arrives within max_wait, up to max_batch texts"""
+        requests = [await self._next()]
+        size = len(requests[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if size + len(request[0]) > self.max_batch:
+                # Starts the next batch instead of overfilling this one
+                self._carry = request
+                break
+            requests.append(request)
+            size += len(request[0])
+        return requests
+
+    def _replace_pool(self, broken: ProcessPoolExecutor):
+        """Swap a pool whose worker died for a fresh one (once, however many batches saw it break)"""
+        if self._pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._new_pool()
+            self.stats["restarts"] += 1
+            logger.warning(f"♻️ Embedding worker died; restarted the pool for {self.model_name}")
+
+    async def _encode(self, texts: List[str]) -> Tuple[np.ndarray, int]:
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            pool = self._pool
+            try:
+                return await loop.run_in_executor(pool, _encode, texts)
+            except BrokenProcessPool:
+                self._replace_pool(pool)
+                if attempt:
+                    raise
+
+    async def _batch_loop(self):
+        while True:
+            # Wait for a free worker first, so requests keep coalescing while all are busy
+            await self._slots.acquire()
+            try:
+                requests = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.create_task(self._run(requests))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, requests: List[Tuple[List[str], asyncio.Future]]):
+        texts = [text for request_texts, _ in requests for text in request_texts]
+        try:
+            vectors, pid = await self._encode(texts)
+            self.stats["batches"] += 1
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(texts))
+            self.stats["texts"] += len(texts)
+            self.stats["pids"].add(pid)
+            offset = 0
+            for request_texts, future in requests:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(request_texts)].tolist())
+                offset += len(request_texts)
+        except Exception as e:
+            logger.error(f"❌ Embedding batch of {len(texts)} texts failed: {e}")
+            for _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    async def close(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            await asyncio.gather(self._batcher, *self._running, return_exceptions=True)
+            self._batcher = None
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+_servers: Dict[Tuple[str, str], EmbeddingServer] = {}
+
+
+def embedding_model_id(model_name: str, backend: str) -> str:
+    """Vector-space id for caches; ONNX and int8 vectors differ from torch's, so those backends get their own"""
+    return model_name if backend == "torch" else f"{model_name}:{backend}"
+
+
+def get_embedding_server(model_name: str, backend: Optional[str] = None) -> EmbeddingServer:
+    """One server per (model, backend), shared by every embedder instance in the process"""
+    backend = backend or os.getenv("EMBED_BACKEND", "torch")
+    server = _servers.get((model_name, backend))
+    if server is None:
+        server = _servers[(model_name, backend)] = EmbeddingServer(model_name, backend)
+    return server
+
+
+async def close_embedding_servers():
+    for server in list(_servers.values()):
+        await server.close()
+    _servers.clear()
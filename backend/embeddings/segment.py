@@ -0,0 +1,166 @@
+"""
+On-disk segment format for VectorStore partitions (one segment per job).
+
+    <root>/<segment>/vectors.npy   float32 (rows, dim), L2-normalized
+    <root>/<segment>/content.bin   UTF-8 chunk contents, back to back
+    <root>/<segment>/rows.npy      int64 (rows, 2 + columns): content start/end + column codes
+    <root>/<segment>/meta.json     job id, dimension and per-column value tables
+    <root>/<segment>/refs.json     content key -> {url: count} references of deduplicated rows
+    <root>/<segment>/ivf.npz       optional IVF centroids and list assignments
+
+Every array is memory-mapped read-only on load, so startup is a handful of
+mmap calls, resident memory follows the OS page cache, and several worker
+processes mapping the same files share one copy of the index.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import shutil
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+REFS_FILE = "refs.json"
+
+
+def segment_name(job_id: str) -> str:
+    """Filesystem-safe directory name for a job's segment"""
+    return hashlib.sha1(job_id.encode("utf-8")).hexdigest()[:16]
+
+
+class MappedRecords:
+    """Read-only, lazily decoded view of a segment's metadata records"""
+
+    def __init__(self, content: np.ndarray, rows: np.ndarray, columns: List[str],
+                 values: Dict[str, list], selection: Optional[range] = None):
+        self._content = content
+        self._rows = rows
+        self._columns = columns
+        self._values = values
+        self._selection = selection if selection is not None else range(len(rows))
+
+    def __len__(self) -> int:
+        return len(self._selection)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def column(self, name: str) -> list:
+        """One metadata column for every row, without decoding content"""
+        if name not in self._columns:
+            return [None] * len(self)
+        codes = self._rows[list(self._selection), 2 + self._columns.index(name)]
+        values = self._values[name]
+        return [values[code] if code >= 0 else None for code in codes]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return MappedRecords(self._content, self._rows, self._columns, self._values,
+                                 self._selection[key])
+        row = self._rows[self._selection[key]]
+        record = {"content": self._content[row[0]:row[1]].tobytes().decode("utf-8")}
+        for column, code in zip(self._columns, row[2:]):
+            if code >= 0:
+                record[column] = self._values[column][code]
+        return record
+
+
+def write_segment(root: Path, job_id: str, vectors: np.ndarray, records, index=None,
+                  refs: Optional[Dict[str, Dict[str, int]]] = None) -> Path:
+    """Write one partition as a segment directory, replacing any previous copy atomically"""
+    root.mkdir(parents=True, exist_ok=True)
+    target = root / segment_name(job_id)
+    tmp = root / f".{target.name}.tmp-{os.getpid()}"
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir()
+
+    columns = sorted({key for record in records for key in record if key != "content"})
+    values: Dict[str, list] = {c: [] for c in columns}
+    codes: Dict[str, Dict] = {c: {} for c in columns}
+    rows = np.empty((len(records), 2 + len(columns)), dtype=np.int64)
+
+    offset = 0
+    with open(tmp / "content.bin", "wb") as f:
+        for i, record in enumerate(records):
+            data = record["content"].encode("utf-8")
+            f.write(data)
+            rows[i, 0], rows[i, 1] = offset, offset + len(data)
+            offset += len(data)
+            for j, column in enumerate(columns):
+                value = record.get(column)
+                if value is None:
+                    rows[i, 2 + j] = -1
+                    continue
+                code = codes[column].get(value)
+                if code is None:
+                    code = codes[column][value] = len(values[column])
+                    values[column].append(value)
+                rows[i, 2 + j] = code
+
+    np.save(tmp / "vectors.npy", np.ascontiguousarray(vectors, dtype=np.float32))
+    np.save(tmp / "rows.npy", rows)
+    if index is not None and index.kind == "ivf":
+        np.savez(tmp / "ivf.npz", **index.state())
+    if refs is not None:
+        with open(tmp / REFS_FILE, "w", encoding="utf-8") as f:
+            json.dump(refs, f)
+    with open(tmp / META_FILE, "w", encoding="utf-8") as f:
+        json.dump({"job_id": job_id, "dim": int(vectors.shape[1]), "count": len(records),
+                   "columns": columns, "values": values}, f)
+
+    # Swap directories; readers that already mapped the old files keep their inodes
+    if target.exists():
+        old = root / f".{target.name}.old-{os.getpid()}"
+        os.replace(target, old)
+        os.replace(tmp, target)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.replace(tmp, target)
+    return target
+
+
+def read_segment(path: Path) -> Tuple[str, np.ndarray, MappedRecords, Optional[dict]]:
+    """Memory-map a segment, returning (job_id, vectors, records, ivf state)"""
+    with open(path / META_FILE, encoding="utf-8") as f:
+        meta = json.load(f)
+
+    vectors = np.load(path / "vectors.npy", mmap_mode="r")
+    rows = np.load(path / "rows.npy", mmap_mode="r")
+    content_path = path / "content.bin"
+    if content_path.stat().st_size:
+        content = np.memmap(content_path, dtype=np.uint8, mode="r")
+    else:
+        content = np.empty(0, dtype=np.uint8)
+    records = MappedRecords(content, rows, meta["columns"], meta["values"])
+
+    ivf_state = None
+    if (path / "ivf.npz").exists():
+        with np.load(path / "ivf.npz") as data:
+            ivf_state = {key: data[key] for key in data.files}
+    return meta["job_id"], vectors, records, ivf_state
+
+
+def read_refs(path: Path) -> Optional[Dict[str, Dict[str, int]]]:
+    """A segment's saved references, or None for segments written without them"""
+    if not (path / REFS_FILE).exists():
+        return None
+    with open(path / REFS_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_segments(root: Path) -> List[Path]:
+    """Complete segment directories under root (skips in-flight temp dirs)"""
+    if not root.is_dir():
+        return []
+    return sorted(p for p in root.iterdir() if not p.name.startswith(".") and (p / META_FILE).exists())
+
+
+def remove_segment(root: Path, job_id: str):
+    shutil.rmtree(root / segment_name(job_id), ignore_errors=True)
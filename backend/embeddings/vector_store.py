@@ -1,15 +1,126 @@
 import os
-from typing import List, Dict
+from typing import List, Dict, Optional
 import logging
-import json
+import threading
+from collections import OrderedDict
+import numpy as np
+from pathlib import Path
+from .ann_index import FlatIndex, IVFIndex, normalize_rows, top_k_indices
+from .content_pool import ContentPool
+from . import segment
 
 logger = logging.getLogger(__name__)
 
+
+class MockObject:
+    """Search hit that mimics Weaviate's result object"""
+    def __init__(self, properties: Dict, similarity: float = 0.0):
+        self.properties = properties
+        self.similarity = similarity
+
+
+class VectorMatrix:
+    """
+    Append-friendly float32 matrix of L2-normalized embeddings with an
+    aligned list of metadata records (row i of the matrix <-> records[i]).
+    """
+
+    INITIAL_CAPACITY = 256
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._vectors = np.empty((self.INITIAL_CAPACITY, dim), dtype=np.float32)
+        self._size = 0
+        self.records: List[Dict] = []
+        self.index = FlatIndex()
+        self.dirty = True  # True when the in-memory rows differ from the saved segment
+
+    @classmethod
+    def from_segment(cls, vectors: np.ndarray, records, index=None) -> "VectorMatrix":
+        """Wrap memory-mapped segment arrays without copying them"""
+        matrix = cls.__new__(cls)
+        matrix.dim = vectors.shape[1]
+        matrix._vectors = vectors
+        matrix._size = len(vectors)
+        matrix.records = records
+        matrix.index = index or FlatIndex()
+        matrix.dirty = False
+        return matrix
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """View of the filled rows"""
+        return self._vectors[:self._size]
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        capacity = self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        # Mapped segments are exactly full, so the first append copies them to the heap
+        capacity = max(capacity, self.INITIAL_CAPACITY)
+        while capacity < needed:
+            capacity *= 2
+        grown = np.empty((capacity, self.dim), dtype=np.float32)
+        grown[:self._size] = self._vectors[:self._size]
+        self._vectors = grown
+
+    def append(self, vectors: np.ndarray, records: List[Dict]):
+        """Normalize and append a block of vectors with their records"""
+        normalized = normalize_rows(vectors)
+        self._reserve(len(records))
+        self._vectors[self._size:self._size + len(records)] = normalized
+        self._size += len(records)
+        if not isinstance(self.records, list):
+            self.records = list(self.records)
+        self.records.extend(records)
+        self.index.add(normalized)
+        self.dirty = True
+
+    def column(self, name: str) -> list:
+        """One metadata field for every row (cheap on mapped segments)"""
+        if hasattr(self.records, "column"):
+            return self.records.column(name)
+        return [record.get(name) for record in self.records]
+
+    def keep_rows(self, mask: np.ndarray) -> int:
+        """Compact to the rows where `mask` is True, returning how many were dropped"""
+        removed = int(len(mask) - mask.sum())
+        if not removed:
+            return 0
+        # Fancy indexing copies, so searches holding the old views are unaffected
+        self._vectors = self._vectors[:self._size][mask]
+        self._size = len(self._vectors)
+        self.records = [record for record, keep in zip(self.records, mask) if keep]
+        self.index.keep(mask)
+        self.dirty = True
+        return removed
+
+
 class VectorStore:
-    """Simple in-memory vector store for prototyping (Singleton)"""
+    """Simple in-memory vector store for prototyping (Singleton), partitioned by job_id"""
     _instance = None
-    _chunks = []  # Class-level storage
-    
+    _partitions: "OrderedDict[str, VectorMatrix]" = OrderedDict()  # Class-level storage, LRU order
+    _lock = threading.RLock()
+    # Deduplicated contents shared across jobs, with per-job reference counts
+    content_pool = ContentPool()
+    # Bumped whenever a job's chunks change, so caches of derived results can tell they're stale
+    _versions: Dict[str, int] = {}
+    max_chunks = int(os.getenv("VECTOR_STORE_MAX_CHUNKS", "0"))  # 0 = unbounded
+    # "flat" = exact search, "ivf" = approximate IVF-flat once a job is large enough
+    index_type = os.getenv("VECTOR_INDEX", "flat")
+    index_min_rows = int(os.getenv("VECTOR_INDEX_MIN_ROWS", "2048"))
+    default_nprobe = int(os.getenv("VECTOR_INDEX_NPROBE", "8"))
+    # Directory of memory-mapped segments; empty = memory only
+    storage_path = os.getenv("VECTOR_STORE_PATH", "")
+    # Storage paths already loaded; load() replaces partitions, so it must finish before any writes
+    _loaded_paths: set = set()
+    _load_lock = threading.Lock()
+    read_only = os.getenv("VECTOR_STORE_READ_ONLY", "0") == "1"
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(VectorStore, cls).__new__(cls)
@@ -19,96 +130,347 @@ class VectorStore:
     def __init__(self):
         # Don't reset chunks on re-init
         pass
-        
+
     @property
-    def chunks(self):
-        return VectorStore._chunks
-        
-    def add_chunks(self, chunks: List[Dict]):
-        """Add chunks to the store"""
+    def chunks(self) -> List[Dict]:
+        with VectorStore._lock:
+            return [r for p in VectorStore._partitions.values() for r in p.records]
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def job_ids(self) -> List[str]:
+        """Job ids currently held in the store"""
+        return list(VectorStore._partitions.keys())
+
+    def count(self, job_id: str = None) -> int:
+        """Number of stored chunks, optionally for a single job"""
+        with VectorStore._lock:
+            if job_id is not None:
+                partition = VectorStore._partitions.get(job_id)
+                return len(partition) if partition else 0
+            return sum(len(p) for p in VectorStore._partitions.values())
+
+    def sample(self, job_id: str = None, limit: int = 5) -> List[Dict]:
+        """First `limit` records, optionally for a single job"""
+        with VectorStore._lock:
+            if job_id is not None:
+                partition = VectorStore._partitions.get(job_id)
+                return list(partition.records[:limit]) if partition else []
+            samples = []
+            for partition in VectorStore._partitions.values():
+                samples.extend(partition.records[:limit - len(samples)])
+                if len(samples) >= limit:
+                    break
+            return samples
+
+    def job_version(self, job_id: str) -> int:
+        """Changes every time chunks are added to or removed from the job"""
+        return VectorStore._versions.get(job_id, 0)
+
+    def _touch(self, job_id: str):
+        VectorStore._versions[job_id] = VectorStore._versions.get(job_id, 0) + 1
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError("Vector store is read-only (VECTOR_STORE_READ_ONLY=1)")
+
+    def delete_job(self, job_id: str) -> int:
+        """Drop every chunk of a job, returning how many were removed"""
+        self._check_writable()
+        with VectorStore._lock:
+            partition = VectorStore._partitions.pop(job_id, None)
+            self._touch(job_id)
+            self.content_pool.release_job(job_id)
+            if self.storage_path:
+                segment.remove_segment(Path(self.storage_path), job_id)
+        removed = len(partition) if partition else 0
+        if removed:
+            logger.info(f"🗑️ Deleted {removed} chunks for job_id: {job_id}")
+        return removed
+
+    def delete_urls(self, job_id: str, urls) -> int:
+        """
+        Drop a job's chunks for the given source URLs, returning how many were
+        removed. Deduplicated chunks stay while another URL of the job still
+        references them.
+        """
+        self._check_writable()
+        urls = set(urls)
+        with VectorStore._lock:
+            partition = VectorStore._partitions.get(job_id)
+            if partition is None or not urls:
+                return 0
+            released = self.content_pool.release_urls(job_id, urls)
+            mask = np.fromiter(
+                (key not in released if key else url not in urls
+                 for url, key in zip(partition.column("url"), partition.column("content_key"))),
+                dtype=bool, count=len(partition)
+            )
+            removed = partition.keep_rows(mask)
+            if removed:
+                self._touch(job_id)
+            if removed and len(partition) == 0:
+                VectorStore._partitions.pop(job_id)
+                if self.storage_path:
+                    segment.remove_segment(Path(self.storage_path), job_id)
+        if removed:
+            logger.info(f"🗑️ Deleted {removed} chunks from {len(urls)} URLs of job_id: {job_id}")
+        return removed
+
+    def replace_chunks(self, chunks: List[Dict], urls=None) -> int:
+        """
+        Swap in new chunks for their URLs: old chunks of each (job, url) are
+        removed and the new ones added under one lock, so searches never
+        see a page with both versions or neither. `urls` limits which URLs
+        are cleared (e.g. only on a page's first batch).
+        """
+        by_job: Dict[str, set] = {}
+        for chunk in chunks:
+            record = self._to_record(chunk)
+            if urls is None or record["url"] in urls:
+                by_job.setdefault(record["job_id"], set()).add(record["url"])
+        with VectorStore._lock:
+            for job_id, job_urls in by_job.items():
+                self.delete_urls(job_id, job_urls)
+            return self.add_chunks(chunks)
+
+    def evict(self, max_chunks: int) -> List[str]:
+        """Drop least recently used jobs until at most `max_chunks` chunks remain"""
+        evicted = []
+        with VectorStore._lock:
+            total = self.count()
+            while total > max_chunks and len(VectorStore._partitions) > 1:
+                job_id, partition = VectorStore._partitions.popitem(last=False)
+                self._touch(job_id)
+                self.content_pool.release_job(job_id)
+                total -= len(partition)
+                evicted.append(job_id)
+        if evicted:
+            logger.info(f"♻️ Evicted {len(evicted)} jobs to stay under {max_chunks} chunks")
+        return evicted
+
+    @staticmethod
+    def _to_record(chunk: Dict) -> Dict:
+        # Accept both {"content", "metadata": {...}} and already-flat chunks
+        metadata = chunk.get("metadata", chunk)
+        record = {
+            "content": chunk["content"],
+            "url": metadata.get("url", ""),
+            "source": metadata.get("source", "unknown"),
+            "job_id": metadata.get("job_id", ""),
+        }
+        # Where in the document the chunk came from (semantic chunker) and its dedup key
+        for key in ("heading", "symbol", "content_key"):
+            if metadata.get(key):
+                record[key] = metadata[key]
+        return record
+
+    def _share(self, record: Dict, chunk: Dict) -> bool:
+        """Reference a deduplicated chunk's pooled content; False if the job already has its row"""
+        entry = self.content_pool.acquire(record["job_id"], record["content_key"], record["url"],
+                                          record["content"], chunk["vector"], chunk.get("signature"))
+        record["content"] = entry["content"]  # One string object for every job's row
+        return entry["new_row"]
+
+    def add_chunks(self, chunks: List[Dict]) -> int:
+        """Add chunks to the store, returning how many rows were added"""
         logger.info(f"📝 Adding {len(chunks)} chunks to vector store...")
-        
+        self._check_writable()
+
         try:
-            for idx, chunk in enumerate(chunks):
-                # Store the chunk with all its data
-                stored_chunk = {
-                    "content": chunk["content"],
-                    "url": chunk["metadata"].get("url", ""),
-                    "source": chunk["metadata"].get("source", "unknown"),
-                    "job_id": chunk["metadata"].get("job_id", ""),
-                    "vector": chunk.get("vector", [])
-                }
-                VectorStore._chunks.append(stored_chunk)
-                
-                if (idx + 1) % 10 == 0:
-                    logger.info(f"  Stored {idx + 1}/{len(chunks)} chunks...")
-            
-            logger.info(f"✅ Successfully added {len(chunks)} chunks (total: {len(VectorStore._chunks)})")
+            with_vectors = [c for c in chunks if len(c.get("vector", [])) > 0]
+            skipped = len(chunks) - len(with_vectors)
+            if skipped:
+                logger.warning(f"⚠️ Skipping {skipped} chunks without vectors")
+
+            with VectorStore._lock:
+                # Group by job so each partition gets one contiguous append
+                by_job: Dict[str, List[Dict]] = {}
+                for chunk in with_vectors:
+                    record = self._to_record(chunk)
+                    if "content_key" in record and not self._share(record, chunk):
+                        continue
+                    by_job.setdefault(record["job_id"], []).append((record, chunk["vector"]))
+
+                for job_id, items in by_job.items():
+                    vectors = np.asarray([v for _, v in items], dtype=np.float32)
+                    partition = VectorStore._partitions.get(job_id)
+                    if partition is None:
+                        partition = VectorMatrix(vectors.shape[1])
+                        VectorStore._partitions[job_id] = partition
+                    if vectors.shape[1] != partition.dim:
+                        raise ValueError(
+                            f"Vector dimension {vectors.shape[1]} does not match "
+                            f"dimension {partition.dim} of job {job_id}"
+                        )
+                    partition.append(vectors, [r for r, _ in items])
+                    self._touch(job_id)
+                    self._maybe_build_index(partition)
+                    VectorStore._partitions.move_to_end(job_id)
+
+                if self.max_chunks:
+                    self.evict(self.max_chunks)
+
+            added = sum(len(items) for items in by_job.values())
+            if added < len(with_vectors):
+                logger.info(f"🧬 {len(with_vectors) - added} chunks already stored for their job; counted as references")
+            logger.info(f"✅ Successfully added {added} chunks (total: {self.count()})")
+            return added
         except Exception as e:
             logger.error(f"❌ Failed to add chunks: {e}", exc_info=True)
             raise
-    
-    def search_by_vector(self, vector: List[float], limit: int = 5, job_id: str = None):
-        """Search for similar vectors using cosine similarity"""
-        logger.info(f"� Searching for {limit} similar chunks (job_id: {job_id})...")
-        
+
+    def _maybe_build_index(self, partition: VectorMatrix):
+        """(Re)train an IVF index once a partition is big enough or has outgrown its centroids"""
+        if self.index_type != "ivf" or len(partition) < self.index_min_rows:
+            return
+        index = partition.index
+        if isinstance(index, IVFIndex) and len(partition) < 4 * index.trained_size:
+            return
+        partition.index = IVFIndex(nprobe=self.default_nprobe).train(partition.vectors)
+
+    def search_by_vector(self, vector: List[float], limit: int = 5, job_id: str = None,
+                         nprobe: Optional[int] = None):
+        """
+        Search for similar vectors using cosine similarity.
+
+        `nprobe` sets how many IVF lists to scan on partitions with an
+        approximate index (higher = better recall, slower); flat
+        partitions ignore it.
+        """
+        logger.info(f"🔍 Searching for {limit} similar chunks (job_id: {job_id})...")
+        results = self.search_by_vectors([vector], limit, job_id, nprobe=nprobe)
+        return results[0] if results else []
+
+    def search_by_vectors(self, vectors, limit: int = 5, job_id: str = None,
+                          nprobe: Optional[int] = None) -> List[List[MockObject]]:
+        """
+        Search many query vectors at once, returning one hit list per query.
+
+        Flat partitions score the whole batch with a single matrix-matrix
+        product instead of one scan per query.
+        """
         try:
-            # Filter by job_id if provided
-            filtered_chunks = self.chunks
-            if job_id:
-                filtered_chunks = [c for c in self.chunks if c["job_id"] == job_id]
-                logger.info(f"  Filtered to {len(filtered_chunks)} chunks for job_id: {job_id}")
-            
-            if not filtered_chunks:
-                logger.warning(f"⚠️ No chunks found for job_id: {job_id}")
+            queries = np.asarray(vectors, dtype=np.float32)
+            if queries.ndim != 2 or len(queries) == 0:
+                logger.warning(f"⚠️ Invalid query matrix of shape {queries.shape}")
                 return []
-            
-            # Calculate cosine similarity
-            import numpy as np
-            
+            empty = [[] for _ in range(len(queries))]
+            valid = np.any(queries, axis=1)
+            if not valid.all():
+                logger.warning(f"⚠️ Ignoring {int((~valid).sum())} all-zero query vectors")
+            queries = normalize_rows(queries)
+
+            with VectorStore._lock:
+                if job_id:
+                    partition = VectorStore._partitions.get(job_id)
+                    if partition is None:
+                        logger.warning(f"⚠️ No chunks found for job_id: {job_id}")
+                        return empty
+                    VectorStore._partitions.move_to_end(job_id)
+                    partitions = [partition]
+                else:
+                    partitions = list(VectorStore._partitions.values())
+                # Snapshot views so concurrent appends don't shift rows under us
+                snapshots = [(p.vectors, p.records[:len(p)], p.index) for p in partitions]
+
+            # Top-k per partition, then merge the candidates per query
+            candidates = [[] for _ in range(len(queries))]
+            for part_vectors, records, index in snapshots:
+                if part_vectors.shape[1] != queries.shape[1] or len(records) == 0:
+                    continue
+                for q, (rows, scores) in enumerate(index.search_many(part_vectors, queries, limit, nprobe=nprobe)):
+                    candidates[q].extend((float(score), records[i]) for i, score in zip(rows, scores))
+
             results = []
-            query_vec = np.array(vector)
-            
-            for chunk in filtered_chunks:
-                if not chunk["vector"]:
+            for q, hits in enumerate(candidates):
+                if not hits or not valid[q]:
+                    results.append([])
                     continue
-                    
-                chunk_vec = np.array(chunk["vector"])
-                
-                # Cosine similarity
-                similarity = np.dot(query_vec, chunk_vec) / (
-                    np.linalg.norm(query_vec) * np.linalg.norm(chunk_vec)
-                )
-                
-                results.append({
-                    "similarity": float(similarity),
-                    "chunk": chunk
-                })
-            
-            # Sort by similarity (highest first)
-            results.sort(key=lambda x: x["similarity"], reverse=True)
-            
-            # Return top results as mock Weaviate objects
-            top_results = results[:limit]
-            logger.info(f"✅ Found {len(top_results)} results")
-            
-            # Create mock objects that match Weaviate's API
-            class MockObject:
-                def __init__(self, properties):
-                    self.properties = properties
-            
-            return [MockObject(r["chunk"]) for r in top_results]
-            
+                top = top_k_indices(np.asarray([score for score, _ in hits], dtype=np.float32), limit)
+                results.append([MockObject(hits[i][1], hits[i][0]) for i in top])
+
+            logger.info(f"✅ Found {sum(len(r) for r in results)} results for {len(queries)} queries")
+            return results
+
         except Exception as e:
             logger.error(f"❌ Search failed: {e}", exc_info=True)
             return []
-    
+
+    def save(self, job_ids: Optional[List[str]] = None) -> int:
+        """
+        Persist partitions as memory-mappable segments under storage_path.
+
+        Only partitions changed since the last save/load are rewritten.
+        Returns the number of segments written.
+        """
+        if not self.storage_path:
+            return 0
+        self._check_writable()
+        root = Path(self.storage_path)
+        written = 0
+        with VectorStore._lock:
+            for job_id in job_ids or list(VectorStore._partitions):
+                partition = VectorStore._partitions.get(job_id)
+                if partition is None or not partition.dirty:
+                    continue
+                segment.write_segment(root, job_id, partition.vectors, partition.records, partition.index,
+                                      refs=self.content_pool.job_references(job_id))
+                partition.dirty = False
+                written += 1
+        if written:
+            logger.info(f"💾 Saved {written} vector store segments to {root}")
+        return written
+
+    def load(self) -> int:
+        """Memory-map every saved segment under storage_path, returning the chunk count"""
+        if not self.storage_path:
+            return 0
+        root = Path(self.storage_path)
+        loaded = 0
+        for path in segment.list_segments(root):
+            try:
+                job_id, vectors, records, ivf_state = segment.read_segment(path)
+                refs = segment.read_refs(path)
+            except Exception as e:
+                logger.error(f"❌ Failed to load segment {path}: {e}", exc_info=True)
+                continue
+            index = IVFIndex.from_state(ivf_state) if ivf_state else None
+            with VectorStore._lock:
+                VectorStore._partitions[job_id] = VectorMatrix.from_segment(vectors, records, index)
+                self._touch(job_id)
+                # Restore reference counts, from every URL, so deletes of shared chunks stay correct
+                self.content_pool.release_job(job_id)
+                if refs is not None:
+                    for key, urls in refs.items():
+                        self.content_pool.restore(job_id, key, urls)
+                else:
+                    # Segments saved without references: each row's own URL is all that is known
+                    for url, key in zip(records.column("url"), records.column("content_key")):
+                        if key:
+                            self.content_pool.acquire(job_id, key, url)
+            loaded += len(records)
+        logger.info(f"📂 Mapped {loaded} chunks from {root} (read_only={self.read_only})")
+        return loaded
+
+    def ensure_loaded(self) -> int:
+        """Load the persisted index once per process; concurrent callers wait for that first load"""
+        if not self.storage_path:
+            return 0
+        with VectorStore._load_lock:
+            if self.storage_path in VectorStore._loaded_paths:
+                return 0
+            loaded = self.load()
+            VectorStore._loaded_paths.add(self.storage_path)
+            return loaded
+
     def search(self, query: str, limit: int = 5, job_id: str = None):
         """Search using text query (not implemented for simple store)"""
         logger.warning("⚠️ Text search not supported in simple store, use search_by_vector")
         return []
-    
+
     def close(self):
         """Close the connection (no-op for in-memory store)"""
-        logger.info(f"📊 Vector store stats: {len(self.chunks)} total chunks stored")
+        logger.info(f"📊 Vector store stats: {len(self)} total chunks stored")
         pass
@@ -0,0 +1,185 @@
+"""
+Rate-limit-aware request engine for GitHub.
+
+- Bounded concurrency: at most `concurrency` requests in flight per engine.
+- Backoff: waits out `Retry-After`, or sleeps until `X-RateLimit-Reset`
+  when `X-RateLimit-Remaining` hits zero, and backs off exponentially on
+  secondary rate limits and 5xx responses. A reset further off than
+  `max_wait` raises `RateLimitError` rather than sending a doomed request.
+- Conditional requests: responses with an ETag are cached process-wide, and
+  repeat requests send `If-None-Match`. GitHub answers 304 for unchanged
+  resources without charging the rate limit, and the cached body is
+  returned as a normal 200 response.
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import httpx
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str]
+# Headers callers read from cached responses
+_KEPT_HEADERS = ("content-type", "link", "etag")
+
+
+class RateLimitError(Exception):
+    """Raised when the quota resets later than the client is willing to wait"""
+
+
+class ETagCache:
+    """LRU of (etag, body, headers) per (credential, url), bounded by entries and total body bytes"""
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # One body may take at most 1/8 of the budget, so a few large files can't flush the rest
+        self.max_entry_bytes = max_bytes // 8
+        self.total_bytes = 0
+        self._entries: "OrderedDict[CacheKey, Tuple[str, bytes, Dict[str, str]]]" = OrderedDict()
+
+    def get(self, key: CacheKey):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _drop(self, key: CacheKey):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= len(entry[1])
+
+    def put(self, key: CacheKey, etag: str, content: bytes, headers: Dict[str, str]):
+        self._drop(key)
+        if len(content) > self.max_entry_bytes:
+            return
+        self._entries[key] = (etag, content, headers)
+        self.total_bytes += len(content)
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_default_etag_cache: Optional[ETagCache] = None
+
+
+def get_etag_cache() -> ETagCache:
+    """Process-wide cache, so re-ingesting a repo revalidates instead of re-downloading"""
+    global _default_etag_cache
+    if _default_etag_cache is None:
+        _default_etag_cache = ETagCache(int(os.getenv("GITHUB_ETAG_CACHE_SIZE", "2048")),
+                                        int(os.getenv("GITHUB_ETAG_CACHE_BYTES", str(32 * 1024 * 1024))))
+    return _default_etag_cache
+
+
+class GitHubAPIClient:
+    """Concurrency-bounded GET requests with rate-limit backoff and ETag revalidation"""
+
+    def __init__(self, client_for: Callable[[str], httpx.AsyncClient],
+                 concurrency: int = int(os.getenv("GITHUB_CONCURRENCY", "8")),
+                 max_retries: int = 3,
+                 max_wait: float = float(os.getenv("GITHUB_MAX_RATE_LIMIT_WAIT", "60")),
+                 backoff_base: float = 1.0,
+                 etag_cache: Optional[ETagCache] = None):
+        self._client_for = client_for
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+        self.backoff_base = backoff_base
+        self.etag_cache = etag_cache if etag_cache is not None else get_etag_cache()
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        self.stats = {"requests": 0, "not_modified": 0, "retries": 0, "waited_seconds": 0.0}
+
+    @staticmethod
+    def _credential(headers: Dict[str, str]) -> str:
+        # Never share cached private content between tokens
+        auth = headers.get("Authorization", "")
+        return hashlib.sha256(auth.encode("utf-8")).hexdigest()[:16] if auth else ""
+
+    def _observe(self, response: httpx.Response):
+        remaining = response.headers.get("x-ratelimit-remaining")
+        reset = response.headers.get("x-ratelimit-reset")
+        if remaining is not None and remaining.isdigit():
+            self.remaining = int(remaining)
+        if reset is not None and reset.isdigit():
+            self.reset_at = float(reset)
+
+    def _retry_delay(self, response: httpx.Response, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying, or None when the response is final"""
+        status = response.status_code
+        if status in (403, 429):
+            retry_after = response.headers.get("retry-after")
+            if retry_after is not None:
+                try:
+                    return max(0.0, float(retry_after))
+                except ValueError:
+                    pass
+            if response.headers.get("x-ratelimit-remaining") == "0" and self.reset_at:
+                return max(0.0, self.reset_at - time.time()) + 1.0
+            if status == 429 or "rate limit" in response.text.lower():
+                return self.backoff_base * 2 ** attempt
+            return None  # A real permission error
+        if status >= 500:
+            return self.backoff_base * 2 ** attempt
+        return None
+
+    async def _sleep(self, seconds: float, reason: str):
+        logger.warning(f"⏳ GitHub {reason}; waiting {seconds:.1f}s")
+        self.stats["waited_seconds"] += seconds
+        await asyncio.sleep(seconds)
+
+    async def _wait_for_quota(self):
+        if self.remaining != 0 or self.reset_at is None:
+            return
+        wait = self.reset_at - time.time()
+        if wait <= 0:
+            self.remaining = None
+        elif wait <= self.max_wait:
+            await self._sleep(wait, "rate limit exhausted")
+            self.remaining = None
+        else:
+            # Sending anyway would only earn a 403/429
+            logger.warning(f"⚠️ GitHub rate limit resets in {wait:.0f}s, more than {self.max_wait:.0f}s; giving up")
+            raise RateLimitError(f"GitHub rate limit exhausted; resets in {wait:.0f}s")
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """GET with backoff; a 304 on a cached URL comes back as the cached 200"""
+        headers = dict(headers or {})
+        key = (self._credential(headers), url)
+        cached = self.etag_cache.get(key)
+        if cached is not None:
+            headers["If-None-Match"] = cached[0]
+
+        for attempt in range(self.max_retries + 1):
+            await self._wait_for_quota()
+            async with self._semaphore:
+                response = await self._client_for(url).get(url, headers=headers, follow_redirects=True)
+            self.stats["requests"] += 1
+            self._observe(response)
+
+            if response.status_code == 304 and cached is not None:
+                self.stats["not_modified"] += 1
+                return httpx.Response(200, content=cached[1], headers=cached[2], request=response.request)
+
+            delay = self._retry_delay(response, attempt)
+            if delay is None or attempt == self.max_retries:
+                break
+            if delay > self.max_wait:
+                logger.warning(f"⚠️ GitHub asked to wait {delay:.0f}s for {url}, more than {self.max_wait:.0f}s; giving up")
+                break
+            self.stats["retries"] += 1
+            await self._sleep(delay, f"returned {response.status_code} for {url}")
+
+        etag = response.headers.get("etag")
+        if response.status_code == 200 and etag:
+            kept = {name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers}
+            self.etag_cache.put(key, etag, response.content, kept)
+        return response
@@ -1,19 +1,197 @@
 import httpx
 import base64
+import io
 import logging
-from typing import List, Dict, Optional
+import os
+import tarfile
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Iterator, List, Dict, Optional, Tuple
+import asyncio
+import re
+from ..services.http_clients import HTTPClientRegistry, get_http_clients
+from .api_client import GitHubAPIClient
 
 logger = logging.getLogger(__name__)
 
+DOC_EXTENSIONS = (".md", ".mdx", ".rst", ".txt")
+SOURCE_EXTENSIONS = (".py", ".js", ".jsx", ".ts", ".tsx", ".go", ".rs", ".java", ".kt",
+                     ".rb", ".php", ".c", ".h", ".cpp", ".hpp", ".cs", ".swift", ".scala")
+# Vendored and generated trees are noise for documentation
+SKIP_DIRS = {"node_modules", "vendor", "dist", "build", ".git", "__pycache__", ".venv", "venv"}
+
+
+def is_doc_path(path: str) -> bool:
+    return path.lower().endswith(DOC_EXTENSIONS)
+
+
+def wanted_file(path: str, size: int, max_bytes: int, include_source: bool = True) -> bool:
+    """Pick files by extension, directory and size before anything is downloaded or decoded"""
+    if size > max_bytes or any(part in SKIP_DIRS for part in path.split("/")[:-1]):
+        return False
+    return is_doc_path(path) or (include_source and path.lower().endswith(SOURCE_EXTENSIONS))
+
+
+def decode_text(data: bytes) -> Optional[str]:
+    """UTF-8 text, or None for binaries that slipped through the extension filter"""
+    if b"\0" in data[:8000]:
+        return None
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+def read_tar(fileobj, wanted: Callable[[str, int], bool], mode: str = "r|*",
+             strip_root: bool = False) -> Iterator[Tuple[str, str]]:
+    """
+    Stream (path, text) pairs out of a tar archive in a single forward pass.
+
+    Members are filtered on path and header size, so skipped files are never
+    read or decoded. `strip_root` drops the top-level directory GitHub
+    tarballs wrap everything in.
+    """
+    with tarfile.open(fileobj=fileobj, mode=mode) as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            path = member.name
+            if strip_root:
+                path = path.split("/", 1)[1] if "/" in path else path
+            if not wanted(path, member.size):
+                continue
+            text = decode_text(archive.extractfile(member).read())
+            if text:
+                yield path, text
+
+
+async def iter_in_thread(make_iterator: Callable[[], Iterator], max_pending: int = 8,
+                         on_cancel: Optional[Callable[[], None]] = None) -> AsyncIterator:
+    """
+    Drive a blocking iterator on a worker thread, yielding its items with
+    back-pressure. `on_cancel` runs if the consumer stops early, e.g. to cut
+    off the input the iterator is blocked on.
+    """
+    loop = asyncio.get_running_loop()
+    items: asyncio.Queue = asyncio.Queue(max_pending)
+    done = object()
+    cancelled = threading.Event()
+
+    def run():
+        try:
+            for item in make_iterator():
+                if cancelled.is_set():
+                    return
+                asyncio.run_coroutine_threadsafe(items.put(item), loop).result()
+            outcome = done
+        except BaseException as e:
+            outcome = e
+        asyncio.run_coroutine_threadsafe(items.put(outcome), loop).result()
+
+    worker = loop.run_in_executor(None, run)
+    try:
+        while True:
+            item = await items.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        if on_cancel:
+            on_cancel()
+        # Unblock a producer waiting on a full queue
+        while not items.empty():
+            items.get_nowait()
+        await worker
+
+
+async def iter_completed(coroutines: Iterable[Awaitable]) -> AsyncIterator:
+    """
+    Run coroutines concurrently and yield their results as they finish.
+    Requests still in flight are cancelled if the consumer stops early.
+    """
+    tasks = [asyncio.ensure_future(c) for c in coroutines]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class _BlockingByteStream(io.RawIOBase):
+    """Blocking file object over an async byte iterator, for `read_tar` on a worker thread"""
+
+    def __init__(self, chunks: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop):
+        self._chunks = chunks
+        self._loop = loop
+        self._buffer = b""
+        self._aborted = False
+
+    def readable(self) -> bool:
+        return True
+
+    def abort(self):
+        """Report end-of-stream from now on, so the reader thread stops early"""
+        self._aborted = True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer:
+            if self._aborted:
+                return 0
+            future = asyncio.run_coroutine_threadsafe(self._chunks.__anext__(), self._loop)
+            try:
+                self._buffer = future.result()
+            except StopAsyncIteration:
+                return 0
+        n = min(len(buffer), len(self._buffer))
+        buffer[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
 class GitHubFetcher:
-    def __init__(self, repo_url: str, token: Optional[str] = None):
+    DOC_EXTENSIONS = DOC_EXTENSIONS
+    DOC_DIRS = ("docs", "doc")
+    # "tree": one recursive git-tree call + raw file downloads
+    # "tarball": stream the repo archive and extract matching files on the fly
+    # "contents": legacy per-file /contents calls (root and docs/ only)
+    MODES = ("tree", "tarball", "contents")
+
+    def __init__(self, repo_url: str, token: Optional[str] = None,
+                 http_clients: Optional[HTTPClientRegistry] = None,
+                 mode: str = os.getenv("GITHUB_FETCH_MODE", "tree"),
+                 ref: str = "HEAD",
+                 max_file_bytes: int = int(os.getenv("GITHUB_MAX_FILE_BYTES", "200000")),
+                 include_source: bool = os.getenv("GITHUB_INCLUDE_SOURCE", "1") == "1"):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown GitHub fetch mode {mode!r}, expected one of {self.MODES}")
         self.repo_url = repo_url
+        self._http_clients = http_clients
         self.token = token
+        self.mode = mode
+        self.ref = ref
+        self.max_file_bytes = max_file_bytes
+        self.include_source = include_source
         self.owner, self.repo = self._parse_url(repo_url)
         self.base_url = f"https://api.github.com/repos/{self.owner}/{self.repo}"
+        self.raw_url = f"https://raw.githubusercontent.com/{self.owner}/{self.repo}/{ref}"
         self.headers = {"Accept": "application/vnd.github.v3+json"}
         if token:
             self.headers["Authorization"] = f"Bearer {token}"
+        # Every API and raw download goes through one bounded, rate-limit-aware engine
+        self.api = GitHubAPIClient(self._client)
+
+    def _client(self, url: Optional[str] = None) -> httpx.AsyncClient:
+        return (self._http_clients or get_http_clients()).get(url or self.base_url)
+
+    def _wanted(self, path: str, size: int) -> bool:
+        return wanted_file(path, size, self.max_file_bytes, self.include_source)
+
+    def _document(self, path: str, content: str) -> Dict:
+        return {"content": content, "url": f"{self.repo_url}/blob/{self.ref}/{path}", "source": "github", "title": path}
 
     def _parse_url(self, url: str):
         # Expected format: https://github.com/owner/repo
@@ -21,36 +199,165 @@ class GitHubFetcher:
         return parts[-2], parts[-1]
 
     async def fetch_file(self, path: str) -> Optional[str]:
-        async with httpx.AsyncClient() as client:
-            url = f"{self.base_url}/contents/{path}"
-            logger.info(f"Fetching file: {url}")
-            resp = await client.get(url, headers=self.headers)
-            
-            if resp.status_code == 200:
-                data = resp.json()
-                if isinstance(data, dict) and data.get('type') == 'file':
-                    content = base64.b64decode(data['content']).decode('utf-8')
-                    return content
-            else:
-                logger.warning(f"Failed to fetch {path}: {resp.status_code}")
-            return None
+        url = f"{self.base_url}/contents/{path}"
+        logger.info(f"Fetching file: {url}")
+        resp = await self.api.get(url, self.headers)
+        
+        if resp.status_code == 200:
+            data = resp.json()
+            if isinstance(data, dict) and data.get('type') == 'file':
+                content = base64.b64decode(data['content']).decode('utf-8')
+                return content
+        else:
+            logger.warning(f"Failed to fetch {path}: {resp.status_code}")
+        return None
 
-    async def fetch_commits(self, limit: int = 20) -> List[Dict]:
-        async with httpx.AsyncClient() as client:
-            url = f"{self.base_url}/commits?per_page={limit}"
-            resp = await client.get(url, headers=self.headers)
-            if resp.status_code == 200:
-                return resp.json()
+    async def fetch_commits(self, limit: int = 20, per_page: int = 100) -> List[Dict]:
+        """Newest `limit` commits; pages after the first are fetched concurrently"""
+        per_page = min(limit, per_page)
+        url = f"{self.base_url}/commits?per_page={per_page}"
+        resp = await self.api.get(url, self.headers)
+        if resp.status_code != 200:
             return []
+        commits = resp.json()
+        pages = -(-limit // per_page)
+        last = re.search(r'[?&]page=(\d+)>; rel="last"', resp.headers.get("link", ""))
+        if last:
+            pages = min(pages, int(last.group(1)))
+        if pages > 1:
+            responses = await asyncio.gather(*(
+                self.api.get(f"{url}&page={page}", self.headers) for page in range(2, pages + 1)
+            ))
+            for page in responses:
+                if page.status_code != 200:
+                    break
+                commits.extend(page.json())
+        return commits[:limit]
 
     async def fetch_repo_structure(self, path: str = "") -> List[Dict]:
         # Recursive fetch could be expensive, for prototype we might just fetch root docs
-        async with httpx.AsyncClient() as client:
-            url = f"{self.base_url}/contents/{path}"
-            resp = await client.get(url, headers=self.headers)
-            if resp.status_code == 200:
-                return resp.json()
+        url = f"{self.base_url}/contents/{path}"
+        resp = await self.api.get(url, self.headers)
+        if resp.status_code == 200:
+            return resp.json()
+        return []
+
+    async def fetch_tree(self) -> List[Dict]:
+        """Every blob in the repo from one recursive git-tree call"""
+        url = f"{self.base_url}/git/trees/{self.ref}?recursive=1"
+        resp = await self.api.get(url, self.headers)
+        if resp.status_code != 200:
+            logger.warning(f"Failed to fetch tree for {self.owner}/{self.repo}: {resp.status_code}")
             return []
+        data = resp.json()
+        if data.get("truncated"):
+            logger.warning(f"Git tree for {self.owner}/{self.repo} is truncated; use the tarball mode for full coverage")
+        return [e for e in data.get("tree", []) if e.get("type") == "blob"]
+
+    async def fetch_raw(self, path: str) -> Optional[str]:
+        """Download a file from the raw CDN: no base64 and no REST API quota"""
+        url = f"{self.raw_url}/{path}"
+        headers = {"Authorization": self.headers["Authorization"]} if self.token else {}
+        resp = await self.api.get(url, headers)
+        if resp.status_code != 200:
+            logger.warning(f"Failed to fetch {path}: {resp.status_code}")
+            return None
+        return decode_text(resp.content)
+
+    def select_paths(self, entries: List[Dict], max_files: int) -> List[str]:
+        """Filter tree entries by extension and size; docs first, shallow paths first"""
+        paths = [e["path"] for e in entries if self._wanted(e["path"], e.get("size", 0))]
+        paths.sort(key=lambda p: (not is_doc_path(p), p.count("/"), p))
+        return paths[:max_files]
+
+    async def _iter_tree_documents(self, max_files: int) -> AsyncIterator[Dict]:
+        paths = self.select_paths(await self.fetch_tree(), max_files)
+        logger.info(f"🌳 Fetching {len(paths)} files from the {self.owner}/{self.repo} tree")
+
+        async def fetch(path: str) -> Optional[Dict]:
+            content = await self.fetch_raw(path)
+            return self._document(path, content) if content else None
+
+        documents = iter_completed(fetch(p) for p in paths)
+        try:
+            async for document in documents:
+                if document:
+                    yield document
+        finally:
+            await documents.aclose()
+
+    async def _iter_tarball_documents(self, max_files: int) -> AsyncIterator[Dict]:
+        url = f"{self.base_url}/tarball/{self.ref}"
+        loop = asyncio.get_running_loop()
+        yielded = 0
+        # The API redirects to codeload.github.com, which streams a gzipped tar
+        async with self._client().stream("GET", url, headers=self.headers, follow_redirects=True,
+                                         timeout=httpx.Timeout(30.0, read=120.0)) as resp:
+            resp.raise_for_status()
+            raw = _BlockingByteStream(resp.aiter_bytes(), loop)
+            stream = io.BufferedReader(raw, buffer_size=1 << 16)
+            files = iter_in_thread(lambda: read_tar(stream, self._wanted, mode="r|gz", strip_root=True),
+                                   on_cancel=raw.abort)
+            try:
+                async for path, content in files:
+                    yield self._document(path, content)
+                    yielded += 1
+                    if yielded >= max_files:
+                        break
+            finally:
+                await files.aclose()
+        logger.info(f"📦 Extracted {yielded} files from the {self.owner}/{self.repo} tarball")
+
+    async def _iter_contents_documents(self, max_files: int) -> AsyncIterator[Dict]:
+        entries = await self.fetch_repo_structure()
+        if not isinstance(entries, list):
+            entries = []
+        for entry in [e for e in entries if e.get("type") == "dir" and e["name"].lower() in self.DOC_DIRS]:
+            entries.extend(await self.fetch_repo_structure(entry["path"]))
+        paths = [
+            e["path"] for e in entries
+            if e.get("type") == "file" and e["name"].lower().endswith(self.DOC_EXTENSIONS)
+        ][:max_files]
+
+        async def fetch(path: str) -> Optional[Dict]:
+            content = await self.fetch_file(path)
+            return self._document(path, content) if content else None
+
+        # Yield files in completion order so chunking starts with the first one back
+        documents = iter_completed(fetch(p) for p in paths)
+        try:
+            async for document in documents:
+                if document:
+                    yield document
+        finally:
+            await documents.aclose()
+
+    async def iter_documents(self, max_files: int = 50) -> AsyncIterator[Dict]:
+        """Yield docs/source files and a recent-commits summary as ingestion documents"""
+        if self.mode == "tarball":
+            files = self._iter_tarball_documents(max_files)
+        elif self.mode == "tree":
+            files = self._iter_tree_documents(max_files)
+        else:
+            files = self._iter_contents_documents(max_files)
+        try:
+            async for document in files:
+                yield document
+        finally:
+            await files.aclose()
+
+        commits = await self.fetch_commits()
+        if commits:
+            lines = [
+                f"- {c['commit']['message'].splitlines()[0]} ({c['sha'][:7]}, {c['commit']['author']['date']})"
+                for c in commits if c.get("commit", {}).get("message")
+            ]
+            yield {
+                "content": "Recent commits:\n" + "\n".join(lines),
+                "url": f"{self.repo_url}/commits",
+                "source": "github",
+                "title": "Recent commits"
+            }
 
 if __name__ == "__main__":
     # Test
@@ -0,0 +1,92 @@
+"""
+Offline repository source: a checkout, a bare repo, or a plain directory.
+
+Yields the same documents as `GitHubFetcher.iter_documents`, using the same
+extension/size filters, so bulk ingestion can be exercised without network
+access or API quota. Files are chosen from the listing (path and size) and
+only the selected ones are read, one at a time.
+"""
+
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import subprocess
+
+from .fetcher import decode_text, is_doc_path, wanted_file, SKIP_DIRS
+
+logger = logging.getLogger(__name__)
+
+
+class LocalRepoSource:
+    """Reads docs and source files from a local git repository or directory"""
+
+    def __init__(self, path: str, repo_url: Optional[str] = None, ref: str = "HEAD",
+                 max_file_bytes: int = int(os.getenv("GITHUB_MAX_FILE_BYTES", "200000")),
+                 include_source: bool = os.getenv("GITHUB_INCLUDE_SOURCE", "1") == "1"):
+        self.path = Path(path)
+        self.repo_url = repo_url or self.path.resolve().as_uri()
+        self.ref = ref
+        self.max_file_bytes = max_file_bytes
+        self.include_source = include_source
+
+    def _wanted(self, path: str, size: int) -> bool:
+        return wanted_file(path, size, self.max_file_bytes, self.include_source)
+
+    def _is_git(self) -> bool:
+        # Bare repos have HEAD at the top level, checkouts have a .git entry
+        return (self.path / ".git").exists() or (self.path / "HEAD").is_file()
+
+    def _git(self, *args: str) -> bytes:
+        result = subprocess.run(["git", "-C", str(self.path), *args], capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"git {args[0]} failed: {result.stderr.decode(errors='replace').strip()}")
+        return result.stdout
+
+    def _list_git(self) -> List[Tuple[str, int]]:
+        """(path, size) of every committed file, from the tree alone, so bare repos work"""
+        entries = []
+        for record in self._git("ls-tree", "-r", "-l", "-z", self.ref).split(b"\0"):
+            if not record:
+                continue
+            meta, path = record.split(b"\t", 1)
+            mode, kind, _, size = meta.split()
+            # Skip symlinks and submodules, as `git archive` would not yield them as files
+            if kind == b"blob" and mode != b"120000":
+                entries.append((path.decode("utf-8", errors="replace"), int(size)))
+        return entries
+
+    def _read_git(self, path: str) -> bytes:
+        return self._git("cat-file", "blob", f"{self.ref}:{path}")
+
+    def _list_directory(self) -> List[Tuple[str, int]]:
+        entries = []
+        for root, dirs, files in os.walk(self.path):
+            dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+            for name in files:
+                full = Path(root) / name
+                entries.append((full.relative_to(self.path).as_posix(), full.stat().st_size))
+        return entries
+
+    def _read_directory(self, path: str) -> bytes:
+        return (self.path / path).read_bytes()
+
+    async def iter_documents(self, max_files: int = 50) -> AsyncIterator[Dict]:
+        """Yield matching files as ingestion documents, docs before source files"""
+        is_git = self._is_git()
+        listed = await asyncio.to_thread(self._list_git if is_git else self._list_directory)
+        # Select on paths and sizes first, then read one file at a time, so memory stays O(file)
+        paths = sorted((path for path, size in listed if self._wanted(path, size)),
+                       key=lambda path: (not is_doc_path(path), path.count("/"), path))
+        logger.info(f"📁 Found {len(paths)} matching files in {self.path}")
+        read = self._read_git if is_git else self._read_directory
+        yielded = 0
+        for path in paths:
+            if yielded >= max_files:
+                break
+            text = decode_text(await asyncio.to_thread(read, path))
+            if not text:
+                continue
+            yielded += 1
+            yield {"content": text, "url": f"{self.repo_url}/{path}", "source": "github", "title": path}
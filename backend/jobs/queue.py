@@ -0,0 +1,275 @@
+"""
+Ingestion job queue with a pool of concurrent workers.
+
+Jobs mirror the `jobs` table in migrations/001_initial_schema.sql
+(job_id, status, metadata, created_at, completed_at); per-stage progress
+lives under metadata["stages"]. Two backends share one interface:
+
+- `InMemoryJobBackend`: bounded asyncio queue + dict, for a single process
+  and for tests.
+- `RedisJobBackend`: Redis list + JSON job records, so API processes and
+  workers can be separate (Redis already ships in docker-compose.yml).
+
+Record changes go through `backend.update(job_id, mutate)`, which applies
+the mutation atomically (no await between read and write in memory, a
+WATCH/MULTI transaction on Redis), so concurrent stage updates don't
+overwrite each other. Submitting a job that is already queued or processing
+returns its active record instead of queueing it a second time.
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+PROCESSING = "processing"
+COMPLETED = "completed"
+FAILED = "failed"
+ACTIVE = (QUEUED, PROCESSING)
+
+Mutation = Callable[[Dict], Any]
+
+
+class QueueFullError(Exception):
+    """Raised when the bounded job queue cannot accept more work"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def new_job_record(job_id: str, payload: Dict) -> Dict:
+    return {
+        "job_id": job_id,
+        "status": QUEUED,
+        "metadata": {"payload": payload, "stages": {}},
+        "created_at": _now(),
+        "completed_at": None,
+    }
+
+
+class InMemoryJobBackend:
+    """Process-local queue and job records"""
+
+    def __init__(self, max_size: int = 100):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._jobs: Dict[str, Dict] = {}
+
+    async def push(self, record: Dict) -> Dict:
+        """Queue a job unless it is already active; returns the job's active record"""
+        current = self._jobs.get(record["job_id"])
+        if current is not None and current["status"] in ACTIVE:
+            return current
+        try:
+            self._queue.put_nowait(record["job_id"])
+        except asyncio.QueueFull:
+            raise QueueFullError("Ingestion queue is full, try again later")
+        self._jobs[record["job_id"]] = record
+        return record
+
+    async def pop(self) -> str:
+        return await self._queue.get()
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return self._jobs.get(job_id)
+
+    async def save(self, record: Dict):
+        self._jobs[record["job_id"]] = record
+
+    async def update(self, job_id: str, mutate: Mutation) -> Optional[Dict]:
+        # Nothing awaits between read and write, so this is atomic on the event loop
+        record = self._jobs.get(job_id)
+        if record is not None:
+            mutate(record)
+        return record
+
+    async def depth(self) -> int:
+        return self._queue.qsize()
+
+    async def close(self):
+        pass
+
+
+class RedisJobBackend:
+    """Redis list as the queue, one JSON value per job record"""
+
+    QUEUE_KEY = "autodoc:jobs:queue"
+    JOB_KEY = "autodoc:job:{}"
+    # Completed jobs are kept for a week, like rows in the jobs table would be
+    RECORD_TTL = 7 * 24 * 3600
+
+    def __init__(self, url: str, max_size: int = 100):
+        import redis.asyncio as redis
+        from redis.exceptions import WatchError
+        self._redis = redis.from_url(url, decode_responses=True)
+        self._watch_error = WatchError
+        self.max_size = max_size
+
+    async def _transaction(self, job_id: str, apply: Callable[[Optional[Dict], Any], Any], *watch: str):
+        """Run `apply(record, pipe)` under WATCH on the job key, retrying if another client wrote it"""
+        key = self.JOB_KEY.format(job_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key, *watch)
+                    raw = await pipe.get(key)
+                    result = await apply(json.loads(raw) if raw else None, pipe)
+                    await pipe.execute()
+                    return result
+                except self._watch_error:
+                    continue
+
+    async def push(self, record: Dict) -> Dict:
+        """Queue a job unless it is already active; returns the job's active record"""
+        async def apply(current: Optional[Dict], pipe):
+            if current is not None and current["status"] in ACTIVE:
+                pipe.multi()
+                return current
+            if await pipe.llen(self.QUEUE_KEY) >= self.max_size:
+                raise QueueFullError("Ingestion queue is full, try again later")
+            pipe.multi()
+            pipe.set(self.JOB_KEY.format(record["job_id"]), json.dumps(record), ex=self.RECORD_TTL)
+            pipe.lpush(self.QUEUE_KEY, record["job_id"])
+            return record
+        return await self._transaction(record["job_id"], apply, self.QUEUE_KEY)
+
+    async def pop(self) -> str:
+        _, job_id = await self._redis.brpop(self.QUEUE_KEY)
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        raw = await self._redis.get(self.JOB_KEY.format(job_id))
+        return json.loads(raw) if raw else None
+
+    async def save(self, record: Dict):
+        await self._redis.set(self.JOB_KEY.format(record["job_id"]), json.dumps(record), ex=self.RECORD_TTL)
+
+    async def update(self, job_id: str, mutate: Mutation) -> Optional[Dict]:
+        async def apply(record: Optional[Dict], pipe):
+            pipe.multi()
+            if record is not None:
+                mutate(record)
+                pipe.set(self.JOB_KEY.format(job_id), json.dumps(record), ex=self.RECORD_TTL)
+            return record
+        return await self._transaction(job_id, apply)
+
+    async def depth(self) -> int:
+        return await self._redis.llen(self.QUEUE_KEY)
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+class JobProgress:
+    """Handle given to job handlers for reporting per-stage progress"""
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self.queue = queue
+        self.job_id = job_id
+
+    async def stage(self, name: str, status: str = PROCESSING, done: Optional[int] = None,
+                    total: Optional[int] = None, **extra):
+        await self.queue.update_stage(self.job_id, name, status=status, done=done, total=total, **extra)
+
+
+Handler = Callable[[str, Dict, JobProgress], Awaitable[None]]
+
+
+class JobQueue:
+    """Bounded job queue drained by N concurrent workers"""
+
+    def __init__(self, backend, workers: int = 2):
+        self.backend = backend
+        self.num_workers = workers
+        self._workers: List[asyncio.Task] = []
+        self._handler: Optional[Handler] = None
+
+    @classmethod
+    def from_env(cls) -> "JobQueue":
+        max_size = int(os.getenv("JOB_QUEUE_MAX", "100"))
+        if os.getenv("JOB_QUEUE_BACKEND", "memory") == "redis":
+            backend = RedisJobBackend(os.getenv("REDIS_URL", "redis://localhost:6379"), max_size)
+        else:
+            backend = InMemoryJobBackend(max_size)
+        return cls(backend, workers=int(os.getenv("INGEST_WORKERS", "2")))
+
+    async def submit(self, job_id: str, payload: Dict) -> Dict:
+        """Enqueue a job and return its record; an already queued or running job is returned as is"""
+        queued = new_job_record(job_id, payload)
+        record = await self.backend.push(queued)
+        if record is not queued:
+            logger.info(f"🔁 Job {job_id} is already {record['status']}, not queueing it again")
+        else:
+            logger.info(f"📥 Queued job {job_id} (depth: {await self.backend.depth()})")
+        return record
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return await self.backend.get(job_id)
+
+    async def update_stage(self, job_id: str, stage: str, **progress):
+        def mutate(record: Dict):
+            entry = record["metadata"]["stages"].setdefault(stage, {})
+            entry.update({k: v for k, v in progress.items() if v is not None})
+            entry["updated_at"] = _now()
+        await self.backend.update(job_id, mutate)
+
+    async def _set_status(self, job_id: str, status: str, error: Optional[str] = None):
+        def mutate(record: Dict):
+            record["status"] = status
+            if error:
+                record["metadata"]["error"] = error
+            if status in (COMPLETED, FAILED):
+                record["completed_at"] = _now()
+        await self.backend.update(job_id, mutate)
+
+    async def _worker(self, number: int):
+        while True:
+            job_id = await self.backend.pop()
+            record = await self.backend.get(job_id)
+            if record is None:
+                continue
+            logger.info(f"👷 Worker {number} picked up job {job_id}")
+            await self._set_status(job_id, PROCESSING)
+            try:
+                await self._handler(job_id, record["metadata"]["payload"], JobProgress(self, job_id))
+                await self._set_status(job_id, COMPLETED)
+            except asyncio.CancelledError:
+                await self._set_status(job_id, FAILED, error="Worker shut down before the job finished")
+                raise
+            except Exception as e:
+                logger.error(f"❌ Job {job_id} failed: {e}", exc_info=True)
+                await self._set_status(job_id, FAILED, error=str(e))
+
+    def start(self, handler: Handler):
+        """Spawn the worker tasks on the running event loop"""
+        self._handler = handler
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.num_workers)]
+        logger.info(f"👷 Started {self.num_workers} ingestion workers")
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self.backend.close()
+
+
+_default_queue: Optional[JobQueue] = None
+
+
+def set_job_queue(queue: Optional[JobQueue]):
+    """Install (or clear) the process-wide queue; called from the FastAPI lifespan"""
+    global _default_queue
+    _default_queue = queue
+
+
+def get_job_queue() -> JobQueue:
+    global _default_queue
+    if _default_queue is None:
+        _default_queue = JobQueue.from_env()
+    return _default_queue
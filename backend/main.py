@@ -1,22 +1,72 @@
+import time
+_IMPORT_STARTED = time.perf_counter()  # Import cost of the app, reported by /ready
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import os
 from dotenv import load_dotenv
-from .routes import ingest, generate, debug
+
+# Load before importing modules that read configuration at import time
+load_dotenv()
+
+from .routes import ingest, generate, debug, jobs
+from .services.http_clients import set_http_clients
+from .services.container import ServiceContainer, set_services
+from .jobs.queue import JobQueue, set_job_queue
+from .services.startup import Readiness, warm_up
+from contextlib import asynccontextmanager
+from fastapi.responses import JSONResponse
 import asyncio
+import logging
 import sys
 
+logger = logging.getLogger(__name__)
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
 # Fix for Playwright on Windows
 if sys.platform == 'win32':
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
-load_dotenv()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    readiness = Readiness(import_seconds=IMPORT_SECONDS)
+    app.state.readiness = readiness
+
+    # Store, embedder, generator and pooled HTTP clients live as long as the app
+    services = ServiceContainer()
+    set_services(services)
+    set_http_clients(services.http_clients)
+    app.state.services = services
+    app.state.http_clients = services.http_clients
+    vector_store = services.vector_store
+
+    # Mapping the index, loading models and heavy imports happen in the background
+    app.state.warm_up = asyncio.create_task(warm_up(readiness, vector_store, services.embedder))
+
+    # Ingestion runs on a worker pool instead of inside the request
+    job_queue = JobQueue.from_env()
+    set_job_queue(job_queue)
+    job_queue.start(ingest.run_ingestion_job)
+    readiness.timings["lifespan_seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"🚀 Started in {readiness.timings['lifespan_seconds']}s after {IMPORT_SECONDS:.2f}s of imports")
+    yield
+    app.state.warm_up.cancel()
+    await job_queue.stop()
+    set_job_queue(None)
+    if vector_store.storage_path and not vector_store.read_only:
+        vector_store.save()
+    await services.aclose()
+    set_http_clients(None)
+    set_services(None)
 
 app = FastAPI(
     title="AutoDoc AI API",
     description="API for AutoDoc AI - Automatic Documentation Generator",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # CORS Configuration
@@ -35,6 +85,7 @@ app.add_middleware(
 app.include_router(ingest.router, prefix="/api/v1")
 app.include_router(generate.router, prefix="/api/v1")
 app.include_router(debug.router, prefix="/api/v1")
+app.include_router(jobs.router, prefix="/api/v1")
 
 @app.get("/")
 async def root():
@@ -44,5 +95,11 @@ async def root():
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/ready")
+async def readiness_check():
+    """503 until the index and embedder are warm, with per-component timings"""
+    readiness = app.state.readiness
+    return JSONResponse(readiness.report(), status_code=200 if readiness.ready else 503)
+
 if __name__ == "__main__":
     uvicorn.run("backend.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,45 +1,422 @@
-from typing import List, Dict
+from types import MappingProxyType
+from typing import Iterable, Iterator, List, Dict, Mapping, Optional, TextIO, Tuple, Union
+import ast
+import logging
+import os
 import re
+import textwrap
+from bisect import bisect_left
+from .tokenizer import get_token_counter, token_budget
+
+logger = logging.getLogger(__name__)
+
+MARKDOWN_HEADING = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$")
+FENCE = re.compile(r"^[ \t]*(```|~~~)")
+MARKDOWN_EXTENSIONS = (".md", ".mdx", ".markdown")
+
+# (start offset, end offset, extra metadata) of a structural unit in the source text
+Unit = Tuple[int, int, Dict]
+
+
+def _trimmed(text: str, start: int, end: int) -> Tuple[int, int]:
+    """Bounds of text[start:end] without surrounding whitespace, without slicing"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _frozen(metadata: Mapping) -> Mapping:
+    # One read-only mapping shared by every chunk of a document: no per-chunk copies, no aliasing bugs
+    return metadata if isinstance(metadata, MappingProxyType) else MappingProxyType(dict(metadata))
+
+
+class ChunkView:
+    """
+    A chunk as [start, end) offsets into its source text. The content is only
+    sliced when read, so chunks can be produced, counted and filtered
+    without copying the document. `base` shifts offsets for chunks of a
+    block of a larger stream; `span` is the position in the whole input.
+    `dedent` is True to dedent the slice on read, or the margin (leading
+    whitespace) to strip from each line of a piece split out of a unit.
+    """
+
+    __slots__ = ("source", "start", "end", "metadata", "base", "dedent")
+
+    def __init__(self, source: str, start: int, end: int, metadata: Mapping,
+                 base: int = 0, dedent: Union[bool, str] = False):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.metadata = metadata
+        self.base = base
+        self.dedent = dedent
+
+    @property
+    def span(self) -> Tuple[int, int]:
+        return self.base + self.start, self.base + self.end
+
+    @property
+    def content(self) -> str:
+        text = self.source[self.start:self.end]
+        # Dedent so methods of a split class keep their relative indentation
+        if not self.dedent:
+            return text
+        if self.dedent is True:
+            return textwrap.dedent(text).strip()
+        # A piece of a split unit drops the unit's margin, even when it starts mid-line
+        return re.sub(f"(?m)^{re.escape(self.dedent)}", "", text).strip()
+
+    def to_dict(self) -> Dict:
+        # A plain dict, since chunk dicts are mutated downstream and serialised to JSON
+        return {"content": self.content, "metadata": dict(self.metadata)}
+
 
 class Chunker:
-    def __init__(self, chunk_size: int = 1000, overlap: int = 200):
+    """
+    Splits documents into chunks for embedding.
+
+    "semantic" mode cuts Python at top-level definitions (via `ast`) and
+    Markdown / crawled pages at headings, packing small neighbouring units
+    into one chunk and tagging chunks with their symbol or heading path.
+    Anything else, and any unit larger than the budget, falls back to the
+    "fixed" splitter with overlap.
+
+    With `max_tokens` set, budgets are in tokens of the embedding model
+    (see `for_model`) instead of characters, so no chunk is truncated at
+    embed time.
+    """
+
+    MODES = ("semantic", "fixed")
+
+    def __init__(self, chunk_size: int = 1000, overlap: int = 200,
+                 mode: str = os.getenv("CHUNKER_MODE", "semantic"),
+                 max_tokens: Optional[int] = None, token_overlap: int = 32, token_counter=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown chunker mode {mode!r}, expected one of {self.MODES}")
         self.chunk_size = chunk_size
         self.overlap = overlap
+        self.mode = mode
+        self.max_tokens = max_tokens
+        self.token_overlap = token_overlap
+        self.token_counter = token_counter or (get_token_counter("approx") if max_tokens else None)
+
+    @classmethod
+    def for_model(cls, model_id: str, **kwargs) -> "Chunker":
+        """Token-budgeted chunker for an embedding model; character-based if its budget is unknown"""
+        budget = token_budget(model_id)
+        if budget is None:
+            return cls(**kwargs)
+        logger.info(f"🔤 Chunking to {budget} tokens for {model_id}")
+        return cls(max_tokens=budget, token_counter=get_token_counter(model_id), **kwargs)
+
+    @property
+    def limit(self) -> int:
+        return self.max_tokens or self.chunk_size
+
+    def _sizes(self, segments: List[str]) -> List[int]:
+        if self.max_tokens:
+            return self.token_counter.count_many(segments)
+        return [len(segment) for segment in segments]
 
     def chunk_text(self, text: str, metadata: Dict) -> List[Dict]:
         """
-        Split text into chunks with overlap.
+        Split text into chunks, aligned to code/heading boundaries in semantic mode.
         """
+        return [view.to_dict() for view in self.iter_chunks(text, metadata)]
+
+    def chunk_documents(self, documents: List[Tuple[str, Dict]]) -> List[List[Dict]]:
+        """Chunk many (text, metadata) documents, sizing all their units in one batch"""
+        plans = [self._plan(text, metadata) if text else (None, None) for text, metadata in documents]
+        sizes = iter(self._sizes([text[start:end] for (text, _), (_, units) in zip(documents, plans) if units
+                                  for start, end, _ in units]))
+        return [
+            [view.to_dict() for view in self._iter_planned(text, metadata, kind, units,
+                                                            [next(sizes) for _ in units or ()])]
+            for (text, metadata), (kind, units) in zip(documents, plans)
+        ]
+
+    def iter_chunks(self, text: str, metadata: Dict) -> Iterator[ChunkView]:
+        """Lazily yield chunk views of one in-memory document"""
+        if not text:
+            return
+        kind, units = self._plan(text, metadata)
+        sizes = self._sizes([text[start:end] for start, end, _ in units]) if units else []
+        yield from self._iter_planned(text, metadata, kind, units, sizes)
+
+    def iter_stream_chunks(self, stream: Union[Iterable[str], TextIO], metadata: Dict,
+                           block_size: int = 1 << 20) -> Iterator[ChunkView]:
+        """
+        Chunk a text stream (a file object or any iterable of strings) with
+        memory bounded by `block_size`, however large the input. The stream
+        is cut into blocks at paragraph or line breaks and each block is
+        chunked as its own document; views report absolute offsets in `span`.
+        """
+        metadata = _frozen(metadata)
+        if hasattr(stream, "read"):
+            stream = iter(lambda read=stream.read: read(block_size), "")
+        pieces: List[str] = []
+        buffered = 0
+        base = 0
+        for piece in stream:
+            pieces.append(piece)
+            buffered += len(piece)
+            if buffered < block_size:
+                continue
+            buffer = "".join(pieces)
+            while len(buffer) >= block_size:
+                cut = self._block_cut(buffer, block_size)
+                yield from self._iter_block(buffer[:cut], metadata, base)
+                base += cut
+                buffer = buffer[cut:]
+            pieces, buffered = [buffer], len(buffer)
+        if buffered:
+            yield from self._iter_block("".join(pieces), metadata, base)
+
+    def iter_file_chunks(self, path: str, metadata: Dict, encoding: str = "utf-8",
+                         block_size: int = 1 << 20) -> Iterator[ChunkView]:
+        """Stream a file from disk through `iter_stream_chunks`"""
+        with open(path, encoding=encoding, errors="replace") as f:
+            yield from self.iter_stream_chunks(f, metadata, block_size)
+
+    @staticmethod
+    def _block_cut(buffer: str, block_size: int) -> int:
+        """Where to end a block: a paragraph break, else a line break, else block_size"""
+        for separator in ("\n\n", "\n"):
+            cut = buffer.rfind(separator, 0, block_size)
+            if cut > block_size // 2:
+                return cut + len(separator)
+        return block_size
+
+    def _iter_block(self, block: str, metadata: Mapping, base: int) -> Iterator[ChunkView]:
+        for view in self.iter_chunks(block, metadata):
+            view.base += base
+            yield view
+
+    def _plan(self, text: str, metadata: Mapping) -> Tuple[str, Optional[List[Unit]]]:
+        if self.mode == "fixed":
+            return "text", None
+        kind = self.detect_kind(text, metadata)
+        if kind == "python":
+            return kind, self._python_units(text)
+        if kind == "markdown":
+            return kind, self._markdown_units(text)
+        return kind, None
+
+    def _iter_planned(self, text: str, metadata: Mapping, kind: Optional[str],
+                      units: Optional[List[Unit]], sizes: List[int]) -> Iterator[ChunkView]:
         if not text:
-            return []
-            
-        chunks = []
-        start = 0
-        text_len = len(text)
+            return
+        metadata = _frozen(metadata)
+        if units:
+            yield from self._iter_pack(text, units, sizes, metadata, dedent=kind == "python")
+        else:
+            yield from self._iter_split(text, metadata)
+
+    def _iter_split(self, text: str, metadata: Mapping, base: int = 0) -> Iterator[ChunkView]:
+        if self.max_tokens:
+            return self._iter_token_windows(text, metadata, base)
+        return self._iter_fixed(text, metadata, base)
+
+    @staticmethod
+    def detect_kind(text: str, metadata: Dict) -> str:
+        """"python", "markdown" or "text", from the file name first, then the content"""
+        name = (metadata.get("title") or metadata.get("url") or "").lower().split("?")[0]
+        if name.endswith(".py"):
+            return "python"
+        if name.endswith(MARKDOWN_EXTENSIONS):
+            return "markdown"
+        if re.search(r"^#{1,6} \S", text, re.MULTILINE):
+            return "markdown"
+        return "text"
+
+    def _python_units(self, text: str) -> Optional[List[Unit]]:
+        try:
+            tree = ast.parse(text)
+        except (SyntaxError, ValueError):
+            return None
+
+        line_starts = [0]
+        for line in text.splitlines(keepends=True):
+            line_starts.append(line_starts[-1] + len(line))
+
+        def start_of(node) -> int:
+            # Decorators belong to the definition
+            first = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+            return line_starts[first - 1]
+
+        def end_of(node) -> int:
+            return line_starts[node.end_lineno]
+
+        definitions = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+        units: List[Unit] = []
+        cursor = 0  # Comments and blank lines attach to the following unit
+        module_start = None
+
+        for node in tree.body:
+            if not isinstance(node, definitions):
+                if module_start is None:
+                    module_start = cursor
+                cursor = end_of(node)
+                continue
+            if module_start is not None:
+                units.append((module_start, cursor, {"symbol": "<module>"}))
+                module_start = None
+
+            if isinstance(node, ast.ClassDef) and end_of(node) - cursor > self.limit:
+                # Big class: header (signature, docstring, attributes), then one unit per method
+                methods = [n for n in node.body if isinstance(n, definitions)]
+                if methods:
+                    units.append((cursor, start_of(methods[0]), {"symbol": node.name}))
+                    for method, following in zip(methods, methods[1:] + [None]):
+                        end = start_of(following) if following else end_of(node)
+                        units.append((start_of(method), end, {"symbol": f"{node.name}.{method.name}"}))
+                    cursor = end_of(node)
+                    continue
+            units.append((cursor, end_of(node), {"symbol": node.name}))
+            cursor = end_of(node)
+
+        if module_start is not None:
+            units.append((module_start, len(text), {"symbol": "<module>"}))
+        elif units:
+            start, _, extra = units[-1]
+            units[-1] = (start, len(text), extra)
+        return units
+
+    def _markdown_units(self, text: str) -> List[Unit]:
+        units: List[Unit] = []
+        headings: List[Tuple[int, str]] = []  # (level, title) stack
+        section_start = 0
+        offset = 0
+        in_fence = False
+
+        def heading_path() -> Dict:
+            return {"heading": " > ".join(title for _, title in headings)} if headings else {}
+
+        for line in text.splitlines(keepends=True):
+            if FENCE.match(line):
+                in_fence = not in_fence
+            match = None if in_fence else MARKDOWN_HEADING.match(line.rstrip("\r\n"))
+            if match:
+                if offset > section_start:
+                    units.append((section_start, offset, heading_path()))
+                level = len(match.group(1))
+                while headings and headings[-1][0] >= level:
+                    headings.pop()
+                headings.append((level, match.group(2)))
+                section_start = offset
+            offset += len(line)
+        if offset > section_start:
+            units.append((section_start, offset, heading_path()))
+        return units
+
+    def _iter_pack(self, text: str, units: List[Unit], sizes: List[int], metadata: Mapping,
+                   dedent: bool = False) -> Iterator[ChunkView]:
+        """Merge neighbouring units up to the budget; split only units that are too big"""
+        pending: List[Unit] = []
+        pending_size = 0
+
+        def flush() -> Optional[ChunkView]:
+            start, end = pending[0][0], pending[-1][1]
+            extra = dict(pending[0][2])
+            symbols = [u[2]["symbol"] for u in pending if "symbol" in u[2]]
+            if len(symbols) > 1:
+                extra["symbol"] = ", ".join(symbols)
+            pending.clear()
+            first, end = _trimmed(text, start, end)
+            if first >= end:
+                return None
+            # Keep the first line's indentation for dedent to measure
+            if dedent:
+                start = max(start, text.rfind("\n", start, first) + 1)
+            else:
+                start = first
+            return ChunkView(text, start, end, {**metadata, **extra} if extra else metadata, dedent=dedent)
+
+        for unit, size in zip(units, sizes):
+            start, end, extra = unit
+            if size > self.limit:
+                if pending and (view := flush()):
+                    yield view
+                pending_size = 0
+                unit_metadata = {**metadata, **extra} if extra else metadata
+                views = self._iter_fixed_range(text, start, end, unit_metadata)
+                yield from (self._dedented(views, text[start:end]) if dedent else views)
+                continue
+            if pending and pending_size + size > self.limit:
+                if view := flush():
+                    yield view
+                pending_size = 0
+            pending.append(unit)
+            pending_size += size
+        if pending and (view := flush()):
+            yield view
+
+    @staticmethod
+    def _dedented(views: Iterator[ChunkView], unit: str) -> Iterator[ChunkView]:
+        """Strip the unit's margin from its split pieces on read; offsets still point into the original text"""
+        indents = [line[:len(line) - len(line.lstrip())] for line in unit.splitlines() if line.strip()]
+        margin = os.path.commonprefix(indents) if indents else ""
+        for view in views:
+            view.dedent = margin or False
+            yield view
+
+    def _iter_fixed_range(self, text: str, start: int, end: int, metadata: Mapping) -> Iterator[ChunkView]:
+        if self.max_tokens:
+            # Tokenizers need a string, so token windows run on a copy of the range
+            yield from self._iter_token_windows(text[start:end], metadata, base=start)
+        else:
+            yield from self._iter_fixed(text, metadata, lo=start, hi=end)
+
+    def _iter_token_windows(self, text: str, metadata: Mapping, base: int = 0) -> Iterator[ChunkView]:
+        """Windows of at most max_tokens tokens, overlapping by token_overlap, ending on a newline when possible"""
+        offsets = self.token_counter.offsets(text)
+        starts = [start for start, _ in offsets]
+        i, n = 0, len(offsets)
+        while i < n:
+            j = min(i + self.max_tokens, n)
+            start_char, end_char = offsets[i][0], offsets[j - 1][1]
+            if j < n:
+                newline = text.rfind("\n", start_char, end_char)
+                if newline > offsets[(i + j) // 2][0]:
+                    end_char = newline + 1
+                    j = bisect_left(starts, end_char)
+            first, last = _trimmed(text, start_char, end_char)
+            if first < last:
+                yield ChunkView(text, first, last, metadata, base)
+            if j >= n:
+                break
+            i = max(j - self.token_overlap, i + 1)
+
+    def _iter_fixed(self, text: str, metadata: Mapping, base: int = 0,
+                    lo: int = 0, hi: Optional[int] = None) -> Iterator[ChunkView]:
+        """
+        Split text[lo:hi] into chunks with overlap.
+        """
+        start = lo
+        text_len = len(text) if hi is None else hi
 
         while start < text_len:
             end = min(start + self.chunk_size, text_len)
-            
+
             # Try to find a natural break point (newline) if possible
             if end < text_len:
                 # Look back for a newline
                 last_newline = text.rfind('\n', start, end)
                 if last_newline != -1 and last_newline > start + (self.chunk_size // 2):
                     end = last_newline + 1
-            
-            chunk_text = text[start:end].strip()
-            
-            if chunk_text:
-                chunks.append({
-                    "content": chunk_text,
-                    "metadata": metadata
-                })
-            
+
+            first, last = _trimmed(text, start, end)
+            if first < last:
+                yield ChunkView(text, first, last, metadata, base)
+
+            if end >= text_len:
+                break
+
             start = end - self.overlap
-            if start < 0: start = 0
-            
+            if start < lo: start = lo
+
             # Avoid infinite loop if no progress
             if start >= end:
                 start = end
-            
-        return chunks
@@ -0,0 +1,221 @@
+"""
+Chunk deduplication for ingestion.
+
+The same README, license text or navigation boilerplate shows up on many
+pages and in many jobs. Before embedding, every chunk is matched against
+the chunks already seen in this run and the content pool of the vector
+store:
+
+- exact duplicates by a hash of the whitespace-normalised text
+- near duplicates by MinHash signatures (5-word shingles) with LSH banding,
+  confirmed by the estimated Jaccard similarity
+
+An exact duplicate takes the content and vector of the chunk it matches,
+so it costs no embedding call and the store keeps one copy that is
+referenced by each URL and job using it. A near duplicate only reuses the
+vector: it keeps its own text (a version number or parameter value may be
+all that differs) under its own key, so it is cited as it appears on its
+page.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import zlib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+")
+_MERSENNE = (1 << 31) - 1
+
+
+def content_key(text: str) -> str:
+    """Hash of the text with case and whitespace normalised"""
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class MinHasher:
+    """MinHash signatures of word shingles, using (a*x + b) mod p hash permutations"""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands = bands
+        self._a = rng.integers(1, _MERSENNE, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE, num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """uint32 signature, or None for text without words"""
+        words = _WORD.findall(text.lower())
+        if not words:
+            return None
+        size = min(self.shingle_size, len(words))
+        hashes = np.fromiter(
+            (zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)),
+            dtype=np.uint64
+        ) % _MERSENNE
+        # a, x < 2^31 keeps a*x + b inside uint64
+        permuted = (hashes[:, None] * self._a[None, :] + self._b[None, :]) % _MERSENNE
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        rows = self.num_perm // self.bands
+        return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.bands)]
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of the two shingle sets"""
+        return float(np.mean(a == b))
+
+
+class LSHIndex:
+    """Banded LSH over MinHash signatures: near-identical texts share at least one bucket"""
+
+    def __init__(self, hasher: MinHasher):
+        self.hasher = hasher
+        self._buckets: Dict[Tuple[int, bytes], set] = {}
+        self._signatures: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def add(self, key: str, signature: Optional[np.ndarray]):
+        if signature is None or key in self._signatures:
+            return
+        self._signatures[key] = signature
+        for band_key in self.hasher.band_keys(signature):
+            self._buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key: str):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band_key in self.hasher.band_keys(signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def query(self, signature: Optional[np.ndarray], threshold: float) -> Optional[str]:
+        """The most similar indexed key at or above `threshold`, if any"""
+        if signature is None:
+            return None
+        candidates = set()
+        for band_key in self.hasher.band_keys(signature):
+            candidates |= self._buckets.get(band_key, set())
+        best, best_score = None, threshold
+        for key in candidates:
+            score = self.hasher.similarity(signature, self._signatures[key])
+            if score >= best_score:
+                best, best_score = key, score
+        return best
+
+
+_default_hasher: Optional[MinHasher] = None
+
+
+def get_min_hasher() -> MinHasher:
+    """Shared hasher, so signatures from the pipeline and the store are comparable"""
+    global _default_hasher
+    if _default_hasher is None:
+        _default_hasher = MinHasher()
+    return _default_hasher
+
+
+class Deduplicator:
+    """
+    Per-run dedup stage. `resolve` splits a batch into chunks that need
+    embedding and duplicates; duplicates of chunks still being embedded
+    elsewhere in the run wait for that vector via `vector_for`. Only exact
+    duplicates have their content replaced by the canonical copy.
+    """
+
+    MODES = ("near", "exact", "off")
+
+    def __init__(self, vector_store=None,
+                 mode: str = os.getenv("DEDUP_MODE", "near"),
+                 threshold: float = float(os.getenv("DEDUP_THRESHOLD", "0.85"))):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown dedup mode {mode!r}; expected one of {self.MODES}")
+        self.vector_store = vector_store
+        self.mode = mode
+        self.threshold = threshold
+        self.hasher = get_min_hasher()
+        self._canonical: Dict[str, str] = {}  # key -> content of the first chunk with it
+        self._lsh = LSHIndex(self.hasher)
+        self._vectors: Dict[str, asyncio.Future] = {}
+        self.stats = {"exact": 0, "near": 0, "pooled": 0}
+
+    def _pool(self):
+        return getattr(self.vector_store, "content_pool", None)
+
+    def _index(self, chunk: Dict, key: str, signature: Optional[np.ndarray]):
+        """Make a newly kept text matchable, in this run and (via its signature) in the pool"""
+        self._lsh.add(key, signature)
+        if signature is not None:
+            chunk["signature"] = signature
+
+    def resolve(self, chunks: Iterable[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """(chunks to embed, duplicates); every chunk gets a content_key in its metadata"""
+        fresh, duplicates = [], []
+        if self.mode == "off":
+            return list(chunks), []
+        pool = self._pool()
+        for chunk in chunks:
+            key = content_key(chunk["content"])
+            signature = self.hasher.signature(chunk["content"]) if self.mode == "near" else None
+            match, kind = None, None
+
+            if key in self._canonical:
+                match, kind = key, "exact"
+            elif pool is not None and (entry := pool.match(key, signature, self.threshold)):
+                match, kind = entry["key"], "pooled"
+                chunk["vector"] = entry["vector"]
+                if match not in self._vectors:
+                    self._vectors[match] = asyncio.get_running_loop().create_future()
+                    self._vectors[match].set_result(entry["vector"])
+                if match == key:
+                    self._canonical.setdefault(match, entry["content"])
+            elif (near := self._lsh.query(signature, self.threshold)) is not None:
+                match, kind = near, "near"
+
+            chunk["metadata"] = {**chunk["metadata"], "content_key": key}
+            if match is None:
+                self._canonical[key] = chunk["content"]
+                self._vectors[key] = asyncio.get_running_loop().create_future()
+                self._index(chunk, key, signature)
+                fresh.append(chunk)
+                continue
+            if match == key:
+                # One copy of the text is kept, whichever page it came from
+                chunk["content"] = self._canonical[match]
+            else:
+                # A near duplicate keeps its own text and key, and borrows the matched vector
+                self._canonical[key] = chunk["content"]
+                self._vectors[key] = self._vectors[match]
+                self._index(chunk, key, signature)
+            self.stats[kind] += 1
+            duplicates.append(chunk)
+        return fresh, duplicates
+
+    def embedded(self, chunks: List[Dict]):
+        """Publish the vectors of freshly embedded chunks to their waiting duplicates"""
+        for chunk in chunks:
+            future = self._vectors.get(chunk["metadata"].get("content_key"))
+            if future is not None and not future.done():
+                future.set_result(chunk["vector"])
+
+    async def vector_for(self, chunk: Dict):
+        """The vector of a duplicate: from the pool already, or once its original is embedded"""
+        if len(chunk.get("vector", [])) > 0:
+            return chunk["vector"]
+        return await self._vectors[chunk["metadata"]["content_key"]]
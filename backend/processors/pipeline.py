@@ -0,0 +1,209 @@
+"""
+Streaming ingestion pipeline.
+
+    sources (crawl / GitHub) -> chunk workers -> dedup + embed workers -> store sink
+
+Stages are connected by bounded asyncio queues, so pages are chunked and
+embedded while the crawl is still running, and a slow stage applies
+back-pressure to the ones before it instead of buffering everything.
+
+A re-ingested page's chunks replace its old ones; a page that now yields
+no chunks at all has its old chunks removed once the run finishes.
+"""
+
+from itertools import islice
+from typing import AsyncIterator, Dict, Iterator, List
+import asyncio
+import logging
+import os
+
+from .dedup import Deduplicator
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()  # End-of-stream marker passed between stages
+
+
+class IngestionPipeline:
+    """Runs documents from async sources through chunk -> embed -> store"""
+
+    def __init__(
+        self,
+        job_id: str,
+        chunker,
+        embedder,
+        vector_store,
+        progress=None,
+        queue_size: int = int(os.getenv("PIPELINE_QUEUE_SIZE", "64")),
+        chunk_workers: int = int(os.getenv("PIPELINE_CHUNK_WORKERS", "2")),
+        embed_workers: int = int(os.getenv("PIPELINE_EMBED_WORKERS", "2")),
+        embed_batch_size: int = int(os.getenv("PIPELINE_EMBED_BATCH", "32")),
+        chunk_batch_size: int = int(os.getenv("PIPELINE_CHUNK_BATCH", "16")),
+        stream_threshold: int = int(os.getenv("PIPELINE_STREAM_THRESHOLD", "1000000")),
+        deduplicator: Deduplicator = None
+    ):
+        self.job_id = job_id
+        self.chunker = chunker
+        self.embedder = embedder
+        self.vector_store = vector_store
+        self.progress = progress
+        self.queue_size = queue_size
+        self.chunk_workers = chunk_workers
+        self.embed_workers = embed_workers
+        self.embed_batch_size = embed_batch_size
+        self.chunk_batch_size = chunk_batch_size
+        self.stream_threshold = stream_threshold
+        self.deduplicator = deduplicator or Deduplicator(vector_store)
+        self.counts = {"documents": 0, "chunks": 0, "embedded": 0, "deduplicated": 0,
+                       "stored": 0, "failed_sources": 0}
+        self.document_urls = set()  # Every document seen, so emptied pages lose their old chunks
+        self.replaced_urls = set()
+
+    async def _report(self, stage: str, status: str = "processing", **counts):
+        if self.progress:
+            await self.progress.stage(stage, status, **counts)
+
+    async def _produce(self, name: str, source: AsyncIterator[Dict], documents: asyncio.Queue):
+        produced = 0
+        try:
+            async for document in source:
+                self.document_urls.add(document.get("url", ""))
+                await documents.put(document)
+                produced += 1
+                self.counts["documents"] += 1
+                await self._report(name, done=produced)
+            await self._report(name, "completed", done=produced)
+        except Exception as e:
+            # One failing source (e.g. the crawl) shouldn't sink the other
+            logger.error(f"❌ Source {name} failed after {produced} documents: {e}", exc_info=True)
+            self.counts["failed_sources"] += 1
+            await self._report(name, "failed", done=produced, error=str(e))
+
+    @staticmethod
+    async def _take_batch(queue: asyncio.Queue, size: int):
+        """Whatever is ready, up to `size` items, without waiting for a full batch; (batch, finished)"""
+        batch = []
+        item = await queue.get()
+        while True:
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+            if len(batch) >= size or queue.empty():
+                return batch, False
+            item = queue.get_nowait()
+
+    def _metadata(self, document: Dict) -> Dict:
+        return {
+            "url": document.get("url", ""),
+            "source": document.get("source", "unknown"),
+            "job_id": self.job_id
+        }
+
+    def _is_large(self, document: Dict) -> bool:
+        return "path" in document or len(document.get("content", "")) > self.stream_threshold
+
+    async def _chunk_lazily(self, views: Iterator, chunks: asyncio.Queue):
+        """Pull a huge document's chunks a slice at a time, so queue back-pressure bounds memory"""
+        while True:
+            batch = await asyncio.to_thread(lambda: [view.to_dict() for view in islice(views, self.embed_batch_size)])
+            if not batch:
+                return
+            for chunk in batch:
+                await chunks.put(chunk)
+                self.counts["chunks"] += 1
+            await self._report("chunk", done=self.counts["chunks"])
+
+    async def _chunk(self, documents: asyncio.Queue, chunks: asyncio.Queue):
+        while True:
+            batch, finished = await self._take_batch(documents, self.chunk_batch_size)
+            # Files on disk and very large texts are streamed instead of chunked in one go
+            for document in [d for d in batch if self._is_large(d)]:
+                if "path" in document:
+                    views = self.chunker.iter_file_chunks(document["path"], self._metadata(document))
+                else:
+                    views = self.chunker.iter_stream_chunks([document["content"]], self._metadata(document))
+                await self._chunk_lazily(views, chunks)
+            batch = [d for d in batch if not self._is_large(d)]
+            if batch:
+                inputs = [(document.get("content", ""), self._metadata(document)) for document in batch]
+                # Tokenizing and parsing are CPU-bound; keep them off the event loop
+                for document_chunks in await asyncio.to_thread(self.chunker.chunk_documents, inputs):
+                    for chunk in document_chunks:
+                        await chunks.put(chunk)
+                        self.counts["chunks"] += 1
+                await self._report("chunk", done=self.counts["chunks"])
+            if finished:
+                return
+
+    async def _embed(self, chunks: asyncio.Queue, embedded: asyncio.Queue):
+        while True:
+            batch, finished = await self._take_batch(chunks, self.embed_batch_size)
+            if batch:
+                # Repeated and near-identical chunks reuse an existing vector instead of an embedding call
+                fresh, duplicates = self.deduplicator.resolve(batch)
+                if fresh:
+                    vectors = await self.embedder.embed_texts([c["content"] for c in fresh])
+                    for chunk, vector in zip(fresh, vectors):
+                        chunk["vector"] = vector
+                    self.deduplicator.embedded(fresh)
+                for chunk in duplicates:
+                    chunk["vector"] = await self.deduplicator.vector_for(chunk)
+                self.counts["embedded"] += len(fresh)
+                self.counts["deduplicated"] += len(duplicates)
+                await embedded.put(batch)
+                await self._report("embed", done=self.counts["embedded"])
+            if finished:
+                return
+
+    async def _store(self, embedded: asyncio.Queue):
+        # Re-ingested pages replace their previous chunks; clear each URL only on its first batch
+        while True:
+            batch = await embedded.get()
+            if batch is _DONE:
+                return
+            urls = {chunk["metadata"]["url"] for chunk in batch} - self.replaced_urls
+            # Duplicates the job already holds add a reference, not a row
+            stored = self.vector_store.replace_chunks(batch, urls)
+            self.replaced_urls |= urls
+            self.counts["stored"] += stored
+            await self._report("store", done=self.counts["stored"])
+
+    async def run(self, sources: Dict[str, AsyncIterator[Dict]]) -> Dict:
+        """Drain every named source through the pipeline and return stage counts"""
+        documents: asyncio.Queue = asyncio.Queue(self.queue_size)
+        chunks: asyncio.Queue = asyncio.Queue(self.queue_size * self.embed_batch_size)
+        embedded: asyncio.Queue = asyncio.Queue(self.queue_size)
+
+        async def close(tasks: List[asyncio.Task], downstream: asyncio.Queue, consumers: int):
+            # When a stage finishes, tell each consumer of the next stage to stop
+            await asyncio.gather(*tasks)
+            for _ in range(consumers):
+                await downstream.put(_DONE)
+
+        producers = [asyncio.create_task(self._produce(name, src, documents)) for name, src in sources.items()]
+        chunkers = [asyncio.create_task(self._chunk(documents, chunks)) for _ in range(self.chunk_workers)]
+        embedders = [asyncio.create_task(self._embed(chunks, embedded)) for _ in range(self.embed_workers)]
+        sink = asyncio.create_task(self._store(embedded))
+
+        stages = [
+            asyncio.create_task(close(producers, documents, self.chunk_workers)),
+            asyncio.create_task(close(chunkers, chunks, self.embed_workers)),
+            asyncio.create_task(close(embedders, embedded, 1)),
+            sink
+        ]
+        try:
+            await asyncio.gather(*stages)
+        except BaseException:
+            for task in producers + chunkers + embedders + stages:
+                task.cancel()
+            raise
+
+        emptied = self.document_urls - self.replaced_urls
+        if emptied:
+            removed = self.vector_store.delete_urls(self.job_id, emptied)
+            logger.info(f"🧹 Removed {removed} old chunks of {len(emptied)} pages that no longer yield any")
+
+        for stage in ("chunk", "embed", "store"):
+            await self._report(stage, "completed")
+        logger.info(f"🏁 Pipeline for job {self.job_id} finished: {self.counts}")
+        return self.counts
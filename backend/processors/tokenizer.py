@@ -0,0 +1,89 @@
+"""
+Token counting for chunk and prompt budgets.
+
+`get_token_counter(model_id)` returns one cached counter per model: the
+model's own fast (Rust) tokenizer when the `tokenizers` package can load
+it, otherwise a conservative regex approximation. Counters work on batches
+so many documents are tokenized in one call.
+"""
+
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Max input tokens per model, including special tokens; text beyond this is truncated by the model
+MODEL_TOKEN_BUDGETS = {
+    "sentence-transformers/all-MiniLM-L6-v2": 256,
+    "all-MiniLM-L6-v2": 256,
+    "jina-embeddings-v2-base-en": 8192,
+    # Ollama's default num_ctx, whatever the model could do
+    "llama3.2:1b": 2048,
+    "llama-3.1-70b-versatile": 131072,
+}
+# [CLS]/[SEP]-style tokens the model adds around every input
+SPECIAL_TOKENS = 2
+
+Offsets = List[Tuple[int, int]]
+
+
+class ApproxTokenCounter:
+    """Regex word/punctuation split; long words become several pieces, like subword tokenizers do"""
+
+    name = "approx"
+    PIECE = 6
+    _TOKEN = re.compile(r"\w+|[^\w\s]")
+
+    def offsets(self, text: str) -> Offsets:
+        spans = []
+        for match in self._TOKEN.finditer(text):
+            start, end = match.span()
+            spans.extend((i, min(i + self.PIECE, end)) for i in range(start, end, self.PIECE))
+        return spans
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        return [len(self.offsets(t)) for t in texts]
+
+
+class HFTokenCounter:
+    """The model's own fast tokenizer from the `tokenizers` package"""
+
+    def __init__(self, model_id: str):
+        from tokenizers import Tokenizer
+
+        self.name = model_id
+        self._tokenizer = Tokenizer.from_pretrained(model_id)
+        self._tokenizer.no_truncation()
+
+    def offsets(self, text: str) -> Offsets:
+        return self._tokenizer.encode(text, add_special_tokens=False).offsets
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        # encode_batch tokenizes in parallel in Rust, outside the GIL
+        encodings = self._tokenizer.encode_batch(texts, add_special_tokens=False)
+        return [len(e.ids) for e in encodings]
+
+
+@lru_cache(maxsize=8)
+def get_token_counter(model_id: str):
+    """Cached counter for a model; loading a tokenizer is far slower than using it"""
+    if "/" in model_id:
+        try:
+            counter = HFTokenCounter(model_id)
+            logger.info(f"🔤 Loaded fast tokenizer for {model_id}")
+            return counter
+        except Exception as e:
+            logger.warning(f"⚠️ No fast tokenizer for {model_id} ({e}); approximating token counts")
+    return ApproxTokenCounter()
+
+
+def token_budget(model_id: str) -> Optional[int]:
+    """Usable input tokens per text for a model (EMBED_MAX_TOKENS overrides), or None if unknown"""
+    override = os.getenv("EMBED_MAX_TOKENS")
+    if override:
+        return int(override)
+    budget = MODEL_TOKEN_BUDGETS.get(model_id)
+    return budget - SPECIAL_TOKENS if budget else None
@@ -0,0 +1,129 @@
+"""
+Answer cache in front of `Generator.generate`.
+
+Entries are grouped by (job_id, request type, fingerprint of the retrieved
+context) and hold the answer, the prompt and its query embedding:
+
+- an identical prompt (case/whitespace-insensitive) over the same context
+  is a hit;
+- optionally, a prompt whose embedding has cosine similarity at or above
+  `similarity` with a cached prompt of the same group is a hit too.
+
+Entries expire after `ttl` seconds, the least recently used are evicted
+beyond `max_entries`, and an entry is dropped when the job's chunks have
+changed since it was stored (`VectorStore.job_version`).
+"""
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import logging
+import os
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Group = Tuple[str, str, str]
+
+
+def context_fingerprint(context: List[Dict]) -> str:
+    """Hash of the retrieved chunks, in rank order"""
+    digest = hashlib.sha256()
+    for chunk in context:
+        digest.update(chunk.get("url", "").encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(chunk.get("content", "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _normalize(prompt: str) -> str:
+    return " ".join(prompt.lower().split())
+
+
+class AnswerCache:
+    """TTL + LRU cache of generated answers with optional query-embedding matching"""
+
+    def __init__(self, max_entries: int = int(os.getenv("ANSWER_CACHE_SIZE", "256")),
+                 ttl: float = float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+                 similarity: Optional[float] = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95")) or None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries: "OrderedDict[Tuple[Group, str], Dict]" = OrderedDict()
+        self._groups: Dict[Group, set] = {}
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "expired": 0, "invalidated": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: Tuple[Group, str]):
+        self._entries.pop(key, None)
+        members = self._groups.get(key[0])
+        if members is not None:
+            members.discard(key)
+            if not members:
+                del self._groups[key[0]]
+
+    def _fresh(self, key: Tuple[Group, str], version: int) -> bool:
+        entry = self._entries[key]
+        if time.monotonic() - entry["created"] > self.ttl:
+            self.stats["expired"] += 1
+        elif entry["version"] != version:
+            self.stats["invalidated"] += 1
+        else:
+            return True
+        self._drop(key)
+        return False
+
+    def get(self, job_id: str, doc_type: str, prompt: str, context: List[Dict], version: int = 0,
+            query_vector=None) -> Optional[str]:
+        """The cached answer for this prompt and context, or None"""
+        group = (job_id, doc_type, context_fingerprint(context))
+        key = (group, _normalize(prompt))
+        if key in self._entries and self._fresh(key, version):
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return self._entries[key]["answer"]
+
+        if self.similarity and query_vector is not None:
+            query = np.asarray(query_vector, dtype=np.float32)
+            query = query / (np.linalg.norm(query) or 1.0)
+            best, best_score = None, self.similarity
+            for candidate in list(self._groups.get(group, ())):
+                if not self._fresh(candidate, version):
+                    continue
+                vector = self._entries[candidate]["vector"]
+                score = float(vector @ query) if vector is not None else -1.0
+                if score >= best_score:
+                    best, best_score = candidate, score
+            if best is not None:
+                self._entries.move_to_end(best)
+                self.stats["semantic_hits"] += 1
+                logger.info(f"🎯 Semantic answer cache hit (similarity {best_score:.3f})")
+                return self._entries[best]["answer"]
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, job_id: str, doc_type: str, prompt: str, context: List[Dict], answer: str,
+            version: int = 0, query_vector=None):
+        group = (job_id, doc_type, context_fingerprint(context))
+        key = (group, _normalize(prompt))
+        vector = None
+        if query_vector is not None:
+            vector = np.asarray(query_vector, dtype=np.float32)
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+        self._entries[key] = {"answer": answer, "vector": vector, "version": version, "created": time.monotonic()}
+        self._entries.move_to_end(key)
+        self._groups.setdefault(group, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate_job(self, job_id: str) -> int:
+        """Drop every answer cached for a job"""
+        keys = [key for key in self._entries if key[0][0] == job_id]
+        for key in keys:
+            self._drop(key)
+        return len(keys)
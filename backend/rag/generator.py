@@ -1,20 +1,54 @@
 import httpx
 import os
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional
 import logging
 import json
+from ..services.http_clients import HTTPClientRegistry, get_http_clients
+from ..processors.tokenizer import MODEL_TOKEN_BUDGETS, get_token_counter
 
 logger = logging.getLogger(__name__)
 
+class GenerationFailure(str):
+    """Error text returned in place of an answer; shown to the user but never cached"""
+    failed = True
+
 class Generator:
-    def __init__(self):
+    def __init__(self, http_clients: Optional[HTTPClientRegistry] = None):
+        self._http_clients = http_clients
         self.ollama_url = os.getenv("OLLAMA_URL", "http://localhost:11434")
         self.model = "llama3.2:1b"  # Faster 1B parameter model
+        # "ollama" (default) or "groq"; only streaming uses Groq today
+        self.provider = os.getenv("LLM_PROVIDER", "ollama")
+        # Prompts past the context window are silently cut by the server; leave room for the answer
+        self.context_tokens = int(os.getenv("LLM_CONTEXT_TOKENS", MODEL_TOKEN_BUDGETS.get(self.model, 2048)))
+        self.answer_tokens = int(os.getenv("LLM_ANSWER_TOKENS", "512"))
         logger.info(f"Using Ollama at {self.ollama_url} with model {self.model}")
 
-    async def generate(self, prompt: str, context: List[Dict]) -> str:
+    def _client(self) -> httpx.AsyncClient:
+        return (self._http_clients or get_http_clients()).get(self.ollama_url)
+
+    def _fit_context(self, prompt: str, context: List[Dict]) -> List[Dict]:
+        """Keep the best-ranked context chunks that fit in the model's context window"""
+        counter = get_token_counter(self.model)
+        sizes = counter.count_many([prompt] + [c["content"] for c in context])
+        # ~100 tokens for the instructions, ~20 per source header
+        budget = self.context_tokens - self.answer_tokens - sizes[0] - 100
+        kept = []
+        for chunk, size in zip(context, sizes[1:]):
+            if size + 20 > budget:
+                break
+            kept.append(chunk)
+            budget -= size + 20
+        if len(kept) < len(context):
+            logger.warning(f"⚠️ Dropped {len(context) - len(kept)} context chunks to fit {self.context_tokens} tokens")
+        return kept
+
+    def _build_prompt(self, prompt: str, context: List[Dict]) -> str:
         # Construct context string
-        context_str = "\n\n".join([f"Source: {c['url']}\nContent: {c['content']}" for c in context])
+        context_str = "\n\n".join([
+            f"Source: {c['url']}" + (f" ({c['section']})" if c.get("section") else "") + f"\nContent: {c['content']}"
+            for c in context
+        ])
         
         system_prompt = """You are an expert technical writer. 
         Use the provided context to answer the user's request or generate documentation.
@@ -27,25 +61,65 @@ class Generator:
         Request:
         {prompt}
         """
+        return f"{system_prompt}\n\n{user_prompt}"
 
+    async def generate(self, prompt: str, context: List[Dict]) -> str:
+        context = self._fit_context(prompt, context)
         try:
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                response = await client.post(
-                    f"{self.ollama_url}/api/generate",
-                    json={
-                        "model": self.model,
-                        "prompt": f"{system_prompt}\n\n{user_prompt}",
-                        "stream": False
-                    }
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return result.get("response", "No response generated")
-                else:
-                    error_msg = f"Ollama returned status {response.status_code}"
-                    logger.error(error_msg)
-                    return f"Error: {error_msg}. Make sure Ollama is running and the model '{self.model}' is pulled.\nRun: docker exec -it crawler-ollama-1 ollama pull {self.model}"
+            client = self._client()
+            response = await client.post(
+                f"{self.ollama_url}/api/generate",
+                json={
+                    "model": self.model,
+                    "prompt": self._build_prompt(prompt, context),
+                    "stream": False
+                },
+                timeout=120.0
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                if "response" not in result:
+                    return GenerationFailure("No response generated")
+                return result["response"]
+            else:
+                error_msg = f"Ollama returned status {response.status_code}"
+                logger.error(error_msg)
+                return GenerationFailure(f"Error: {error_msg}. Make sure Ollama is running and the model '{self.model}' is pulled.\nRun: docker exec -it crawler-ollama-1 ollama pull {self.model}")
         except Exception as e:
             logger.error(f"Generation failed: {e}")
-            return f"Error generating content: {e}\n\nMake sure Ollama is running: docker-compose up -d"
+            return GenerationFailure(f"Error generating content: {e}\n\nMake sure Ollama is running: docker-compose up -d")
+
+    async def generate_stream(self, prompt: str, context: List[Dict]) -> AsyncIterator[str]:
+        """Yield generated text piece by piece as the LLM produces it"""
+        context = self._fit_context(prompt, context)
+        if self.provider == "groq":
+            from ..services.groq_client import GroqClient
+            async for token in GroqClient().generate_stream(prompt, context):
+                yield token
+            return
+
+        async with self._client().stream(
+            "POST",
+            f"{self.ollama_url}/api/generate",
+            json={
+                "model": self.model,
+                "prompt": self._build_prompt(prompt, context),
+                "stream": True
+            },
+            timeout=httpx.Timeout(120.0, connect=10.0)
+        ) as response:
+            if response.status_code != 200:
+                raise RuntimeError(
+                    f"Ollama returned status {response.status_code}. "
+                    f"Make sure Ollama is running and the model '{self.model}' is pulled."
+                )
+            # Ollama streams one JSON object per line
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    break
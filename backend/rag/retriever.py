@@ -1,15 +1,17 @@
 from ..embeddings.vector_store import VectorStore
 from ..embeddings.embedder import Embedder
-from typing import List, Dict
+from ..embeddings.embedding_cache import CachedEmbedder
+from typing import List, Dict, Optional
 import logging
 import asyncio
 
 logger = logging.getLogger(__name__)
 
 class Retriever:
-    def __init__(self):
-        self.vector_store = VectorStore()
-        self.embedder = Embedder()
+    def __init__(self, vector_store: Optional[VectorStore] = None, embedder=None):
+        # The app passes its shared store and warmed embedder; standalone use builds its own
+        self.vector_store = vector_store or VectorStore()
+        self.embedder = embedder or CachedEmbedder(Embedder())
 
     async def retrieve(self, query: str, job_id: str = None, limit: int = 5) -> List[Dict]:
         # 1. Embed query
@@ -35,14 +37,34 @@ class Retriever:
         
         logger.info(f"Found {len(results)} results from vector store")
         
-        # Close the connection
-        self.vector_store.close()
-        
+        return self._to_context(results)
+
+    async def retrieve_many(self, queries: List[str], job_id: str = None, limit: int = 5) -> List[List[Dict]]:
+        """Embed all queries in one batch and score them with a single store search"""
+        if not queries:
+            return []
+
+        logger.info(f"Creating embeddings for {len(queries)} queries in one batch...")
+        query_embeddings = await self.embedder.embed_texts(queries)
+
+        logger.info(f"Batch searching vector store with job_id={job_id}, limit={limit}")
+        results = await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: self.vector_store.search_by_vectors(query_embeddings, limit, job_id)
+        )
+        if not results:
+            return [[] for _ in queries]
+
+        return [self._to_context(hits) for hits in results]
+
+    @staticmethod
+    def _to_context(results) -> List[Dict]:
         return [
             {
                 "content": r.properties["content"],
                 "url": r.properties["url"],
-                "source": r.properties["source"]
+                "source": r.properties["source"],
+                "section": r.properties.get("heading") or r.properties.get("symbol")
             }
             for r in results
         ]
@@ -1,5 +1,8 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from ..embeddings.vector_store import VectorStore
+from ..services.http_clients import get_http_clients
+from ..embeddings.embedding_cache import get_embedding_cache
+from ..crawler.ledger import get_crawl_ledger
 import logging
 import asyncio
 
@@ -15,15 +18,13 @@ async def get_stats(job_id: str = None):
         logger.info("✅ Connected to vector store")
         
         # Get total count
-        total_count = len(vector_store.chunks)
+        total_count = vector_store.count()
         logger.info(f"Total chunks in store: {total_count}")
         
-        # Filter samples by job_id if provided
+        # Samples and counts only touch the job's own partition
+        samples_data = vector_store.sample(job_id=job_id, limit=5)
         if job_id:
-            samples_data = [c for c in vector_store.chunks if c.get("job_id") == job_id][:5]
-            logger.info(f"Found {len(samples_data)} samples for job_id: {job_id}")
-        else:
-            samples_data = vector_store.chunks[:5]
+            logger.info(f"Found {vector_store.count(job_id)} chunks for job_id: {job_id}")
         
         samples = [
             {
@@ -41,8 +42,29 @@ async def get_stats(job_id: str = None):
         return {
             "total_documents": total_count,
             "samples": samples,
-            "filtered_by_job_id": job_id
+            "filtered_by_job_id": job_id,
+            "job_documents": vector_store.count(job_id) if job_id else total_count,
+            "jobs": len(vector_store.job_ids())
         }
     except Exception as e:
         logger.error(f"❌ Debug stats failed: {e}", exc_info=True)
         return {"error": str(e), "total_documents": 0, "samples": []}
+
+@router.delete("/debug/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """Remove every chunk stored for a job"""
+    removed = VectorStore().delete_job(job_id)
+    get_crawl_ledger().forget(job_id)
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"No chunks stored for job_id: {job_id}")
+    return {"job_id": job_id, "deleted": removed}
+
+@router.get("/debug/http")
+async def get_http_stats():
+    """Connection pool hit/miss counters for outbound HTTP"""
+    return get_http_clients().stats()
+
+@router.get("/debug/embedding-cache")
+async def get_embedding_cache_stats():
+    """Embedding cache hit ratios per tier"""
+    return get_embedding_cache().stats()
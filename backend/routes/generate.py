@@ -1,50 +1,170 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from typing import AsyncIterator, Callable, Dict, List, Optional
 from ..rag.retriever import Retriever
 from ..rag.generator import Generator
+from ..rag.answer_cache import AnswerCache
+from ..services.container import get_answer_cache, get_generator, get_retriever
+import asyncio
+import json
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+NO_CONTEXT_MESSAGE = "No relevant context found to generate documentation."
+
 class GenerateRequest(BaseModel):
     job_id: str
     prompt: str
     type: str = "custom" # api, product, changelog, custom
+    stream: bool = False  # Server-Sent Events: sources first, then tokens
+
+class GenerateSection(BaseModel):
+    prompt: str
+    type: str = "custom"
+
+class BatchGenerateRequest(BaseModel):
+    job_id: str
+    sections: List[GenerateSection]
+
+def build_prompt(doc_type: str, prompt: str) -> str:
+    """Adjust prompt based on type"""
+    if doc_type == "api":
+        return f"Generate a detailed API Reference based on the following context. {prompt}"
+    elif doc_type == "product":
+        return f"Write a comprehensive Product Description. {prompt}"
+    elif doc_type == "changelog":
+        return f"Summarize the recent changes and changelog. {prompt}"
+    return prompt
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class CachedAnswer:
+    """Replays a cached answer through the streaming interface"""
+
+    def __init__(self, answer: str):
+        self.answer = answer
+
+    async def generate_stream(self, prompt: str, context: List[Dict]) -> AsyncIterator[str]:
+        yield self.answer
+
+class AnswerLookup:
+    """Cache lookup and store for one request's prompt and retrieved context"""
+
+    def __init__(self, cache: AnswerCache, retriever: Retriever, job_id: str, doc_type: str,
+                 prompt: str, context: List[Dict]):
+        self.cache = cache
+        self.retriever = retriever
+        self.key = dict(job_id=job_id, doc_type=doc_type, prompt=prompt, context=context)
+        self.version = retriever.vector_store.job_version(job_id)
+        self.query_vector = None
+
+    async def get(self) -> Optional[str]:
+        if self.cache.similarity:
+            # The retriever just embedded this prompt, so this is an embedding-cache hit
+            self.query_vector = (await self.retriever.embedder.embed_texts([self.key["prompt"]]))[0]
+        return self.cache.get(**self.key, version=self.version, query_vector=self.query_vector)
+
+    def put(self, answer: str):
+        # Error text from a failed generation must not be served for the whole TTL
+        if getattr(answer, "failed", False):
+            return
+        self.cache.put(**self.key, answer=answer, version=self.version, query_vector=self.query_vector)
+
+async def stream_generation(generator: Generator, prompt: str, context: List[Dict],
+                            on_done: Optional[Callable[[str], None]] = None) -> AsyncIterator[str]:
+    """SSE stream: one `sources` event, a `token` event per chunk, then `done` (or `error`)"""
+    yield sse_event("sources", context)
+    if not context:
+        yield sse_event("token", NO_CONTEXT_MESSAGE)
+        yield sse_event("done", {})
+        return
+    try:
+        tokens = []
+        async for token in generator.generate_stream(prompt, context):
+            tokens.append(token)
+            yield sse_event("token", token)
+        yield sse_event("done", {})
+        if on_done:
+            on_done("".join(tokens))
+    except Exception as e:
+        logger.error(f"Streaming generation failed: {e}")
+        yield sse_event("error", {"detail": str(e)})
 
 @router.post("/generate")
-async def generate_docs(req: GenerateRequest):
+async def generate_docs(req: GenerateRequest, retriever: Retriever = Depends(get_retriever),
+                        generator: Generator = Depends(get_generator),
+                        answer_cache: AnswerCache = Depends(get_answer_cache)):
     try:
-        retriever = Retriever()
-        generator = Generator()
-        
         # 1. Retrieve context
         logger.info(f"Retrieving context for job {req.job_id} with prompt: {req.prompt}")
         context = await retriever.retrieve(req.prompt, job_id=req.job_id)
-        
+
         logger.info(f"Retrieved {len(context)} context chunks for job {req.job_id}")
-        
+
+        lookup = AnswerLookup(answer_cache, retriever, req.job_id, req.type, req.prompt, context)
+        cached = await lookup.get() if context else None
+
+        if req.stream:
+            return StreamingResponse(
+                stream_generation(CachedAnswer(cached) if cached is not None else generator,
+                                  build_prompt(req.type, req.prompt), context,
+                                  on_done=None if cached is not None else lookup.put),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+
         if not context:
             logger.warning(f"No context found for job_id: {req.job_id}. Check if ingestion completed successfully.")
-            return {"content": "No relevant context found to generate documentation.", "sources": []}
-            
+            return {"content": NO_CONTEXT_MESSAGE, "sources": []}
+
+        if cached is not None:
+            return {"content": cached, "sources": context, "cached": True}
+
         # 2. Generate content
-        # Adjust prompt based on type
-        final_prompt = req.prompt
-        if req.type == "api":
-            final_prompt = f"Generate a detailed API Reference based on the following context. {req.prompt}"
-        elif req.type == "product":
-            final_prompt = f"Write a comprehensive Product Description. {req.prompt}"
-        elif req.type == "changelog":
-            final_prompt = f"Summarize the recent changes and changelog. {req.prompt}"
-            
-        content = await generator.generate(final_prompt, context)
-        
+        content = await generator.generate(build_prompt(req.type, req.prompt), context)
+        lookup.put(content)
+
         return {
             "content": content,
             "sources": context
         }
-        
+
     except Exception as e:
         logger.error(f"Generation failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/generate/batch")
+async def generate_docs_batch(req: BatchGenerateRequest, retriever: Retriever = Depends(get_retriever),
+                              generator: Generator = Depends(get_generator),
+                              answer_cache: AnswerCache = Depends(get_answer_cache)):
+    """Generate several sections for one job with a single batched retrieval"""
+    if not req.sections:
+        raise HTTPException(status_code=400, detail="At least one section is required")
+    try:
+        # 1. Retrieve context for every section at once
+        logger.info(f"Retrieving context for {len(req.sections)} sections of job {req.job_id}")
+        contexts = await retriever.retrieve_many([s.prompt for s in req.sections], job_id=req.job_id)
+
+        # 2. Generate sections concurrently
+        async def generate_section(section: GenerateSection, context: List):
+            if not context:
+                return {"type": section.type, "content": NO_CONTEXT_MESSAGE, "sources": []}
+            lookup = AnswerLookup(answer_cache, retriever, req.job_id, section.type, section.prompt, context)
+            content = await lookup.get()
+            if content is None:
+                content = await generator.generate(build_prompt(section.type, section.prompt), context)
+                lookup.put(content)
+            return {"type": section.type, "content": content, "sources": context}
+
+        results = await asyncio.gather(*[
+            generate_section(section, context) for section, context in zip(req.sections, contexts)
+        ])
+        return {"job_id": req.job_id, "results": results}
+
+    except Exception as e:
+        logger.error(f"Batch generation failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
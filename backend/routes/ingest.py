@@ -1,13 +1,16 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from typing import Dict, Optional
 from ..crawler.crawler import Crawler
+from ..crawler.ledger import get_crawl_ledger
 from ..github.fetcher import GitHubFetcher
-from ..processors.chunker import Chunker
-from ..embeddings.vector_store import VectorStore
-from ..embeddings.embedder import Embedder
+from ..processors.pipeline import IngestionPipeline
+from ..services.container import get_services
+from ..jobs.queue import JobProgress, QueueFullError, get_job_queue
+import asyncio
+import os
 import uuid
 import logging
-import asyncio
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -15,60 +18,76 @@ logger = logging.getLogger(__name__)
 class IngestRequest(BaseModel):
     url: str
     repo_url: str
+    max_pages: int = 10
+    max_depth: int = 2
+    job_id: Optional[str] = None  # Re-crawl an existing job, re-embedding only changed pages
 
-async def process_ingestion(job_id: str, req: IngestRequest):
-    logger.info(f"Starting ingestion for job {job_id}")
-    print(f"🚀 Starting ingestion for job {job_id}")  # DEBUG
+async def process_ingestion(job_id: str, req: IngestRequest, progress: Optional[JobProgress] = None):
+    logger.info(f"🚀 Starting ingestion for job {job_id}")
     
     try:
-        # SIMPLIFIED INGESTION FOR PROTOTYPE
-        logger.info(f"🚀 Starting simplified ingestion for job {job_id}")
+        # The app's shared store, warmed embedder and chunker
+        services = get_services()
+        vector_store = services.vector_store
+        # Wait for the warm-up's index load, which replaces partitions and would race with our writes
+        await asyncio.to_thread(vector_store.ensure_loaded)
         
-        # Initialize vector store (Singleton)
-        vector_store = VectorStore()
+        # Fingerprints from the job's previous crawl; useless once its chunks are gone
+        ledger = get_crawl_ledger()
+        if not vector_store.count(job_id):
+            ledger.forget(job_id)
+        session = ledger.session(job_id)
         
-        # 1. Crawl Website (Simulated/Lightweight)
-        logger.info(f"🕷️ Crawling {req.url}...")
-        web_content = f"Content from {req.url}. This is a simulated crawl for prototype speed."
+        # 1. Sources: crawl the website and fetch GitHub docs concurrently
+        sources = {}
+        crawler = None
+        if req.url:
+            logger.info(f"🕷️ Crawling {req.url}...")
+            crawler = Crawler(req.url, max_depth=req.max_depth, max_pages=req.max_pages, ledger=session)
+            sources["crawl"] = crawler.iter_pages()
+        if req.repo_url:
+            logger.info(f"🔍 Fetching from {req.repo_url}...")
+            sources["fetch"] = GitHubFetcher(req.repo_url, token=os.getenv("GITHUB_TOKEN")).iter_documents()
         
-        # 2. Fetch GitHub (Simulated/Lightweight)
-        logger.info(f"🔍 Fetching from {req.repo_url}...")
-        repo_content = f"README content from {req.repo_url}. AutoDoc AI is a tool for generating documentation."
+        # 2-4. Chunk, embed and store as documents arrive
+        pipeline = IngestionPipeline(job_id, services.chunker, services.embedder, vector_store, progress)
+        counts = await pipeline.run(sources)
         
-        # 3. Create Chunks (Directly)
-        all_chunks = [
-            {
-                "content": web_content,
-                "metadata": {"url": req.url, "source": "website", "job_id": job_id},
-                "vector": [0.1] * 384 # Mock vector
-            },
-            {
-                "content": repo_content,
-                "metadata": {"url": req.repo_url, "source": "github", "job_id": job_id},
-                "vector": [0.1] * 384 # Mock vector
-            }
-        ]
+        if counts["stored"] == 0 and counts["failed_sources"]:
+            raise RuntimeError("Every source failed; nothing was ingested")
         
-        # 4. Store in Simple Vector Store
-        logger.info(f"💾 Storing {len(all_chunks)} chunks in vector store...")
-        vector_store.add_chunks(all_chunks)
+        # Pages the re-crawl found gone lose their chunks and fingerprints
+        stale = crawler.stale_urls() if crawler else set()
+        if stale:
+            removed = vector_store.delete_urls(job_id, stale)
+            session.drop(stale)
+            logger.info(f"🧹 Removed {removed} chunks of {len(stale)} pages gone from the site")
         
         # Don't close the singleton store!
-        # vector_store.close()
+        vector_store.save(job_ids=[job_id])
+        session.commit()
+        if crawler and progress:
+            await progress.stage("crawl", "completed", unchanged=crawler.stats["unchanged"])
         
-        logger.info(f"🎉 Job {job_id} completed successfully!")
+        logger.info(f"🎉 Job {job_id} completed successfully! ({counts['stored']} chunks)")
         
     except Exception as e:
         logger.error(f"❌ Ingestion failed for job {job_id}: {e}", exc_info=True)
         raise
 
+async def run_ingestion_job(job_id: str, payload: Dict, progress: JobProgress):
+    """Job queue handler: payloads are plain dicts so they survive a Redis round-trip"""
+    await process_ingestion(job_id, IngestRequest(**payload), progress)
+
 @router.post("/ingest")
-async def start_ingest(req: IngestRequest, background_tasks: BackgroundTasks):
-    job_id = str(uuid.uuid4())
+async def start_ingest(req: IngestRequest):
+    job_id = req.job_id or str(uuid.uuid4())
     
-    # Run synchronously for debugging/prototype to ensure it completes
-    await process_ingestion(job_id, req)
-    
-    # background_tasks.add_task(process_ingestion, job_id, req)
+    # Hand off to the worker pool; progress is available at GET /jobs/{job_id}
+    try:
+        record = await get_job_queue().submit(job_id, req.model_dump())
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     
-    return {"status": "processing", "job_id": job_id}
+    # A job that is already queued or running is coalesced, not run twice
+    return {"status": record["status"], "job_id": job_id}
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, HTTPException
+from ..jobs.queue import get_job_queue
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and per-stage progress of an ingestion job"""
+    record = await get_job_queue().get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job_id: {job_id}")
+    return record
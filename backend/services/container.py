@@ -0,0 +1,85 @@
+"""
+Application-scoped service container.
+
+The FastAPI lifespan builds one `ServiceContainer` holding the HTTP client
+registry, vector store, (warmed) embedder, chunker, retriever, generator
+and answer cache. Routes receive them through `Depends`, and background jobs use
+`get_services()`, so no request pays for constructing a model, client or
+store, and shutdown closes everything in one place.
+"""
+
+from typing import Optional
+import logging
+from fastapi import Depends, Request
+
+from .http_clients import HTTPClientRegistry
+from ..embeddings.embedder import Embedder
+from ..embeddings.embedding_cache import CachedEmbedder
+from ..embeddings.embedding_server import close_embedding_servers
+from ..embeddings.vector_store import VectorStore
+from ..processors.chunker import Chunker
+from ..rag.answer_cache import AnswerCache
+from ..rag.generator import Generator
+from ..rag.retriever import Retriever
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """Long-lived services shared by every request and job"""
+
+    def __init__(self, http_clients: Optional[HTTPClientRegistry] = None, vector_store: Optional[VectorStore] = None,
+                 embedder=None, generator: Optional[Generator] = None):
+        self.http_clients = http_clients or HTTPClientRegistry.from_env()
+        self.vector_store = vector_store or VectorStore()
+        self.embedder = embedder or CachedEmbedder(Embedder())
+        self.generator = generator or Generator(self.http_clients)
+        self.retriever = Retriever(self.vector_store, self.embedder)
+        # Chunks sized to the embedding model's token limit, so nothing is truncated at embed time
+        self.chunker = Chunker.for_model(self.embedder.model_name)
+        # Mock query vectors are all identical, so only exact prompts may match under them
+        self.answer_cache = AnswerCache() if self.embedder.model_id != "mock" else AnswerCache(similarity=None)
+
+    async def aclose(self):
+        """Stop embedding workers and close pooled connections"""
+        await close_embedding_servers()
+        await self.http_clients.aclose()
+        logger.info("🧹 Services closed")
+
+
+_default: Optional[ServiceContainer] = None
+
+
+def set_services(container: Optional[ServiceContainer]):
+    """Install (or clear) the process-wide container; called from the FastAPI lifespan"""
+    global _default
+    _default = container
+
+
+def get_services() -> ServiceContainer:
+    """The process-wide container, created on first use outside the app (scripts, tests)"""
+    global _default
+    if _default is None:
+        _default = ServiceContainer()
+    return _default
+
+
+def services_dependency(request: Request) -> ServiceContainer:
+    services = getattr(request.app.state, "services", None)
+    return services if services is not None else get_services()
+
+
+def get_retriever(services: ServiceContainer = Depends(services_dependency)) -> Retriever:
+    return services.retriever
+
+
+def get_generator(services: ServiceContainer = Depends(services_dependency)) -> Generator:
+    return services.generator
+
+
+def get_vector_store(services: ServiceContainer = Depends(services_dependency)) -> VectorStore:
+    return services.vector_store
+
+
+def get_answer_cache(services: ServiceContainer = Depends(services_dependency)) -> AnswerCache:
+    return services.answer_cache
@@ -0,0 +1,140 @@
+"""
+Concurrent, adaptive batching for remote embedding APIs.
+
+`RemoteEmbeddingBatcher` splits a call's texts into batches and keeps up to
+`concurrency` of them in flight (shared by every call on the same
+embedder), so embedding a large ingestion is bounded by throughput rather
+than round-trip latency.
+
+- Batch size adapts: it grows while batches come back well under
+  `target_latency` and halves when they are slow or the API throttles.
+- 413 (payload too large) splits the batch in two and lowers the cap.
+- 429, 5xx and transport errors retry only the failed batch, waiting out
+  `Retry-After` or backing off exponentially.
+- Results are written by input position, so they come back in order.
+"""
+
+from collections import deque
+from typing import Awaitable, Callable, List, Optional
+import asyncio
+import logging
+import os
+import time
+import httpx
+
+logger = logging.getLogger(__name__)
+
+SendBatch = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+class RemoteEmbeddingBatcher:
+    """Sends batches concurrently under a semaphore, adapting batch size to latency and throttling"""
+
+    def __init__(self, name: str, send_batch: SendBatch,
+                 concurrency: int = int(os.getenv("EMBED_REMOTE_CONCURRENCY", "4")),
+                 batch_size: int = 32,
+                 min_batch_size: int = 1,
+                 max_batch_size: int = int(os.getenv("EMBED_REMOTE_MAX_BATCH", "128")),
+                 target_latency: float = float(os.getenv("EMBED_REMOTE_TARGET_LATENCY", "2.0")),
+                 max_retries: int = 4,
+                 backoff_base: float = 0.5,
+                 max_wait: float = 30.0):
+        self.name = name
+        self.send_batch = send_batch
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.stats = {"batches": 0, "retries": 0, "splits": 0, "throttled": 0}
+
+    def _observe(self, size: int, latency: float):
+        """Additive increase while fast, multiplicative decrease when slow"""
+        if latency > self.target_latency:
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+        elif size >= self.batch_size and latency < self.target_latency / 2:
+            self.batch_size = min(self.max_batch_size, self.batch_size + max(1, self.batch_size // 4))
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying a failed batch, or None if retrying won't help"""
+        if isinstance(error, httpx.TransportError):
+            return self.backoff_base * 2 ** attempt
+        if not isinstance(error, httpx.HTTPStatusError):
+            return None
+        status = error.response.status_code
+        if status == 429:
+            self.stats["throttled"] += 1
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+            retry_after = error.response.headers.get("retry-after")
+            try:
+                return min(self.max_wait, float(retry_after)) if retry_after else self.backoff_base * 2 ** attempt
+            except ValueError:
+                return self.backoff_base * 2 ** attempt
+        if status >= 500:
+            return self.backoff_base * 2 ** attempt
+        return None
+
+    async def _send(self, texts: List[str]) -> List[List[float]]:
+        async with self._semaphore:
+            started = time.perf_counter()
+            vectors = await self.send_batch(texts)
+            latency = time.perf_counter() - started
+        if len(vectors) != len(texts):
+            raise ValueError(f"{self.name} returned {len(vectors)} embeddings for {len(texts)} texts")
+        self.stats["batches"] += 1
+        self._observe(len(texts), latency)
+        return vectors
+
+    async def embed(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """Embed texts in concurrent batches; `batch_size` caps the adaptive size for this call"""
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        retry = deque()  # (start, end, attempt) ranges to send again
+        cursor = 0
+
+        def next_range():
+            nonlocal cursor
+            if retry:
+                return retry.popleft()
+            if cursor >= len(texts):
+                return None
+            size = min(self.batch_size, batch_size or self.batch_size)
+            start, cursor = cursor, min(cursor + size, len(texts))
+            return start, cursor, 0
+
+        async def worker():
+            # A worker requeues its own failures, so no range is dropped when others finish first
+            while (work := next_range()) is not None:
+                start, end, attempt = work
+                try:
+                    results[start:end] = await self._send(texts[start:end])
+                    continue
+                except (httpx.HTTPError, ValueError) as e:
+                    error = e
+                status = getattr(getattr(error, "response", None), "status_code", None)
+                if status == 413 and end - start > 1:
+                    middle = (start + end) // 2
+                    self.stats["splits"] += 1
+                    self.max_batch_size = max(self.min_batch_size, middle - start)
+                    self.batch_size = min(self.batch_size, self.max_batch_size)
+                    retry.extend([(start, middle, attempt), (middle, end, attempt)])
+                    continue
+                delay = self._retry_delay(error, attempt)
+                if delay is None or attempt >= self.max_retries:
+                    raise error
+                self.stats["retries"] += 1
+                logger.warning(f"⏳ {self.name} batch of {end - start} failed ({error}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                retry.append((start, end, attempt + 1))
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+            raise
+        return results
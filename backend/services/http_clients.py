@@ -0,0 +1,111 @@
+"""
+Shared, pooled HTTP clients for all outbound calls.
+
+One `httpx.AsyncClient` is kept per origin (scheme://host:port), so
+repeated calls to Ollama, GitHub, Jina or HuggingFace reuse keep-alive
+connections instead of paying a TCP+TLS handshake per request.
+"""
+
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import asyncio
+import importlib.util
+import logging
+import os
+import weakref
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPClientRegistry:
+    """Lifecycle-managed registry of per-host connection pools."""
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 30.0,
+        http2: Optional[bool] = None
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = timeout
+        # HTTP/2 needs the optional `h2` package
+        self.http2 = importlib.util.find_spec("h2") is not None if http2 is None else http2
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._requests: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "HTTPClientRegistry":
+        return cls(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+        )
+
+    @staticmethod
+    def _origin(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        """Return the pooled client for the URL's origin, creating it on first use"""
+        origin = self._origin(url)
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            self.misses += 1
+            client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout, http2=self.http2)
+            self._clients[origin] = client
+            logger.info(f"🔌 Opened HTTP pool for {origin} (http2={self.http2})")
+        else:
+            self.hits += 1
+        self._requests[origin] = self._requests.get(origin, 0) + 1
+        return client
+
+    def stats(self) -> Dict:
+        """Pool hit/miss counters and per-host usage for monitoring"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "http2": self.http2,
+            "hosts": dict(self._requests)
+        }
+
+    async def aclose(self):
+        """Close every pooled client"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        await asyncio.gather(*(c.aclose() for c in clients), return_exceptions=True)
+        logger.info(f"🔌 Closed {len(clients)} HTTP pools")
+
+
+_default: Optional[HTTPClientRegistry] = None
+# Fallback registries for code running outside the app lifespan (scripts, tests);
+# clients are bound to the event loop that created them
+_per_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, HTTPClientRegistry]" = weakref.WeakKeyDictionary()
+
+
+def set_http_clients(registry: Optional[HTTPClientRegistry]):
+    """Install (or clear) the process-wide registry; called from the FastAPI lifespan"""
+    global _default
+    _default = registry
+
+
+def get_http_clients() -> HTTPClientRegistry:
+    """The process-wide registry, or a per-event-loop one when none is installed"""
+    if _default is not None:
+        return _default
+    loop = asyncio.get_running_loop()
+    registry = _per_loop.get(loop)
+    if registry is None:
+        registry = _per_loop[loop] = HTTPClientRegistry.from_env()
+    return registry
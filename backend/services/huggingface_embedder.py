@@ -5,10 +5,12 @@ Provides free embeddings via HuggingFace's serverless inference.
 """
 
 import httpx
-from typing import List, Union
+from typing import List, Optional, Union
 import logging
 import os
 from dotenv import load_dotenv
+from .http_clients import HTTPClientRegistry, get_http_clients
+from .embedding_batcher import RemoteEmbeddingBatcher
 from pathlib import Path
 
 # Load .env from backend directory
@@ -25,7 +27,8 @@ class HuggingFaceEmbedder:
     MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
     API_URL = f"https://api-inference.huggingface.co/models/{MODEL_ID}"
     
-    def __init__(self):
+    def __init__(self, http_clients: Optional[HTTPClientRegistry] = None):
+        self._http_clients = http_clients
         self.api_key = os.getenv("HUGGINGFACE_API_KEY")
         if not self.api_key:
             raise ValueError("HUGGINGFACE_API_KEY must be set in .env")
@@ -33,18 +36,20 @@ class HuggingFaceEmbedder:
         self.headers = {
             "Authorization": f"Bearer {self.api_key}"
         }
+        # Shared by every call, so concurrent embeds respect one concurrency limit
+        self._batcher = RemoteEmbeddingBatcher("HuggingFace", self._embed_batch)
     
     async def embed(
         self, 
         texts: Union[str, List[str]], 
-        batch_size: int = 32
+        batch_size: Optional[int] = None
     ) -> List[List[float]]:
         """
         Generate embeddings for one or more texts.
         
         Args:
             texts: Single text string or list of texts
-            batch_size: Maximum texts per API call
+            batch_size: Maximum texts per API call (adaptive when None)
             
         Returns:
             List of embedding vectors (384-dimensional)
@@ -53,48 +58,47 @@ class HuggingFaceEmbedder:
         if isinstance(texts, str):
             texts = [texts]
         
-        all_embeddings = []
-        
-        # Process in batches
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            embeddings = await self._embed_batch(batch)
-            all_embeddings.extend(embeddings)
+        # Batches go out concurrently and only failed ones are retried
+        all_embeddings = await self._batcher.embed(texts, batch_size)
         
         logger.info(f"✅ Generated {len(all_embeddings)} embeddings via HuggingFace")
         return all_embeddings
     
+    def _client(self) -> httpx.AsyncClient:
+        return (self._http_clients or get_http_clients()).get(self.API_URL)
+
     async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
         """Embed a single batch of texts."""
         try:
-            async with httpx.AsyncClient(timeout=60) as client:
-                payload = {
-                    "inputs": texts,
-                    "options": {"wait_for_model": True}
-                }
-                
-                logger.info(f"🔮 Generating embeddings for {len(texts)} texts via HuggingFace...")
-                response = await client.post(
-                    self.API_URL,
-                    headers=self.headers,
-                    json=payload
-                )
-                response.raise_for_status()
-                
-                # HuggingFace returns embeddings directly as a list
-                embeddings = response.json()
-                
-                # Handle single text case (returns single embedding)
-                if isinstance(embeddings, list) and len(embeddings) > 0:
-                    if isinstance(embeddings[0], (int, float)):
-                        # Single embedding returned as flat list
-                        return [embeddings]
-                    else:
-                        # Multiple embeddings
-                        return embeddings
-                
-                return embeddings
-                
+            client = self._client()
+            payload = {
+                "inputs": texts,
+                "options": {"wait_for_model": True}
+            }
+            
+            logger.info(f"🔮 Generating embeddings for {len(texts)} texts via HuggingFace...")
+            response = await client.post(
+                self.API_URL,
+                headers=self.headers,
+                json=payload,
+                timeout=60
+            )
+            response.raise_for_status()
+            
+            # HuggingFace returns embeddings directly as a list
+            embeddings = response.json()
+            
+            # Handle single text case (returns single embedding)
+            if isinstance(embeddings, list) and len(embeddings) > 0:
+                if isinstance(embeddings[0], (int, float)):
+                    # Single embedding returned as flat list
+                    return [embeddings]
+                else:
+                    # Multiple embeddings
+                    return embeddings
+            
+            return embeddings
+            
         except httpx.HTTPError as e:
             logger.error(f"❌ HuggingFace embedding failed: {e}")
             raise
@@ -5,10 +5,12 @@ Provides fast, API-based embeddings without local model loading.
 """
 
 import httpx
-from typing import List, Union
+from typing import List, Optional, Union
 import logging
 import os
 from dotenv import load_dotenv
+from .http_clients import HTTPClientRegistry, get_http_clients
+from .embedding_batcher import RemoteEmbeddingBatcher
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -20,7 +22,8 @@ class JinaEmbedder:
     API_URL = "https://api.jina.ai/v1/embeddings"
     MODEL = "jina-embeddings-v2-base-en"  # 768 dimensions
     
-    def __init__(self):
+    def __init__(self, http_clients: Optional[HTTPClientRegistry] = None):
+        self._http_clients = http_clients
         self.api_key = os.getenv("JINA_API_KEY")
         if not self.api_key:
             raise ValueError("JINA_API_KEY must be set in .env")
@@ -29,18 +32,20 @@ class JinaEmbedder:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        # Shared by every call, so concurrent embeds respect one concurrency limit
+        self._batcher = RemoteEmbeddingBatcher("Jina", self._embed_batch)
     
     async def embed(
         self, 
         texts: Union[str, List[str]], 
-        batch_size: int = 32
+        batch_size: Optional[int] = None
     ) -> List[List[float]]:
         """
         Generate embeddings for one or more texts.
         
         Args:
             texts: Single text string or list of texts
-            batch_size: Maximum texts per API call
+            batch_size: Maximum texts per API call (adaptive when None)
             
         Returns:
             List of embedding vectors (768-dimensional)
@@ -49,39 +54,38 @@ class JinaEmbedder:
         if isinstance(texts, str):
             texts = [texts]
         
-        all_embeddings = []
-        
-        # Process in batches
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            embeddings = await self._embed_batch(batch)
-            all_embeddings.extend(embeddings)
+        # Batches go out concurrently and only failed ones are retried
+        all_embeddings = await self._batcher.embed(texts, batch_size)
         
         logger.info(f"✅ Generated {len(all_embeddings)} embeddings")
         return all_embeddings
     
+    def _client(self) -> httpx.AsyncClient:
+        return (self._http_clients or get_http_clients()).get(self.API_URL)
+
     async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
         """Embed a single batch of texts."""
         try:
-            async with httpx.AsyncClient(timeout=30) as client:
-                payload = {
-                    "model": self.MODEL,
-                    "input": texts
-                }
-                
-                logger.info(f"🔮 Generating embeddings for {len(texts)} texts...")
-                response = await client.post(
-                    self.API_URL,
-                    headers=self.headers,
-                    json=payload
-                )
-                response.raise_for_status()
-                
-                data = response.json()
-                embeddings = [item["embedding"] for item in data["data"]]
-                
-                return embeddings
-                
+            client = self._client()
+            payload = {
+                "model": self.MODEL,
+                "input": texts
+            }
+            
+            logger.info(f"🔮 Generating embeddings for {len(texts)} texts...")
+            response = await client.post(
+                self.API_URL,
+                headers=self.headers,
+                json=payload,
+                timeout=30
+            )
+            response.raise_for_status()
+            
+            data = response.json()
+            embeddings = [item["embedding"] for item in data["data"]]
+            
+            return embeddings
+            
         except httpx.HTTPError as e:
             logger.error(f"❌ Embedding generation failed: {e}")
             raise
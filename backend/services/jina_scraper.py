@@ -9,6 +9,8 @@ from typing import Optional, Dict
 import logging
 import os
 from dotenv import load_dotenv
+from .http_clients import HTTPClientRegistry, get_http_clients
+from ..crawler.ledger import LedgerSession
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -19,55 +21,79 @@ class JinaScraper:
     
     BASE_URL = "https://r.jina.ai"
     
-    def __init__(self):
+    def __init__(self, http_clients: Optional[HTTPClientRegistry] = None):
+        self._http_clients = http_clients
         self.api_key = os.getenv("JINA_API_KEY")
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "X-Return-Format": "markdown"
         } if self.api_key else {"X-Return-Format": "markdown"}
     
-    async def scrape(self, url: str, timeout: int = 30) -> Dict[str, str]:
+    def _client(self, url: str) -> httpx.AsyncClient:
+        return (self._http_clients or get_http_clients()).get(url)
+
+    @staticmethod
+    def _unchanged(ledger: Optional[LedgerSession], url: str, response: httpx.Response, content: str) -> bool:
+        if ledger is None:
+            return False
+        return not ledger.observe(url, content, etag=response.headers.get("etag"),
+                                  last_modified=response.headers.get("last-modified"))
+
+    async def scrape(self, url: str, timeout: int = 30,
+                     ledger: Optional[LedgerSession] = None) -> Optional[Dict[str, str]]:
         """
         Scrape a URL and return clean markdown content.
         
         Args:
             url: The URL to scrape
             timeout: Request timeout in seconds
+            ledger: Fingerprints from a previous crawl; unchanged pages are skipped
             
         Returns:
-            Dict with 'content' (markdown), 'title', and 'url'
+            Dict with 'content' (markdown), 'title', and 'url', or None if the
+            page is unchanged since the ledger's last crawl
             
         Raises:
             httpx.HTTPError: If scraping fails
         """
         try:
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                jina_url = f"{self.BASE_URL}/{url}"
-                logger.info(f"🕷️  Scraping {url} via Jina Reader...")
-                
-                response = await client.get(jina_url, headers=self.headers)
-                response.raise_for_status()
-                
-                content = response.text
-                
-                # Extract title from first H1 if present
-                title = url.split("/")[-1] or url
-                if content.startswith("# "):
-                    title = content.split("\n")[0].replace("# ", "").strip()
-                
-                logger.info(f"✅ Scraped {len(content)} characters from {url}")
-                
-                return {
-                    "content": content,
-                    "title": title,
-                    "url": url,
-                    "source": "website"
-                }
-                
+            jina_url = f"{self.BASE_URL}/{url}"
+            client = self._client(jina_url)
+            logger.info(f"🕷️  Scraping {url} via Jina Reader...")
+            
+            headers = dict(self.headers)
+            if ledger is not None:
+                headers.update(ledger.conditional_headers(url))
+            response = await client.get(jina_url, headers=headers, timeout=timeout)
+            if response.status_code == 304 and ledger is not None:
+                ledger.not_modified(url)
+                logger.info(f"⏭️  {url} not modified since last crawl")
+                return None
+            response.raise_for_status()
+            
+            content = response.text
+            if self._unchanged(ledger, url, response, content):
+                logger.info(f"⏭️  {url} content unchanged since last crawl")
+                return None
+            
+            # Extract title from first H1 if present
+            title = url.split("/")[-1] or url
+            if content.startswith("# "):
+                title = content.split("\n")[0].replace("# ", "").strip()
+            
+            logger.info(f"✅ Scraped {len(content)} characters from {url}")
+            
+            return {
+                "content": content,
+                "title": title,
+                "url": url,
+                "source": "website"
+            }
+            
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 402:
                 logger.warning(f"⚠️  Jina API quota exceeded, falling back to basic HTTP scraper")
-                return await self._fallback_scrape(url, timeout)
+                return await self._fallback_scrape(url, timeout, ledger)
             else:
                 logger.error(f"❌ Failed to scrape {url}: {e}")
                 raise
@@ -75,54 +101,63 @@ class JinaScraper:
             logger.error(f"❌ Failed to scrape {url}: {e}")
             raise
     
-    async def _fallback_scrape(self, url: str, timeout: int = 30) -> Dict[str, str]:
+    async def _fallback_scrape(self, url: str, timeout: int = 30,
+                               ledger: Optional[LedgerSession] = None) -> Optional[Dict[str, str]]:
         """Fallback scraper using basic HTTP when Jina fails."""
         try:
-            async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
-                logger.info(f"📄 Using basic HTTP scraper for {url}...")
-                response = await client.get(url)
-                response.raise_for_status()
-                
-                content = response.text
-                
-                # Basic title extraction
-                title = url.split("/")[-1] or "Document"
-                if "<title>" in content:
-                    start = content.find("<title>") + 7
-                    end = content.find("</title>", start)
-                    if end > start:
-                        title = content[start:end].strip()
-                
-                logger.info(f"✅ Fetched {len(content)} characters (basic HTTP)")
-                
-                return {
-                    "content": content,
-                    "title": title,
-                    "url": url,
-                    "source": "website"
-                }
+            client = self._client(url)
+            logger.info(f"📄 Using basic HTTP scraper for {url}...")
+            headers = ledger.conditional_headers(url) if ledger is not None else {}
+            response = await client.get(url, headers=headers, timeout=timeout, follow_redirects=True)
+            if response.status_code == 304 and ledger is not None:
+                ledger.not_modified(url)
+                return None
+            response.raise_for_status()
+            
+            content = response.text
+            if self._unchanged(ledger, url, response, content):
+                return None
+            
+            # Basic title extraction
+            title = url.split("/")[-1] or "Document"
+            if "<title>" in content:
+                start = content.find("<title>") + 7
+                end = content.find("</title>", start)
+                if end > start:
+                    title = content[start:end].strip()
+            
+            logger.info(f"✅ Fetched {len(content)} characters (basic HTTP)")
+            
+            return {
+                "content": content,
+                "title": title,
+                "url": url,
+                "source": "website"
+            }
         except Exception as e:
             logger.error(f"❌ Fallback scraper failed: {e}")
             raise
 
     
-    async def scrape_multiple(self, urls: list[str]) -> list[Dict[str, str]]:
+    async def scrape_multiple(self, urls: list[str],
+                              ledger: Optional[LedgerSession] = None) -> list[Dict[str, str]]:
         """
         Scrape multiple URLs concurrently.
         
         Args:
             urls: List of URLs to scrape
+            ledger: Fingerprints from a previous crawl; unchanged pages are skipped
             
         Returns:
-            List of scraping results
+            List of scraping results (changed pages only when a ledger is given)
         """
         import asyncio
         
-        tasks = [self.scrape(url) for url in urls]
+        tasks = [self.scrape(url, ledger=ledger) for url in urls]
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
-        # Filter out errors
-        successful = [r for r in results if not isinstance(r, Exception)]
+        # Filter out errors and unchanged pages
+        successful = [r for r in results if r is not None and not isinstance(r, Exception)]
         failed = [r for r in results if isinstance(r, Exception)]
         
         if failed:
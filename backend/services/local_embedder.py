@@ -1,12 +1,15 @@
 """
-Local embeddings using sentence-transformers.
+Local embeddings using sentence-transformers, on torch or ONNX Runtime.
 
 Completely free and reliable - no API needed.
 """
 
-from typing import List, Union
+from typing import List, Optional, Union
+import importlib.util
 import logging
-import asyncio
+import os
+
+from ..embeddings.embedding_server import EmbeddingServer, embedding_model_id, get_embedding_server
 
 logger = logging.getLogger(__name__)
 
@@ -16,17 +19,20 @@ class LocalEmbedder:
     
     MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
     
-    def __init__(self):
-        logger.info("🔄 Loading local sentence-transformers model...")
-        try:
-            from sentence_transformers import SentenceTransformer
-            self.model = SentenceTransformer(self.MODEL_NAME, device='cpu')
-            logger.info("✅ Local embedder ready (384 dimensions)")
-        except ImportError:
-            raise ImportError("sentence-transformers not installed. Run: pip install sentence-transformers")
-        except Exception as e:
-            logger.error(f"❌ Failed to load model: {e}")
-            raise
+    def __init__(self, server: Optional[EmbeddingServer] = None, backend: Optional[str] = None):
+        # "torch" (sentence-transformers), "onnx" or "onnx-int8"; EMBED_BACKEND by default
+        backend = server.backend if server else backend or os.getenv("EMBED_BACKEND", "torch")
+        required = "sentence_transformers" if backend == "torch" else "onnxruntime"
+        if importlib.util.find_spec(required) is None:
+            raise ImportError(f"{required} not installed for the {backend} backend. "
+                              f"Run: pip install {required.replace('_', '-')}")
+        # The model lives in the shared server's worker processes, loaded once per process
+        self.server = server or get_embedding_server(self.MODEL_NAME, backend)
+        self.backend = backend
+        self.model_name = self.MODEL_NAME
+        # Cached vectors are only shared between callers on the same backend
+        self.model_id = embedding_model_id(self.MODEL_NAME, backend)
+        logger.info("✅ Local embedder ready (384 dimensions)")
     
     async def embed(
         self, 
@@ -38,7 +44,7 @@ class LocalEmbedder:
         
         Args:
             texts: Single text string or list of texts
-            batch_size: Not used for local (can process all at once)
+            batch_size: Not used; the server sizes micro-batches
             
         Returns:
             List of embedding vectors (384-dimensional)
@@ -49,12 +55,8 @@ class LocalEmbedder:
         logger.info(f"🔮 Generating embeddings for {len(texts)} texts locally...")
         
         try:
-            # Run in thread pool to avoid blocking async loop
-            loop = asyncio.get_event_loop()
-            embeddings = await loop.run_in_executor(
-                None,
-                lambda: self.model.encode(texts, convert_to_numpy=True, show_progress_bar=False).tolist()
-            )
+            # Coalesced with concurrent callers into micro-batches on the worker pool
+            embeddings = await self.server.embed(texts)
             
             logger.info(f"✅ Generated {len(embeddings)} embeddings")
             return embeddings
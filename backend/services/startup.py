@@ -0,0 +1,86 @@
+"""
+Startup profile: fast boot, background warm-up, readiness.
+
+The app starts serving as soon as routers are imported; heavy work runs in
+a warm-up task started by the lifespan:
+
+- index:    map the persisted vector store segments
+- embedder: load the token counter and run one embedding, which starts the
+            embedding server's workers when a local model is used
+- crawler:  import bs4 and Playwright, which `crawler.py` imports lazily
+
+`/health` answers immediately; `/ready` reports each component's status
+and how long it took, along with the import and lifespan times.
+"""
+
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import importlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """Status and timing of each warm-up component"""
+
+    def __init__(self, import_seconds: Optional[float] = None):
+        self.components: Dict[str, Dict] = {}
+        self.timings: Dict[str, float] = {}
+        if import_seconds is not None:
+            self.timings["import_seconds"] = round(import_seconds, 3)
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.components) and all(c["status"] == "ready" for c in self.components.values())
+
+    def expect(self, *names: str):
+        for name in names:
+            self.components.setdefault(name, {"status": "pending"})
+
+    async def run(self, name: str, warm: Callable[[], Awaitable]):
+        """Warm one component, recording its status and duration; failures don't stop the others"""
+        self.components[name] = {"status": "warming"}
+        started = time.perf_counter()
+        try:
+            await warm()
+            status = {"status": "ready"}
+        except Exception as e:
+            logger.error(f"❌ Warm-up of {name} failed: {e}", exc_info=True)
+            status = {"status": "failed", "error": str(e)}
+        status["seconds"] = round(time.perf_counter() - started, 3)
+        self.components[name] = status
+        logger.info(f"🔥 Warm-up {name}: {status['status']} in {status['seconds']}s")
+
+    def report(self) -> Dict:
+        return {"ready": self.ready, "components": self.components, "timings": self.timings}
+
+
+async def _import_modules(*modules: str):
+    # Imports hold the GIL but not the event loop when run in a thread
+    for module in modules:
+        await asyncio.to_thread(importlib.import_module, module)
+
+
+async def warm_up(readiness: Readiness, vector_store, embedder):
+    """Warm the index, the embedder and the crawler's dependencies concurrently"""
+    started = time.perf_counter()
+    readiness.expect("index", "embedder", "crawler")
+
+    async def index():
+        # Ingestion waits on the same one-time load, so it never races with it
+        await asyncio.to_thread(vector_store.ensure_loaded)
+
+    async def embed():
+        from ..processors.tokenizer import get_token_counter
+        await asyncio.to_thread(get_token_counter, embedder.model_name)
+        await embedder.embed_texts(["warm-up"])
+
+    await asyncio.gather(
+        readiness.run("index", index),
+        readiness.run("embedder", embed),
+        readiness.run("crawler", lambda: _import_modules("bs4", "playwright.async_api")),
+    )
+    readiness.timings["warm_up_seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"✅ Warm-up finished in {readiness.timings['warm_up_seconds']}s (ready={readiness.ready})")
@@ -1,11 +1,28 @@
+import io
+from types import SimpleNamespace
 import pytest
 import asyncio
 import os
-from backend.crawler.crawler import Crawler
+import numpy as np
+from backend.crawler.crawler import BrowserPagePool, Crawler
+from backend.crawler.ledger import CrawlLedger
+from backend.github.api_client import ETagCache, GitHubAPIClient, RateLimitError
+from backend.github.fetcher import GitHubFetcher, read_tar
+from backend.github.local_repo import LocalRepoSource
 from backend.processors.chunker import Chunker
+from backend.processors.tokenizer import ApproxTokenCounter, get_token_counter, token_budget
+from backend.processors.dedup import Deduplicator, MinHasher, content_key
+from backend.processors.pipeline import IngestionPipeline
 from backend.embeddings.embedder import Embedder
+from backend.embeddings.embedding_cache import CachedEmbedder, EmbeddingCache, text_key
+from backend.embeddings.embedding_server import EmbeddingServer, close_embedding_servers, get_embedding_server, load_model
 from backend.embeddings.vector_store import VectorStore
+from backend.embeddings.ann_index import FlatIndex, IVFIndex, normalize_rows
 from backend.rag.generator import Generator
+from backend.jobs.queue import InMemoryJobBackend, JobQueue, QueueFullError
+from backend.rag.retriever import Retriever
+from backend.services.embedding_batcher import RemoteEmbeddingBatcher
+from backend.services.http_clients import HTTPClientRegistry, get_http_clients
 
 # 1. Test Crawler
 @pytest.mark.asyncio
@@ -81,3 +98,1264 @@ async def test_generator():
     assert len(response) > 0
     assert "AutoDoc AI" in response
     print(f"✅ Generator working! Response: {response[:50]}...")
+
+# 6. Test Vector Store ranking
+def test_vector_store_top_k():
+    print("\n📐 Testing Vector Store ranking...")
+    store = VectorStore()
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 384)).astype(np.float32)
+    store.add_chunks([
+        {
+            "content": f"ranked chunk {i}",
+            "metadata": {"url": f"url-{i}", "source": "test", "job_id": "rank-job"},
+            "vector": vectors[i].tolist()
+        }
+        for i in range(50)
+    ])
+
+    query = vectors[7] + 0.01 * vectors[3]
+    results = store.search_by_vector(query.tolist(), limit=3, job_id="rank-job")
+
+    assert len(results) == 3
+    assert results[0].properties["content"] == "ranked chunk 7"
+    assert results[0].similarity >= results[1].similarity >= results[2].similarity
+    print("✅ Vector Store ranking working!")
+
+# 7. Test Vector Store job partitions
+def test_vector_store_partitions():
+    print("\n🗂️ Testing Vector Store job partitions...")
+    store = VectorStore()
+    for job in ("part-a", "part-b"):
+        store.add_chunks([
+            {
+                "content": f"{job} chunk {i}",
+                "metadata": {"url": f"{job}-{i}", "source": "test", "job_id": job},
+                "vector": [float(i + 1)] * 8
+            }
+            for i in range(3)
+        ])
+
+    assert store.count("part-a") == 3
+    assert all(r["job_id"] == "part-b" for r in store.sample(job_id="part-b"))
+    results = store.search_by_vector([1.0] * 8, limit=10, job_id="part-a")
+    assert {r.properties["job_id"] for r in results} == {"part-a"}
+
+    assert store.delete_job("part-a") == 3
+    assert store.count("part-a") == 0
+    assert store.search_by_vector([1.0] * 8, job_id="part-a") == []
+    store.delete_job("part-b")
+    print("✅ Vector Store partitions working!")
+
+# 8. Test IVF approximate index
+def test_ivf_index_recall():
+    print("\n🧭 Testing IVF index...")
+    rng = np.random.default_rng(1)
+    centers = normalize_rows(rng.normal(size=(20, 64)))
+    vectors = normalize_rows(np.repeat(centers, 100, axis=0) + 0.1 * rng.normal(size=(2000, 64)))
+    index = IVFIndex(nprobe=4).train(vectors)
+
+    hits = 0
+    for q in vectors[::50]:
+        exact, _ = FlatIndex().search(vectors, q, 10)
+        approx, _ = index.search(vectors, q, 10)
+        hits += len(set(exact) & set(approx))
+    recall = hits / (10 * len(vectors[::50]))
+
+    assert recall > 0.9
+    rows, _ = index.search(vectors, vectors[0], 10, nprobe=len(index.centroids))
+    assert rows[0] == 0
+    print(f"✅ IVF index working! recall@10={recall:.2f}")
+
+# 9. Test Vector Store persistence
+def test_vector_store_persistence(tmp_path, monkeypatch):
+    print("\n💽 Testing Vector Store persistence...")
+    store = VectorStore()
+    monkeypatch.setattr(VectorStore, "storage_path", str(tmp_path))
+    store.add_chunks([
+        {
+            "content": f"persisted chunk {i} ✓",
+            "metadata": {"url": f"url-{i % 2}", "source": "test", "job_id": "persist-job"},
+            "vector": [float(i == j) for j in range(16)]
+        }
+        for i in range(16)
+    ])
+    assert store.save(job_ids=["persist-job"]) == 1
+
+    # Simulate a restart: drop the in-memory partition and map it back
+    monkeypatch.setattr(VectorStore, "_partitions", type(VectorStore._partitions)())
+    assert store.load() == 16
+    assert isinstance(VectorStore._partitions["persist-job"].vectors, np.memmap)
+
+    results = store.search_by_vector([float(j == 5) for j in range(16)], limit=1, job_id="persist-job")
+    assert results[0].properties == {
+        "content": "persisted chunk 5 ✓", "url": "url-1", "source": "test", "job_id": "persist-job"
+    }
+
+    # Appending to a mapped segment copies it back to the heap
+    store.add_chunks([{"content": "new", "metadata": {"job_id": "persist-job"}, "vector": [1.0] * 16}])
+    assert store.count("persist-job") == 17
+
+    # Every URL's reference to a shared row survives a restart
+    monkeypatch.setattr(VectorStore, "content_pool", type(VectorStore.content_pool)())
+    store.add_chunks([
+        {"content": "shared footer", "metadata": {"url": url, "job_id": "persist-shared", "content_key": "footer"},
+         "vector": [1.0] * 16}
+        for url in ("page-a", "page-b")
+    ])
+    assert store.count("persist-shared") == 1 and store.save(job_ids=["persist-shared"]) == 1
+    VectorStore.content_pool.clear()
+    monkeypatch.setattr(VectorStore, "_partitions", type(VectorStore._partitions)())
+    store.load()
+    assert store.content_pool.references("persist-shared", "footer") == 2
+    assert store.delete_urls("persist-shared", ["page-a"]) == 0 and store.count("persist-shared") == 1
+    assert store.delete_urls("persist-shared", ["page-b"]) == 1
+
+    # The startup load runs once, so later callers (ingestion) can't clobber newer writes
+    monkeypatch.setattr(VectorStore, "_loaded_paths", set())
+    assert store.ensure_loaded() == 16
+    store.add_chunks([{"content": "newer", "metadata": {"job_id": "persist-job"}, "vector": [1.0] * 16}])
+    assert store.ensure_loaded() == 0 and store.count("persist-job") == 17
+    print("✅ Vector Store persistence working!")
+
+# 10. Test batched vector search
+@pytest.mark.asyncio
+async def test_batched_search():
+    print("\n📚 Testing batched search...")
+    store = VectorStore()
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(40, 384)).astype(np.float32)
+    store.add_chunks([
+        {
+            "content": f"batch chunk {i}",
+            "metadata": {"url": f"url-{i}", "source": "test", "job_id": "batch-job"},
+            "vector": vectors[i].tolist()
+        }
+        for i in range(40)
+    ])
+
+    queries = vectors[[4, 9, 30]]
+    batched = store.search_by_vectors(queries, limit=3, job_id="batch-job")
+    assert len(batched) == 3
+    for query, hits in zip(queries, batched):
+        single = store.search_by_vector(query.tolist(), limit=3, job_id="batch-job")
+        assert [h.properties["content"] for h in hits] == [h.properties["content"] for h in single]
+    assert batched[1][0].properties["content"] == "batch chunk 9"
+
+    contexts = await Retriever().retrieve_many(["first", "second"], job_id="batch-job", limit=2)
+    assert [len(c) for c in contexts] == [2, 2]
+    print("✅ Batched search working!")
+
+# 11. Test streaming generation events
+@pytest.mark.asyncio
+async def test_generate_stream_events():
+    print("\n📡 Testing streaming generation...")
+    from backend.routes.generate import stream_generation
+
+    class FakeGenerator:
+        async def generate_stream(self, prompt, context):
+            for token in ["Auto", "Doc", "\n"]:
+                yield token
+
+    context = [{"url": "u", "content": "c", "source": "test"}]
+    events = [e async for e in stream_generation(FakeGenerator(), "prompt", context)]
+
+    assert events[0].startswith("event: sources\n")
+    assert events[1:4] == ['event: token\ndata: "Auto"\n\n', 'event: token\ndata: "Doc"\n\n', 'event: token\ndata: "\\n"\n\n']
+    assert events[-1] == "event: done\ndata: {}\n\n"
+    print("✅ Streaming generation working!")
+
+# 12. Test shared HTTP client registry
+@pytest.mark.asyncio
+async def test_http_client_registry():
+    print("\n🔌 Testing HTTP client registry...")
+    registry = HTTPClientRegistry(http2=False)
+    first = registry.get("https://api.github.com/repos/a/b")
+    assert registry.get("https://api.github.com/repos/c/d") is first
+    assert registry.get("https://api.jina.ai/v1/embeddings") is not first
+    assert registry.stats()["hits"] == 1 and registry.stats()["misses"] == 2
+
+    await registry.aclose()
+    assert first.is_closed
+    assert get_http_clients() is get_http_clients()
+    print("✅ HTTP client registry working!")
+
+# 13. Test embedding cache
+@pytest.mark.asyncio
+async def test_embedding_cache(tmp_path):
+    print("\n🗃️ Testing embedding cache...")
+
+    class CountingEmbedder:
+        model_id = "counting"
+
+        def __init__(self):
+            self.seen = []
+
+        async def embed_texts(self, texts):
+            self.seen.extend(texts)
+            return [[float(len(t)), 1.0] for t in texts]
+
+    backend = CountingEmbedder()
+    path = str(tmp_path / "cache.sqlite")
+    embedder = CachedEmbedder(backend, cache=EmbeddingCache(max_entries=2, path=path))
+
+    first = await embedder.embed_texts(["a", "bb", "a"])
+    assert first == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert backend.seen == ["a", "bb"]
+
+    # Only the new text reaches the backend
+    await embedder.embed_texts(["bb", "ccc"])
+    assert backend.seen == ["a", "bb", "ccc"]
+
+    # A fresh process reads evicted/unseen entries back from disk
+    restarted = CachedEmbedder(backend, cache=EmbeddingCache(max_entries=2, path=path))
+    assert await restarted.embed_texts(["a"]) == [[1.0, 1.0]]
+    assert backend.seen == ["a", "bb", "ccc"]
+    assert restarted.cache.stats()["disk_hits"] == 1
+
+    # Mock vectors from a failed model are served but never cached
+    class FailingModelEmbedder(Embedder):
+        def __init__(self):
+            super().__init__()
+            self.model_id = "failing"
+            self.server = SimpleNamespace(embed=self.fail)
+
+        async def fail(self, texts):
+            raise RuntimeError("worker crashed")
+
+    failing = CachedEmbedder(FailingModelEmbedder(), cache=EmbeddingCache(path=path))
+    assert await failing.embed_texts(["dddd"]) == [[0.1] * 384]
+    assert failing.cache.get_many([text_key("failing", "dddd")]) == [None]
+    print("✅ Embedding cache working!")
+
+# 14. Test ingestion job queue
+@pytest.mark.asyncio
+async def test_job_queue():
+    print("\n📥 Testing job queue...")
+    queue = JobQueue(InMemoryJobBackend(max_size=1), workers=1)
+    seen = []
+
+    async def handler(job_id, payload, progress):
+        await progress.stage("crawl", "completed", done=2, total=2)
+        seen.append(payload["url"])
+        if payload["url"] == "bad":
+            raise RuntimeError("boom")
+
+    await queue.submit("job-ok", {"url": "good"})
+    with pytest.raises(QueueFullError):
+        await queue.submit("job-overflow", {"url": "late"})
+
+    async def wait_for(job_id, status):
+        for _ in range(100):
+            if (await queue.get(job_id))["status"] == status:
+                return
+            await asyncio.sleep(0.01)
+
+    queue.start(handler)
+    await wait_for("job-ok", "completed")
+    await queue.submit("job-bad", {"url": "bad"})
+    await wait_for("job-bad", "failed")
+    await queue.stop()
+
+    # Concurrent stage updates all land; resubmitting an active job doesn't queue it twice
+    await asyncio.gather(*(queue.update_stage("job-ok", f"stage-{i}", done=i) for i in range(10)))
+    stages = (await queue.get("job-ok"))["metadata"]["stages"]
+    assert all(f"stage-{i}" in stages for i in range(10))
+    coalescing = JobQueue(InMemoryJobBackend(max_size=5), workers=1)
+    first = await coalescing.submit("job-again", {"url": "a"})
+    assert await coalescing.submit("job-again", {"url": "a"}) is first
+    assert await coalescing.backend.depth() == 1
+
+    ok = await queue.get("job-ok")
+    assert ok["status"] == "completed" and ok["completed_at"]
+    assert ok["metadata"]["stages"]["crawl"]["done"] == 2
+    assert (await queue.get("job-bad"))["metadata"]["error"] == "boom"
+    assert seen == ["good", "bad"]
+    print("✅ Job queue working!")
+
+# 15. Test streaming ingestion pipeline
+@pytest.mark.asyncio
+async def test_ingestion_pipeline():
+    print("\n🏭 Testing ingestion pipeline...")
+
+    async def pages():
+        for i in range(5):
+            yield {"url": f"https://docs.test/{i}", "content": f"Page {i}\n" + "words " * 400, "source": "website"}
+
+    async def broken():
+        yield {"url": "https://github.com/a/b", "content": "README", "source": "github"}
+        raise RuntimeError("rate limited")
+
+    class Progress:
+        def __init__(self):
+            self.stages = {}
+
+        async def stage(self, name, status="processing", **counts):
+            self.stages[name] = status
+
+    store = VectorStore()
+    progress = Progress()
+    pipeline = IngestionPipeline(
+        "pipeline-job", Chunker(), Embedder(), store, progress,
+        queue_size=2, chunk_workers=2, embed_workers=2, embed_batch_size=4
+    )
+    counts = await pipeline.run({"crawl": pages(), "fetch": broken()})
+
+    assert counts["documents"] == 6
+    # The pages share their "words words ..." chunks, which are embedded and stored once
+    assert counts["stored"] == store.count("pipeline-job") < counts["chunks"]
+    assert counts["embedded"] + counts["deduplicated"] == counts["chunks"]
+    assert counts["failed_sources"] == 1
+    assert progress.stages == {"crawl": "completed", "fetch": "failed", "chunk": "completed",
+                               "embed": "completed", "store": "completed"}
+    store.delete_job("pipeline-job")
+    print("✅ Ingestion pipeline working!")
+
+# 16. Test HTTP-first hybrid crawl
+@pytest.mark.asyncio
+async def test_hybrid_static_crawl(monkeypatch):
+    print("\n🕸️ Testing hybrid HTTP-first crawl...")
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    body = "<p>" + "Static documentation text. " * 20 + "</p>"
+    site = {
+        "/": f"<html><head><title>Home</title></head><body>{body}<a href='/guide'>Guide</a><a href='/api#x'>API</a></body></html>",
+        "/guide": f"<html><body>{body}<a href='/'>Home</a></body></html>",
+        "/api": f"<html><body>{body}<script>var x = 1;</script></body></html>",
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            page = site.get(self.path)
+            self.send_response(200 if page else 403 if self.path == "/blocked" else 404)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.end_headers()
+            self.wfile.write((page or "").encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        crawler = Crawler(f"http://127.0.0.1:{server.server_port}/", max_depth=2, max_pages=10, mode="hybrid")
+        pages = [page async for page in crawler.iter_pages()]
+
+        # A page refused over HTTP (403 to a non-browser agent) is retried in the browser
+        async def render(pool, url, links=True):
+            return f"<html><body>{body}</body></html>", "Rendered", []
+
+        monkeypatch.setattr(BrowserPagePool, "fetch", render)
+        blocked = Crawler(f"http://127.0.0.1:{server.server_port}/blocked", mode="hybrid")
+        rendered = [page async for page in blocked.iter_pages()]
+        assert [p["title"] for p in rendered] == ["Rendered"] and blocked.stats["browser"] == 1
+
+        # Missing pages are not
+        missing = Crawler(f"http://127.0.0.1:{server.server_port}/missing", mode="hybrid")
+        assert [page async for page in missing.iter_pages()] == [] and missing.stats["browser"] == 0
+    finally:
+        server.shutdown()
+
+    assert sorted(p["url"].rsplit("/", 1)[1] for p in pages) == ["", "api", "guide"]
+    assert crawler.stats == {"http": 3, "browser": 0, "unchanged": 0}
+    assert all("Static documentation" in p["content"] and "var x" not in p["content"] for p in pages)
+
+    # Client-rendered shells are detected so they can be escalated to the browser
+    from bs4 import BeautifulSoup
+    shell = BeautifulSoup("<html><body><div id='root'></div><script src='app.js'></script></body></html>", "html.parser")
+    assert crawler.looks_js_rendered(shell, shell.get_text(strip=True))
+    static = BeautifulSoup(site["/guide"], "html.parser")
+    assert not crawler.looks_js_rendered(static, static.get_text(strip=True))
+    print("✅ Hybrid crawl working!")
+
+# 17. Test incremental re-crawl
+@pytest.mark.asyncio
+async def test_incremental_recrawl():
+    print("\n📒 Testing incremental re-crawl...")
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    body = "<p>" + "Versioned documentation text. " * 20 + "</p>"
+    site = {
+        "/": f"<html><body>{body}<a href='/guide'>Guide</a><a href='/api'>API</a></body></html>",
+        "/guide": f"<html><body>{body} v1</body></html>",
+        "/api": f"<html><body>{body}</body></html>",
+    }
+    fetches = []
+    etags = {"/": '"home-1"'}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            fetches.append(self.path)
+            if self.path == "/" and self.headers.get("If-None-Match") == etags["/"]:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            if self.path == "/":
+                self.send_header("ETag", etags["/"])
+            self.end_headers()
+            self.wfile.write(site[self.path].encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    root = f"http://127.0.0.1:{server.server_port}/"
+    ledger = CrawlLedger()
+    store = VectorStore()
+    store.delete_job("recrawl-job")
+
+    async def ingest():
+        session = ledger.session("recrawl-job")
+        crawler = Crawler(root, max_depth=1, max_pages=10, mode="hybrid", ledger=session)
+        pipeline = IngestionPipeline("recrawl-job", Chunker(), Embedder(), store)
+        await pipeline.run({"crawl": crawler.iter_pages()})
+        stale = crawler.stale_urls()
+        store.delete_urls("recrawl-job", stale)
+        session.drop(stale)
+        session.commit()
+        return crawler
+
+    try:
+        first = await ingest()
+        before = store.count("recrawl-job")
+        site["/guide"] = site["/guide"].replace("v1", "v2")
+        second = await ingest()
+        after_second = store.count("recrawl-job")
+        guide = [r for r in store.sample("recrawl-job", limit=100) if r["url"] == root + "guide"]
+
+        # "/api" is no longer linked: its chunks and fingerprint go
+        etags["/"] = '"home-2"'
+        site["/"] = site["/"].replace("<a href='/api'>API</a>", "")
+        third = await ingest()
+    finally:
+        server.shutdown()
+
+    assert len(first.results) == 3 and first.stats["unchanged"] == 0
+    # "/" answers 304, "/api" has the same text; only "/guide" is re-chunked
+    assert [p["url"] for p in second.results] == [root + "guide"]
+    assert second.stats["unchanged"] == 2
+    assert after_second == before
+    assert guide and all("v2" in r["content"] for r in guide)
+
+    assert third.stale_urls() == {root + "api"}
+    assert {r["url"] for r in store.sample("recrawl-job", limit=100)} == {root, root + "guide"}
+    assert set(ledger.entries("recrawl-job")) == {root, root + "guide"}
+
+    # A changed page that now yields no chunks loses its old ones
+    async def emptied():
+        yield {"url": root + "guide", "content": "", "source": "website"}
+
+    await IngestionPipeline("recrawl-job", Chunker(), Embedder(), store).run({"crawl": emptied()})
+    assert {r["url"] for r in store.sample("recrawl-job", limit=100)} == {root}
+    store.delete_job("recrawl-job")
+    print("✅ Incremental re-crawl working!")
+
+# 18. Test bulk repository ingestion
+@pytest.mark.asyncio
+async def test_bulk_repo_fetch(tmp_path):
+    print("\n📦 Testing bulk repository fetch...")
+    import io
+    import subprocess
+    import tarfile
+
+    repo = tmp_path / "repo"
+    files = {
+        "README.md": "# Demo\nProject overview",
+        "docs/guide.md": "## Guide\nHow to use it",
+        "src/app.py": "def main():\n    return 1\n",
+        "node_modules/lib/index.js": "module.exports = {}",
+        "docs/huge.md": "x" * 5000,
+        "logo.png": "not text",
+    }
+    for path, content in files.items():
+        (repo / path).parent.mkdir(parents=True, exist_ok=True)
+        (repo / path).write_text(content)
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+    subprocess.run(git + ["init", "-q", str(repo)], check=True)
+    subprocess.run(git + ["-C", str(repo), "add", "."], check=True)
+    subprocess.run(git + ["-C", str(repo), "commit", "-q", "-m", "init"], check=True)
+    subprocess.run(["git", "clone", "-q", "--bare", str(repo), str(tmp_path / "bare.git")], check=True)
+
+    expected = ["README.md", "docs/guide.md", "src/app.py"]
+    for path in (repo, tmp_path / "bare.git"):
+        documents = [d async for d in LocalRepoSource(str(path), max_file_bytes=1000).iter_documents()]
+        assert [d["title"] for d in documents] == expected
+    docs_only = LocalRepoSource(str(repo), max_file_bytes=1000, include_source=False)
+    assert [d["title"] async for d in docs_only.iter_documents()] == expected[:2]
+
+    # Only the selected files are read, one per document yielded
+    source = LocalRepoSource(str(repo), max_file_bytes=1000)
+    reads = []
+    original_read = source._read_git
+
+    def counting_read(path):
+        reads.append(path)
+        return original_read(path)
+
+    source._read_git = counting_read
+    async for document in source.iter_documents(max_files=2):
+        assert reads[-1] == document["title"]
+    assert reads == expected[:2]
+
+    # GitHub tarballs wrap the tree in one top-level directory
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+        for path, content in files.items():
+            data = content.encode()
+            info = tarfile.TarInfo(f"owner-repo-abc123/{path}")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    archive.seek(0)
+    fetcher = GitHubFetcher("https://github.com/owner/repo", max_file_bytes=1000)
+    extracted = dict(read_tar(archive, fetcher._wanted, mode="r|gz", strip_root=True))
+    assert sorted(extracted) == expected and extracted["src/app.py"] == files["src/app.py"]
+
+    tree = [{"path": p, "size": len(c), "type": "blob"} for p, c in files.items()]
+    assert fetcher.select_paths(tree, max_files=2) == ["README.md", "docs/guide.md"]
+
+    # Stopping after the first file cancels the downloads still in flight
+    pending = []
+
+    async def fetch_tree():
+        return tree
+
+    async def fetch_raw(path):
+        if path != "README.md":
+            pending.append(asyncio.current_task())
+            await asyncio.sleep(3600)
+        return files[path]
+
+    fetcher.fetch_tree, fetcher.fetch_raw = fetch_tree, fetch_raw
+    streamed = fetcher.iter_documents()
+    assert (await streamed.__anext__())["title"] == "README.md"
+    await streamed.aclose()
+    assert len(pending) == 2 and all(task.cancelled() for task in pending)
+
+    # Repository files stream straight into the chunk -> embed -> store pipeline
+    store = VectorStore()
+    pipeline = IngestionPipeline("repo-job", Chunker(), Embedder(), store)
+    counts = await pipeline.run({"fetch": LocalRepoSource(str(repo), max_file_bytes=1000).iter_documents()})
+    assert counts["documents"] == 3 and store.count("repo-job") == counts["stored"]
+    store.delete_job("repo-job")
+    print("✅ Bulk repository fetch working!")
+
+# 19. Test rate-limit-aware GitHub requests
+@pytest.mark.asyncio
+async def test_github_rate_limits():
+    print("\n🐙 Testing GitHub rate limits and ETags...")
+    import json
+    import time
+    import httpx
+
+    calls = {"readme": 0, "flaky": 0, "in_flight": 0, "peak": 0}
+    commits = [{"sha": f"{i:040d}", "commit": {"message": f"Commit {i}", "author": {"date": "2024-01-01"}}}
+               for i in range(250)]
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls["in_flight"] += 1
+        calls["peak"] = max(calls["peak"], calls["in_flight"])
+        await asyncio.sleep(0.01)
+        calls["in_flight"] -= 1
+        path, params = request.url.path, request.url.params
+        if path.endswith("/README.md"):
+            calls["readme"] += 1
+            if request.headers.get("If-None-Match") == '"v1"':
+                return httpx.Response(304, headers={"X-RateLimit-Remaining": "4999"})
+            return httpx.Response(200, text="# Readme", headers={"ETag": '"v1"'})
+        if path.endswith("/flaky.md"):
+            calls["flaky"] += 1
+            if calls["flaky"] == 1:
+                return httpx.Response(429, headers={"Retry-After": "0"})
+            return httpx.Response(200, text="ok")
+        if path.endswith("/commits"):
+            page, size = int(params.get("page", "1")), int(params["per_page"])
+            link = f'<{request.url.copy_merge_params({"page": "3"})}>; rel="last"'
+            return httpx.Response(200, text=json.dumps(commits[(page - 1) * size:page * size]), headers={"Link": link})
+        if path.endswith(".md"):
+            return httpx.Response(200, text=path)
+        return httpx.Response(404)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    class Clients:
+        def get(self, url):
+            return client
+
+    fetcher = GitHubFetcher("https://github.com/owner/repo", http_clients=Clients())
+    fetcher.api = GitHubAPIClient(fetcher._client, concurrency=3, backoff_base=0.01, etag_cache=ETagCache())
+
+    assert await fetcher.fetch_raw("README.md") == "# Readme"
+    assert await fetcher.fetch_raw("README.md") == "# Readme"
+    assert calls["readme"] == 2 and fetcher.api.stats["not_modified"] == 1
+
+    # The ETag cache is bounded by body bytes, and skips bodies too large to keep
+    small = ETagCache(max_bytes=800)
+    for i in range(10):
+        small.put(("", f"u{i}"), "etag", b"x" * 100, {})
+    small.put(("", "huge"), "etag", b"x" * 200, {})
+    assert small.total_bytes <= 800 and len(small) == 8
+    assert small.get(("", "huge")) is None and small.get(("", "u9")) is not None
+
+    assert await fetcher.fetch_raw("flaky.md") == "ok"
+    assert fetcher.api.stats["retries"] == 1
+
+    docs = await asyncio.gather(*(fetcher.fetch_raw(f"docs/{i}.md") for i in range(12)))
+    assert all(docs) and calls["peak"] <= 3
+
+    history = await fetcher.fetch_commits(limit=250)
+    assert [c["sha"] for c in history] == [c["sha"] for c in commits]
+
+    # An exhausted quota is waited out before the next request
+    fetcher.api.remaining, fetcher.api.reset_at = 0, time.time() + 0.2
+    start = time.perf_counter()
+    await fetcher.fetch_raw("docs/late.md")
+    assert time.perf_counter() - start >= 0.15
+
+    # A reset further off than max_wait fails fast instead of spending a request
+    fetcher.api.remaining, fetcher.api.reset_at = 0, time.time() + 3600
+    sent = fetcher.api.stats["requests"]
+    with pytest.raises(RateLimitError):
+        await fetcher.fetch_raw("docs/later.md")
+    assert fetcher.api.stats["requests"] == sent
+    await client.aclose()
+    print("✅ GitHub rate limiting working!")
+
+# 20. Test structure-aware chunking
+def test_semantic_chunker():
+    print("\n🧩 Testing semantic chunker...")
+    body = "".join(f"        value = {i} * factor\n" for i in range(32))
+    source = (
+        "import os\n\nLIMIT = 3\n\n\n"
+        "def small():\n    return LIMIT\n\n\n"
+        "@decorator\ndef tiny():\n    pass\n\n\n"
+        "class Big:\n    \"\"\"A class too big for one chunk\"\"\"\n\n"
+        f"    def first(self, factor):\n{body}        return value\n\n"
+        f"    def second(self, factor):\n{body}        return value\n"
+    )
+    chunker = Chunker(chunk_size=1000, overlap=200, mode="semantic")
+    chunks = chunker.chunk_text(source, {"url": "https://github.com/o/r/blob/HEAD/app.py"})
+    symbols = [c["metadata"]["symbol"] for c in chunks]
+    # Small neighbours share a chunk; the big class is split per method
+    assert symbols == ["<module>, small, tiny, Big", "Big.first", "Big.second"]
+    assert chunks[0]["content"].startswith("import os") and "@decorator\ndef tiny" in chunks[0]["content"]
+    assert chunks[1]["content"].startswith("def first(self, factor):\n    value = 0")
+    assert all(c["metadata"]["url"].endswith("app.py") for c in chunks)
+
+    markdown = (
+        "Intro line\n\n# Guide\nStart here.\n\n## Install\n```bash\n# not a heading\npip install x\n```\n"
+        "## Usage\n" + "Use it well. " * 70 + "\n# API\n" + "Endpoint docs. " * 10
+    )
+    chunks = chunker.chunk_text(markdown, {"url": "https://docs.test/guide"})
+    headings = [c["metadata"].get("heading") for c in chunks]
+    assert headings == [None, "Guide > Usage", "API"]
+    assert "# not a heading\npip install x" in chunks[0]["content"]
+
+    # Records keep the section so answers can cite it
+    record = VectorStore._to_record({"content": "x", "metadata": {**chunks[1]["metadata"], "job_id": "j"}})
+    assert record["heading"] == "Guide > Usage"
+
+    fixed = Chunker(mode="fixed").chunk_text(source, {"url": "app.py"})
+    assert all("symbol" not in c["metadata"] for c in fixed)
+    print("✅ Semantic chunker working!")
+
+# 21. Test token-budgeted chunking
+def test_token_budget_chunker():
+    print("\n🔤 Testing token-budgeted chunking...")
+    counter = ApproxTokenCounter()
+    chunker = Chunker(max_tokens=50, token_overlap=5, token_counter=counter, mode="fixed")
+    text = "\n".join(f"Line {i} explains configuration_parameters in detail." for i in range(60))
+    chunks = chunker.chunk_text(text, {"url": "test"})
+    sizes = counter.count_many([c["content"] for c in chunks])
+    assert len(chunks) > 1 and max(sizes) <= 50
+    assert all(c["content"].endswith("in detail.") for c in chunks)  # Windows end on newlines
+
+    # Semantic units are packed and split by tokens too; one batch covers many documents
+    markdown = "# A\n" + "short words " * 10 + "\n# B\n" + "many more words here " * 40
+    semantic = Chunker(max_tokens=50, token_counter=counter)
+    batched = semantic.chunk_documents([(markdown, {"url": "a.md"}), ("", {}), (text, {"url": "t"})])
+    assert [len(b) for b in batched][1] == 0
+    assert batched[0][0]["metadata"]["heading"] == "A"
+    assert max(counter.count_many([c["content"] for b in batched for c in b])) <= 50
+
+    # Per-model budgets leave room for special tokens; counters are cached per model
+    assert token_budget("sentence-transformers/all-MiniLM-L6-v2") == 254
+    assert Chunker.for_model("sentence-transformers/all-MiniLM-L6-v2").max_tokens == 254
+    assert Chunker.for_model("mock").max_tokens is None
+    assert get_token_counter("all-MiniLM-L6-v2") is get_token_counter("all-MiniLM-L6-v2")
+
+    # Prompts keep the best-ranked chunks that fit the LLM context window
+    generator = Generator()
+    generator.context_tokens, generator.answer_tokens = 600, 100
+    context = [{"url": f"u{i}", "content": "word " * 150} for i in range(5)]
+    assert len(generator._fit_context("Write docs", context)) == 2
+
+    # The streaming endpoint's prompt is fitted too
+    import json
+    import httpx
+    prompts = []
+
+    def ollama(request):
+        prompts.append(json.loads(request.content)["prompt"])
+        return httpx.Response(200, text='{"response": "Docs", "done": true}\n')
+
+    generator._client = lambda: httpx.AsyncClient(transport=httpx.MockTransport(ollama))
+
+    async def stream():
+        return [token async for token in generator.generate_stream("Write docs", context)]
+
+    assert asyncio.run(stream()) == ["Docs"]
+    assert "Source: u1" in prompts[0] and "Source: u2" not in prompts[0]
+    print("✅ Token-budgeted chunking working!")
+
+# 22. Test streaming chunk views
+@pytest.mark.asyncio
+async def test_streaming_chunks(tmp_path):
+    print("\n🌊 Testing streaming chunk views...")
+    chunker = Chunker(chunk_size=200, overlap=40, mode="fixed")
+    text = "\n\n".join(f"Paragraph {i} " + "about streaming " * (i % 7 + 3) for i in range(400))
+
+    # Views are offsets into the source; content is only sliced when read
+    views = list(chunker.iter_chunks(text, {"url": "big"}))
+    assert [v.content for v in views] == [c["content"] for c in chunker.chunk_text(text, {"url": "big"})]
+    assert all(text[v.span[0]:v.span[1]] == v.content for v in views)
+    assert views[0].metadata is views[-1].metadata
+
+    # Streams are cut into blocks at paragraph breaks; spans stay absolute
+    streamed = list(chunker.iter_stream_chunks(io.StringIO(text), {"url": "big"}, block_size=2000))
+    assert all(text[v.span[0]:v.span[1]] == v.content for v in streamed)
+    assert "".join(v.content for v in streamed).replace("\n", "").count("Paragraph") >= 400
+    assert max(len(v.content) for v in streamed) <= 200
+    pieces = (text[i:i + 333] for i in range(0, len(text), 333))
+    assert [v.span for v in chunker.iter_stream_chunks(pieces, {}, block_size=2000)] == [v.span for v in streamed]
+
+    # Pieces of an oversized indented method are dedented on read, but their spans still map to the source
+    body = "".join(f"        total += compute_value_{i}(argument)\n" for i in range(40))
+    source = f"class Service:\n    def handle(self, argument):\n        total = 0\n{body}        return total\n"
+    semantic = Chunker(chunk_size=300, overlap=60, mode="semantic")
+    pieces_of_method = list(semantic.iter_chunks(source, {"url": "service.py"}))
+    assert len(pieces_of_method) > 2 and all(v.dedent == "    " for v in pieces_of_method[1:])
+    assert all(source[v.span[0]:v.span[1]].replace("\n    ", "\n").strip() == v.content for v in pieces_of_method[1:])
+    assert not any(line.startswith(" " * 8) for v in pieces_of_method for line in v.content.splitlines())
+
+    path = tmp_path / "big.txt"
+    path.write_text(text)
+    from_file = chunker.iter_file_chunks(str(path), {"url": "big"}, block_size=2000)
+    assert [v.content for v in from_file] == [v.content for v in streamed]
+
+    # The pipeline streams documents given as a path or over the size threshold
+    store = VectorStore()
+
+    async def documents():
+        yield {"url": "file://big.txt", "path": str(path), "source": "github"}
+        yield {"url": "https://docs.test/huge", "content": text, "source": "website"}
+        yield {"url": "https://docs.test/small", "content": "A small page.", "source": "website"}
+
+    pipeline = IngestionPipeline("stream-job", chunker, Embedder(), store,
+                                 embed_batch_size=8, stream_threshold=10_000)
+    counts = await pipeline.run({"docs": documents()})
+    assert counts["chunks"] == 2 * len(streamed) + 1
+    assert counts["stored"] == len(streamed) + 1 == store.count("stream-job")  # The file and text are duplicates
+    store.delete_job("stream-job")
+    print("✅ Streaming chunk views working!")
+
+# 23. Test cross-job deduplication
+@pytest.mark.asyncio
+async def test_cross_job_dedup():
+    print("\n🧬 Testing cross-job deduplication...")
+    hasher = MinHasher()
+    license_text = " ".join(f"clause{i} permits use copy modify merge publish" for i in range(30))
+    edited = license_text.replace("clause7 permits", "clause7 allows")
+    assert hasher.similarity(hasher.signature(license_text), hasher.signature(edited)) > 0.85
+    assert hasher.similarity(hasher.signature(license_text), hasher.signature("unrelated words " * 40)) < 0.2
+    assert content_key("Hello   World") == content_key("hello world")
+
+    class CountingEmbedder(Embedder):
+        calls = 0
+
+        async def embed_texts(self, texts):
+            CountingEmbedder.calls += len(texts)
+            return await super().embed_texts(texts)
+
+    store = VectorStore()
+    chunker = Chunker(chunk_size=2000, overlap=0, mode="fixed")
+
+    async def pages(site, license_body):
+        yield {"url": f"{site}/license", "content": license_body, "source": "website"}
+        yield {"url": f"{site}/footer", "content": license_text, "source": "website"}
+        yield {"url": f"{site}/own", "content": f"Only on {site}: " + "unique words " * 20, "source": "website"}
+
+    embedder = CountingEmbedder()
+    await IngestionPipeline("dedup-a", chunker, embedder, store).run({"crawl": pages("https://a.test", license_text)})
+    assert CountingEmbedder.calls == 2 and store.count("dedup-a") == 2
+
+    # In another job the exact license shares the stored row; the edited one reuses only the vector
+    counts = await IngestionPipeline("dedup-b", chunker, embedder, store).run({"crawl": pages("https://b.test", edited)})
+    assert CountingEmbedder.calls == 3 and counts["deduplicated"] == 2
+    assert store.count("dedup-b") == 3
+    key = content_key(license_text)
+    assert store.content_pool.jobs(key) == {"dedup-a", "dedup-b"}
+    assert store.content_pool.references("dedup-b", key) == 1
+    rows = {r["url"]: r["content"] for r in store.sample("dedup-b", limit=10)}
+    assert rows["https://b.test/license"] == edited and rows["https://b.test/footer"] == license_text
+    # The near duplicate is pooled with its signature, so its own near duplicates match it
+    assert store.content_pool.match(content_key(edited + "!"), hasher.signature(edited), 1.0)["key"] == content_key(edited)
+
+    # Deleting URLs drops their rows; deleting a job leaves rows shared with other jobs intact
+    assert store.delete_urls("dedup-b", ["https://b.test/license"]) == 1
+    assert store.delete_urls("dedup-b", ["https://b.test/footer"]) == 1
+    assert store.delete_job("dedup-a") == 2
+    assert store.content_pool.jobs(key) == set() and store.count("dedup-b") == 1
+    store.delete_job("dedup-b")
+    assert len(store.content_pool) == 0
+
+    # Dedup can be switched off per pipeline
+    plain = IngestionPipeline("dedup-off", chunker, embedder, store, deduplicator=Deduplicator(store, mode="off"))
+    assert (await plain.run({"crawl": pages("https://c.test", license_text)}))["stored"] == 3
+    store.delete_job("dedup-off")
+    print("✅ Cross-job deduplication working!")
+
+# 24. Test concurrent adaptive remote embedding
+@pytest.mark.asyncio
+async def test_remote_embedding_batcher():
+    print("\n📡 Testing remote embedding batcher...")
+    import httpx
+    request = httpx.Request("POST", "https://embeddings.test/v1")
+    in_flight, peak, sizes, throttled = 0, 0, [], []
+
+    async def send(texts):
+        nonlocal in_flight, peak
+        sizes.append(len(texts))
+        if len(texts) > 24:
+            raise httpx.HTTPStatusError("too large", request=request, response=httpx.Response(413, request=request))
+        if "text 50" in texts and not throttled:
+            throttled.append(True)
+            response = httpx.Response(429, headers={"Retry-After": "0"}, request=request)
+            raise httpx.HTTPStatusError("slow down", request=request, response=response)
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return [[float(text.split()[1])] for text in texts]
+
+    batcher = RemoteEmbeddingBatcher("test", send, concurrency=4, batch_size=32, max_batch_size=64,
+                                     target_latency=1.0, backoff_base=0.0)
+    texts = [f"text {i}" for i in range(300)]
+    vectors = await batcher.embed(texts)
+
+    assert vectors == [[float(i)] for i in range(300)]  # Input order, whatever finished first
+    assert peak > 1 and batcher.stats["splits"] >= 1 and batcher.stats["retries"] == 1
+    assert batcher.max_batch_size <= 24 and max(sizes[-5:]) <= 24  # Learned the payload limit
+
+    # Non-retryable errors surface instead of returning partial results
+    async def forbidden(texts):
+        raise httpx.HTTPStatusError("no", request=request, response=httpx.Response(401, request=request))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await RemoteEmbeddingBatcher("test", forbidden).embed(texts)
+    print("✅ Remote embedding batcher working!")
+
+# 25. Test micro-batching embedding server
+@pytest.mark.asyncio
+async def test_embedding_server(monkeypatch):
+    print("\n🧵 Testing embedding server...")
+    server = EmbeddingServer("mock", workers=2, threads=1, max_batch=16, max_wait_ms=20)
+    try:
+        # Concurrent callers are coalesced into a few batches; each gets its own rows back
+        requests = [[f"query {i}"] for i in range(20)] + [[f"chunk {i}-{j}" for j in range(5)] for i in range(4)]
+        results = await asyncio.gather(*(server.embed(texts) for texts in requests))
+        assert [len(r) for r in results] == [len(texts) for texts in requests]
+        assert all(len(vector) == 384 for r in results for vector in r)
+        assert server.stats["requests"] == 24 and server.stats["texts"] == 40
+        assert server.stats["batches"] < 24 and server.stats["largest_batch"] <= 16
+        # Requests bigger than a batch are split, and come back in order
+        big = await server.embed([f"long {i}" for i in range(40)])
+        assert len(big) == 40 and server.stats["largest_batch"] <= 16
+        assert all(pid != os.getpid() for pid in server.stats["pids"])  # Inference runs off the API process
+        assert await server.embed([]) == []
+
+        embedder = Embedder(server=server)
+        assert len(await embedder.embed_texts(["one", "two"])) == 2
+
+        # A configured local model is served by the shared server
+        monkeypatch.setenv("EMBED_MODEL", "mock")
+        configured = Embedder()
+        assert configured.server is get_embedding_server("mock") and configured.local
+        assert len(await configured.embed_texts(["configured"])) == 1
+
+        # A dead worker breaks the pool; it is replaced and embedding keeps working
+        with pytest.raises(Exception):
+            await asyncio.get_running_loop().run_in_executor(server._pool, os._exit, 1)
+        assert len(await server.embed(["after crash"])) == 1
+        assert server.stats["restarts"] == 1
+    finally:
+        await server.close()
+        await close_embedding_servers()
+    print("✅ Embedding server working!")
+
+# 26. Test ONNX embedding backend parity
+def test_onnx_backend_parity(tmp_path, monkeypatch):
+    print("\n⚡ Testing ONNX embedding backend...")
+    with pytest.raises(ValueError):
+        load_model("sentence-transformers/all-MiniLM-L6-v2", "tensorrt")
+    for module in ("onnxruntime", "sentence_transformers", "transformers", "tokenizers"):
+        pytest.importorskip(module)
+    from backend.embeddings.onnx_backend import benchmark, export_onnx
+
+    model_name = "sentence-transformers/all-MiniLM-L6-v2"
+    monkeypatch.setenv("EMBED_ONNX_DIR", str(tmp_path))
+    try:
+        export_onnx(model_name)
+    except OSError as e:
+        pytest.skip(f"{model_name} can't be downloaded here: {e}")
+    corpus = [
+        "How do I configure the crawler?",
+        "AutoDoc AI generates documentation from websites and GitHub repositories.",
+        "def chunk_text(self, text, metadata): return list(self.iter_chunks(text, metadata))",
+        "Rate limits are handled with exponential backoff.",
+    ] * 16
+    reference = load_model(model_name, "torch").encode(corpus, convert_to_numpy=True)
+    for backend, min_cosine in (("onnx", 0.999), ("onnx-int8", 0.95)):
+        model = load_model(model_name, backend)
+        vectors = model.encode(corpus)
+        cosine = np.sum(vectors * reference, axis=1) / (
+            np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1))
+        assert vectors.shape == reference.shape and cosine.min() >= min_cosine
+        print(f"{backend}: min cosine {cosine.min():.4f}, {benchmark(model, corpus):.0f} texts/s")
+    print("✅ ONNX embedding backend working!")
+
+# 27. Test fast startup and readiness
+def test_startup_readiness():
+    print("\n🚀 Testing startup and readiness...")
+    import subprocess
+    import sys
+    import time
+    from fastapi.testclient import TestClient
+
+    # Importing the app must not pull in the browser or HTML parser
+    probe = "import sys, backend.main; print(sorted(m for m in ('playwright', 'bs4') if m in sys.modules))"
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert subprocess.run([sys.executable, "-c", probe], cwd=root, capture_output=True,
+                          text=True, check=True).stdout.strip() == "[]"
+
+    from backend.main import app
+    with TestClient(app) as client:
+        assert client.get("/health").json() == {"status": "ok"}
+        # The app runs in the client's own thread, so warm-up continues while we wait
+        for _ in range(50):
+            if client.get("/ready").status_code == 200:
+                break
+            time.sleep(0.1)
+        report = client.get("/ready").json()
+        assert report["ready"] and set(report["components"]) == {"index", "embedder", "crawler"}
+        assert {"import_seconds", "lifespan_seconds", "warm_up_seconds"} <= set(report["timings"])
+    print("✅ Startup and readiness working!")
+
+# 28. Test app-scoped service container
+def test_service_container(monkeypatch):
+    print("\n🧰 Testing service container...")
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    class FakeGenerator:
+        calls = 0
+
+        async def generate(self, prompt, context):
+            FakeGenerator.calls += 1
+            return f"Answer from {len(context)} chunks"
+
+    with TestClient(app) as client:
+        services = app.state.services
+        services.generator = FakeGenerator()
+        services.vector_store.add_chunks([
+            {"content": f"Container chunk {i}", "metadata": {"url": f"u{i}", "job_id": "container-job"},
+             "vector": [0.1] * 384}
+            for i in range(3)
+        ])
+        constructed = []
+
+        def counting(cls):
+            original = cls.__init__
+
+            def __init__(self, *args, **kwargs):
+                constructed.append(cls.__name__)
+                original(self, *args, **kwargs)
+            monkeypatch.setattr(cls, "__init__", __init__)
+
+        for cls in (Embedder, Retriever, Generator):
+            counting(cls)
+        monkeypatch.setattr(VectorStore, "close", lambda self: constructed.append("close"))
+
+        for prompt in ("What?", "Why?"):
+            response = client.post("/api/v1/generate", json={"job_id": "container-job", "prompt": prompt})
+            assert response.status_code == 200 and response.json()["content"] == "Answer from 3 chunks"
+        # Nothing is built or torn down per request
+        assert constructed == [] and FakeGenerator.calls == 2
+        services.vector_store.delete_job("container-job")
+    print("✅ Service container working!")
+
+
+# 29. Test semantic answer cache
+def test_answer_cache(monkeypatch):
+    print("\n🎯 Testing answer cache...")
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    from backend.rag.answer_cache import AnswerCache
+
+    context = [{"url": "u1", "content": "Install with pip."}]
+    cache = AnswerCache(max_entries=2, ttl=60, similarity=0.95)
+    cache.put("job", "docs", "How do I install?", context, "pip install", version=1, query_vector=[1.0, 0.0])
+    # Exact (normalised) hit, semantic hit, and misses on another context or a dissimilar query
+    assert cache.get("job", "docs", "  how do I INSTALL? ", context, version=1) == "pip install"
+    assert cache.get("job", "docs", "Installation steps?", context, version=1, query_vector=[0.99, 0.05]) == "pip install"
+    assert cache.get("job", "docs", "Installation steps?", context, version=1, query_vector=[0.0, 1.0]) is None
+    assert cache.get("job", "docs", "How do I install?", [{"url": "u2", "content": "x"}], version=1) is None
+    assert cache.stats["hits"] == 1 and cache.stats["semantic_hits"] == 1
+
+    # A new job version (chunks changed) invalidates; LRU keeps the most recent entries
+    assert cache.get("job", "docs", "How do I install?", context, version=2) is None
+    assert len(cache) == 0 and cache.stats["invalidated"] == 1
+    for prompt in ("a", "b", "c"):
+        cache.put("job", "docs", prompt, context, prompt)
+    assert len(cache) == 2 and cache.get("job", "docs", "a", context) is None
+
+    # TTL expiry
+    clock = [1000.0]
+    monkeypatch.setattr("backend.rag.answer_cache.time.monotonic", lambda: clock[0])
+    cache.put("job", "docs", "ttl", context, "old")
+    clock[0] += 61
+    assert cache.get("job", "docs", "ttl", context) is None and cache.stats["expired"] == 1
+
+    # Store versions move when a job's chunks change
+    store = VectorStore()
+    version = store.job_version("cache-job")
+    store.add_chunks([{"content": "v", "metadata": {"url": "v", "job_id": "cache-job"}, "vector": [0.1] * 384}])
+    assert store.job_version("cache-job") > version
+    store.delete_job("cache-job")
+
+    class FakeGenerator:
+        calls = 0
+
+        async def generate(self, prompt, context):
+            FakeGenerator.calls += 1
+            return "Generated answer"
+
+    with TestClient(app) as client:
+        services = app.state.services
+        services.generator = FakeGenerator()
+        services.vector_store.add_chunks([
+            {"content": f"Cached chunk {i}", "metadata": {"url": f"c{i}", "job_id": "answer-job"}, "vector": [0.1] * 384}
+            for i in range(2)
+        ])
+        request = {"job_id": "answer-job", "prompt": "Explain the setup"}
+        first = client.post("/api/v1/generate", json=request).json()
+        second = client.post("/api/v1/generate", json=request).json()
+        assert first["content"] == second["content"] == "Generated answer"
+        assert "cached" not in first and second["cached"] is True and FakeGenerator.calls == 1
+
+        # New chunks for the job change the version, so the answer is generated again
+        services.vector_store.add_chunks([
+            {"content": "Cached chunk 2", "metadata": {"url": "c2", "job_id": "answer-job"}, "vector": [0.1] * 384}
+        ])
+        client.post("/api/v1/generate", json=request)
+        assert FakeGenerator.calls == 2
+
+        # A failed generation (Ollama unreachable) is returned but not cached
+        failing = Generator(services.http_clients)
+        failing.ollama_url = "http://127.0.0.1:9"
+        services.generator = failing
+        request = {"job_id": "answer-job", "prompt": "Explain the failure"}
+        for _ in range(2):
+            response = client.post("/api/v1/generate", json=request).json()
+            assert response["content"].startswith("Error generating content") and "cached" not in response
+        services.vector_store.delete_job("answer-job")
+    print("✅ Answer cache working!")
+
+
+# 30. Test streaming crawl cancellation
+@pytest.mark.asyncio
+async def test_iter_pages_cancellation():
+    print("\n🛑 Testing streaming crawl cancellation...")
+    crawler = Crawler("http://docs.example.com", mode="hybrid")
+    cancelled = asyncio.Event()
+
+    async def endless_crawl(on_page):
+        try:
+            for i in range(10 ** 6):
+                on_page({"url": f"http://docs.example.com/{i}", "content": "text"})
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    crawler._crawl_hybrid = endless_crawl
+    pages = crawler.iter_pages()
+    async for page in pages:
+        break
+    # Closing the stream early cancels the background crawl
+    await pages.aclose()
+    assert cancelled.is_set()
+    print("✅ Streaming crawl cancellation working!")
+
+
+# 31. Test concurrent crawl frontier
+@pytest.mark.asyncio
+async def test_concurrent_crawl_frontier():
+    print("\n🧭 Testing concurrent crawl frontier...")
+    base = "http://docs.example.com"
+    links = {
+        "/": ["/a", "/b", "/a#intro", "/c", "http://other.example.com/x", "/logo.png"],
+        "/a": ["/", "/b", "/a1"],
+        "/b": ["/b1", "/a"],
+        "/c": [],
+        "/a1": ["/deep"],
+        "/b1": [],
+    }
+    fetched, active, peak = [], 0, 0
+
+    async def fetch(url, depth):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        path = url[len(base):] or "/"
+        fetched.append(path)
+        return {"url": url, "content": path}, links[path]
+
+    # Every in-domain doc link is expanded once, fragments and duplicates collapse, depth is respected
+    crawler = Crawler(base + "/", max_depth=2, max_pages=50, concurrency=4, per_domain_limit=2)
+    pages = []
+    await crawler._crawl_concurrent(fetch, pages.append)
+    assert sorted(fetched) == ["/", "/a", "/a1", "/b", "/b1", "/c"]
+    assert len(fetched) == len(set(fetched)) == len(pages)
+    # Four workers, but at most two requests to one domain at a time
+    assert peak == 2
+
+    # max_pages caps the crawl however wide the frontier grows
+    fetched.clear()
+    capped = Crawler(base + "/", max_depth=3, max_pages=3, concurrency=4)
+    await capped._crawl_concurrent(fetch)
+    assert len(fetched) == len(capped.results) == 3
+    print("✅ Concurrent crawl frontier working!")
+
+
+# 32. Test ONNX Runtime encoder
+def test_onnx_runtime_encoder(tmp_path, monkeypatch):
+    print("\n⚡ Testing ONNX Runtime encoder...")
+    onnx = pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("tokenizers")
+    from onnx import TensorProto, helper, numpy_helper
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from backend.embeddings.onnx_backend import MODEL_FILE, TOKENIZER_FILE, OnnxEmbeddingModel, model_dir
+
+    # A tiny offline model: word-level tokenizer plus an embedding lookup standing in for the transformer
+    monkeypatch.setenv("EMBED_ONNX_DIR", str(tmp_path))
+    words = "the crawler reads pages and chunker splits them".split()
+    vocab = {"[PAD]": 0, "[UNK]": 1, **{word: i + 2 for i, word in enumerate(words)}}
+    table = np.random.default_rng(0).normal(size=(len(vocab), 8)).astype(np.float32)
+    target = model_dir("tiny-encoder")
+    target.mkdir(parents=True)
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.save(str(target / TOKENIZER_FILE))
+    graph = helper.make_graph(
+        [helper.make_node("Gather", ["table", "input_ids"], ["hidden"], axis=0),
+         helper.make_node("Cast", ["attention_mask"], ["mask"], to=TensorProto.FLOAT),
+         helper.make_node("Unsqueeze", ["mask", "axes"], ["mask3"]),
+         helper.make_node("Mul", ["hidden", "mask3"], ["last_hidden_state"])],
+        "tiny-encoder",
+        [helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "sequence"]),
+         helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch", "sequence"])],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "sequence", 8])],
+        [numpy_helper.from_array(table, "table"), numpy_helper.from_array(np.array([2], dtype=np.int64), "axes")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 14)])
+    model.ir_version = 8
+    onnx.save(model, str(target / MODEL_FILE))
+
+    # Mean pooling over real tokens, normalised, whatever the padding of the batch
+    texts = ["the crawler reads pages", "the chunker splits them and the crawler reads", "pages"]
+    vectors = OnnxEmbeddingModel("tiny-encoder").encode(texts, batch_size=2)
+    for text, vector in zip(texts, vectors):
+        expected = table[[vocab[word] for word in text.split()]].mean(axis=0)
+        assert np.allclose(vector, expected / np.linalg.norm(expected), atol=1e-5)
+
+    # EMBED_BACKEND selects the app's backend; its vectors are cached apart from torch's
+    monkeypatch.setenv("EMBED_BACKEND", "onnx")
+    embedder = CachedEmbedder(Embedder("tiny-encoder"), cache=EmbeddingCache())
+    assert embedder.model_id == "tiny-encoder:onnx" and embedder.model_name == "tiny-encoder"
+
+    async def serve():
+        try:
+            return await embedder.embed_texts(texts)
+        finally:
+            await close_embedding_servers()
+
+    assert np.allclose(asyncio.run(serve()), vectors, atol=1e-5)
+    assert embedder.cache.get_many([text_key("tiny-encoder", texts[0])]) == [None]
+    print("✅ ONNX Runtime encoder working!")
+
+
+# 33. Test sync crawl failures on re-crawl
+def test_sync_crawl_failures(monkeypatch):
+    print("\n🪟 Testing sync crawl failures...")
+    import playwright.sync_api
+    base = "http://docs.example.com"
+    site = {"/": ["/guide", "/old"], "/guide": ["/guide/api"], "/guide/api": [], "/old": []}
+    status = {}
+
+    class Page:
+        def goto(self, url, **kwargs):
+            self.path = url[len(base):] or "/"
+            if status.get(self.path) == "timeout":
+                raise TimeoutError(f"Timeout 10000ms exceeded navigating to {url}")
+            return SimpleNamespace(status=status.get(self.path, 200))
+
+        def content(self):
+            return f"<html><body><p>{self.path}</p></body></html>"
+
+        def title(self):
+            return self.path
+
+        def query_selector_all(self, selector):
+            return [SimpleNamespace(get_attribute=lambda _, href=href: href) for href in site[self.path]]
+
+        def close(self):
+            pass
+
+    class Playwright:
+        chromium = SimpleNamespace(launch=lambda **kwargs: SimpleNamespace(
+            new_context=lambda: SimpleNamespace(new_page=Page), close=lambda: None))
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(playwright.sync_api, "sync_playwright", Playwright)
+    ledger = CrawlLedger()
+
+    def crawl():
+        session = ledger.session("sync-job")
+        crawler = Crawler(base + "/", max_depth=2, max_pages=10, mode="sync", ledger=session)
+        crawler._crawl_sync()
+        session.commit()
+        return crawler
+
+    first = crawl()
+    assert len(first.results) == 4 and first.complete and not first.failed
+
+    # "/guide" times out and "/old" is gone: only "/old" is stale, "/guide/api" may still be linked
+    status.update({"/guide": "timeout", "/old": 404})
+    second = crawl()
+    assert second.failed == {base + "/guide"}
+    assert second.gone == {base + "/old"}
+    assert second.stale_urls() == {base + "/old"}
+    print("✅ Sync crawl failures working!")